@@ -0,0 +1,188 @@
+"""
+Request profiling.
+
+ProfilingMiddleware times every request and records, per view:
+
+- the number of SQL queries and the time spent in them, on every database
+  alias;
+- the time spent serializing the response body (rendering DRF's data to
+  JSON; building that data from model instances happens in the view);
+- the response size.
+
+The numbers go out in a `Server-Timing` header (when
+PROFILING_SERVER_TIMING is on), are aggregated for the token-protected
+Prometheus `/metrics` endpoint, and requests slower than
+PROFILING_SLOW_REQUEST_MS (or running more than PROFILING_MAX_QUERIES
+queries) are logged to `alagsbay.profiling` with their SQL.
+
+Metrics are kept in process memory, so each worker process reports its
+own counters.
+"""
+import hmac
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger('alagsbay.profiling')
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# Slowest statements listed per request in the slow-request log.
+MAX_LOGGED_QUERIES = 200
+
+
+class QueryRecorder:
+    """An execute wrapper that times every statement run through it."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.queries.append((context['connection'].alias, sql, duration))
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def duration(self):
+        return sum(duration for _, _, duration in self.queries)
+
+
+class Metrics:
+    """Per-view counters and a request duration histogram, Prometheus style."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = Counter()
+        self.totals = defaultdict(Counter)
+        self.buckets = defaultdict(Counter)
+
+    def record(self, view, method, status, duration, queries, db_duration, serialize_duration, size):
+        with self.lock:
+            self.requests[(view, method, str(status))] += 1
+            totals = self.totals[view]
+            totals['count'] += 1
+            totals['duration'] += duration
+            totals['queries'] += queries
+            totals['db_duration'] += db_duration
+            totals['serialize_duration'] += serialize_duration
+            totals['size'] += size
+            for bound in DURATION_BUCKETS:
+                if duration <= bound:
+                    self.buckets[view][bound] += 1
+
+    def render(self):
+        def label(value):
+            return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        with self.lock:
+            family('alagsbay_http_requests_total', 'counter', 'Requests by view, method and status.')
+            for (view, method, status), value in sorted(self.requests.items()):
+                lines.append(
+                    f'alagsbay_http_requests_total{{view="{label(view)}",method="{method}",status="{status}"}} {value}')
+
+            family('alagsbay_http_request_duration_seconds', 'histogram', 'Request duration by view.')
+            for view, totals in sorted(self.totals.items()):
+                for bound in DURATION_BUCKETS:
+                    lines.append(
+                        f'alagsbay_http_request_duration_seconds_bucket{{view="{label(view)}",le="{bound}"}} '
+                        f'{self.buckets[view][bound]}')
+                lines.append(
+                    f'alagsbay_http_request_duration_seconds_bucket{{view="{label(view)}",le="+Inf"}} {totals["count"]}')
+                lines.append(f'alagsbay_http_request_duration_seconds_sum{{view="{label(view)}"}} {totals["duration"]:.6f}')
+                lines.append(f'alagsbay_http_request_duration_seconds_count{{view="{label(view)}"}} {totals["count"]}')
+
+            for name, key, help_text in [
+                ('alagsbay_db_queries_total', 'queries', 'SQL queries run by view.'),
+                ('alagsbay_db_duration_seconds_total', 'db_duration', 'Time spent in SQL by view.'),
+                ('alagsbay_serialize_duration_seconds_total', 'serialize_duration', 'Time spent rendering responses by view.'),
+                ('alagsbay_response_bytes_total', 'size', 'Response body bytes by view.'),
+            ]:
+                family(name, 'counter', help_text)
+                for view, totals in sorted(self.totals.items()):
+                    lines.append(f'{name}{{view="{label(view)}"}} {totals[key]:g}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint; requires `Authorization: Bearer <METRICS_TOKEN>`, and is off without a token."""
+    token = settings.METRICS_TOKEN
+    if not token or not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        request._serialize_duration = 0.0
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        match = request.resolver_match
+        view = match.view_name if match else '<unresolved>'
+        size = 0 if response.streaming else len(response.content)
+        metrics.record(view, request.method, response.status_code, duration,
+                       recorder.count, recorder.duration, request._serialize_duration, size)
+
+        if settings.PROFILING_SERVER_TIMING:
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={recorder.duration * 1000:.1f};desc="{recorder.count} queries"',
+                f'serialize;dur={request._serialize_duration * 1000:.1f}',
+                f'total;dur={duration * 1000:.1f}',
+            ])
+
+        if duration * 1000 >= settings.PROFILING_SLOW_REQUEST_MS or recorder.count > settings.PROFILING_MAX_QUERIES:
+            self.log_slow_request(request, view, response, duration, recorder)
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns; time that step.
+        started = time.perf_counter()
+
+        def rendered(response):
+            request._serialize_duration += time.perf_counter() - started
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    def log_slow_request(self, request, view, response, duration, recorder):
+        statements = Counter(sql for _, sql, _ in recorder.queries)
+        slowest = sorted(recorder.queries, key=lambda query: query[2], reverse=True)[:MAX_LOGGED_QUERIES]
+        lines = [
+            f'{request.method} {request.get_full_path()} ({view}) -> {response.status_code} '
+            f'in {duration * 1000:.1f} ms, {recorder.count} queries in {recorder.duration * 1000:.1f} ms'
+        ]
+        repeated = [(sql, count) for sql, count in statements.most_common() if count > 1]
+        for sql, count in repeated:
+            lines.append(f'  repeated {count}x: {sql}')
+        for alias, sql, query_duration in slowest:
+            lines.append(f'  {query_duration * 1000:8.2f} ms [{alias}] {sql}')
+        logger.warning('\n'.join(lines))
@@ -0,0 +1,114 @@
+"""
+Read replica routing.
+
+Reads go to a random alias in DATABASE_REPLICAS and writes to `default`,
+except where a read has to see a write that may not have replicated yet:
+
+- models listed in DATABASE_PRIMARY_MODELS (carts, the wallet ledger, jobs)
+  are always read from the primary;
+- reads inside a transaction on the primary stay on it;
+- inside `use_primary()` every read goes to the primary. The middleware
+  enters it for unsafe requests, for a user who wrote within the last
+  DATABASE_PRIMARY_PIN_SECONDS, and on request with an `X-Read-Primary: 1`
+  header. The job worker enters it around every job.
+
+The pin is a cache key per authenticated user (read from the JWT, or the
+session for the admin), since the SPA is cross-site and never sends our
+cookies; it needs the shared Redis cache to hold across worker processes.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+PIN_KEY = 'replicas:pin:{}'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_pinned = ContextVar('read_primary', default=False)
+
+
+@contextmanager
+def use_primary(enabled=True):
+    """Send every read in the block to the primary database."""
+    token = _pinned.set(_pinned.get() or enabled)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if (
+            not replicas
+            or _pinned.get()
+            or model._meta.label_lower in settings.DATABASE_PRIMARY_MODELS
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema through replication.
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+def request_user_id(request):
+    """The id of the user making the request, from its JWT or session; None if anonymous."""
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    raw_token = authentication.get_raw_token(header) if header else None
+    if raw_token:
+        try:
+            return authentication.get_validated_token(raw_token)[jwt_settings.USER_ID_CLAIM]
+        except (InvalidToken, KeyError):
+            return None
+    user = getattr(request, 'user', None)
+    return user.pk if user is not None and user.is_authenticated else None
+
+
+class PrimaryPinningMiddleware:
+    """
+    Reads from the primary for unsafe requests, for `X-Read-Primary: 1`, and
+    for a few seconds after a user's last successful write, so they read
+    their own writes while the replicas catch up.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+
+        writes = request.method not in SAFE_METHODS
+        user_id = request_user_id(request)
+        pinned = (
+            writes
+            or request.headers.get('X-Read-Primary') == '1'
+            or (user_id is not None and cache.get(PIN_KEY.format(user_id)) is not None)
+        )
+        with use_primary(pinned):
+            response = self.get_response(request)
+
+        if writes and response.status_code < 400 and user_id is not None:
+            cache.set(PIN_KEY.format(user_id), 1, timeout=settings.DATABASE_PRIMARY_PIN_SECONDS)
+        return response
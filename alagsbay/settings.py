@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 import os
 from pathlib import Path
 from datetime import timedelta
+from corsheaders.defaults import default_headers
 # pylint: disable=import-error
 import pymysql
 pymysql.install_as_MySQLdb()
@@ -46,6 +47,8 @@ CORS_ALLOWED_ORIGINS = [
 ]
 
 CORS_ALLOW_CREDENTIALS = True
+# X-Read-Primary asks for a read from the primary database (alagsbay.replicas).
+CORS_ALLOW_HEADERS = (*default_headers, 'x-read-primary')
 
 
 
@@ -63,11 +66,13 @@ INSTALLED_APPS = [
     'core',
     'djoser',
     'corsheaders',
-    'payments'
+    'payments',
+    'jobs'
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',            # ✔️ keep first
+    'alagsbay.profiling.ProfilingMiddleware',                   # ✔️ times everything below it
     'corsheaders.middleware.CorsMiddleware',                    # ✔️ must come before CommonMiddleware
     'whitenoise.middleware.WhiteNoiseMiddleware',               # ✔️ after cors
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -76,6 +81,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'alagsbay.replicas.PrimaryPinningMiddleware',
 ]
 
 
@@ -102,19 +108,117 @@ WSGI_APPLICATION = 'alagsbay.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Connection details come from the environment (DB_ENGINE, DB_NAME, DB_USER,
+# DB_PASSWORD, DB_HOST, DB_PORT) and default to the hosted MySQL database.
+# The database sits behind a remote proxy, so connections are kept open for
+# DB_CONN_MAX_AGE seconds (0 closes them after every request, empty keeps
+# them forever) and checked before being reused across requests.
+
+DB_ENGINE = os.environ.get('DB_ENGINE', 'django.db.backends.mysql')
+DB_CONN_MAX_AGE = os.environ.get('DB_CONN_MAX_AGE', '60')
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',
-        'NAME': 'railway',
-        'USER': 'root',
-        'PASSWORD': 'ZitFfyCuUyZokNazhEHWEqijWSFnDxBg',
-        'HOST': 'switchback.proxy.rlwy.net',
-        'PORT': '19852',
-        'OPTIONS': {
-            'init_command': "SET sql_mode='STRICT_TRANS_TABLES'"
-        }
+        'ENGINE': DB_ENGINE,
+        'NAME': os.environ.get('DB_NAME', 'railway'),
+        'USER': os.environ.get('DB_USER', 'root'),
+        'PASSWORD': os.environ.get('DB_PASSWORD', 'ZitFfyCuUyZokNazhEHWEqijWSFnDxBg'),
+        'HOST': os.environ.get('DB_HOST', 'switchback.proxy.rlwy.net'),
+        'PORT': os.environ.get('DB_PORT', '19852'),
+        'CONN_MAX_AGE': int(DB_CONN_MAX_AGE) if DB_CONN_MAX_AGE else None,
+        'CONN_HEALTH_CHECKS': os.environ.get('DB_CONN_HEALTH_CHECKS', 'true').lower() in ('1', 'true', 'yes'),
+        'OPTIONS': {},
     }
 }
+if DB_ENGINE == 'django.db.backends.mysql':
+    DATABASES['default']['OPTIONS'] = {
+        'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
+        'connect_timeout': int(os.environ.get('DB_CONNECT_TIMEOUT', 10)),
+    }
+
+# Read replicas, e.g. DB_REPLICA_HOSTS=replica-1.internal,replica-2.internal,
+# reached with the primary's credentials as `replica1`, `replica2`, ...
+# Safe reads are spread over them by alagsbay.replicas.PrimaryReplicaRouter.
+DATABASE_REPLICAS = []
+for index, host in enumerate(filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(',')), 1):
+    DATABASES[f'replica{index}'] = {**DATABASES['default'], 'HOST': host.strip(), 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(f'replica{index}')
+
+DATABASE_ROUTERS = ['alagsbay.replicas.PrimaryReplicaRouter']
+
+# Models whose reads must see the latest writes, so never come from a replica.
+DATABASE_PRIMARY_MODELS = [
+    'store.cart',
+    'store.cartitem',
+    'payments.userwallet',
+    'payments.wallettransaction',
+    'payments.walletbalancesnapshot',
+    'jobs.job',
+    'jobs.tasklock',
+]
+
+# Seconds a user keeps reading from the primary after a write.
+DATABASE_PRIMARY_PIN_SECONDS = int(os.environ.get('DB_PRIMARY_PIN_SECONDS', 5))
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+# Carts get their own alias so catalog pages can't evict them; point
+# CART_REDIS_URL at an instance that doesn't evict keys (noeviction).
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        },
+        'carts': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('CART_REDIS_URL', os.environ['REDIS_URL']),
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'alagsbay',
+        },
+        'carts': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'alagsbay-carts',
+        },
+    }
+
+# Seconds a serialized catalog page or collection count stays cached;
+# writes invalidate them earlier through signals.
+CATALOG_CACHE_TIMEOUT = 60 * 15
+# Seconds a product's stock stays cached for those pages; orders drop it sooner.
+INVENTORY_CACHE_TIMEOUT = 60
+
+# 'fulltext' (MySQL MATCH ... AGAINST), 'inverted' (built-in token index)
+# or 'auto' to use FULLTEXT whenever the database is MySQL.
+PRODUCT_SEARCH_BACKEND = os.environ.get('PRODUCT_SEARCH_BACKEND', 'auto')
+
+# Where carts live: 'database' (Cart/CartItem tables) or 'cache' (the
+# 'carts' cache above, which must be shared by all workers, so Redis);
+# cached carts are only written to the database when they are ordered.
+CART_STORAGE = os.environ.get('CART_STORAGE', 'database')
+
+# Carts untouched for this long are purged by manage.py purge_carts
+# (or expire from the cache). Database carts need it run from cron, e.g.
+#   15 3 * * * python manage.py purge_carts --pause 0.1
+CART_TTL = timedelta(days=int(os.environ.get('CART_TTL_DAYS', 30)))
+
+# Lower bounds of the price facet buckets on the product list
+PRODUCT_PRICE_BUCKETS = [0, 50, 100, 250, 500, 1000]
+
+
+# Background jobs (manage.py runworker)
+
+JOBS_POLL_INTERVAL = 1  # seconds between polls when the queue is idle
+JOBS_HEARTBEAT_INTERVAL = 30  # seconds between a worker's refreshes of its running jobs' lock
+JOBS_LOCK_TIMEOUT = 60 * 10  # a running job not refreshed for this long is assumed dead and requeued
+JOBS_RETRY_BACKOFF = 10  # seconds before the first retry; doubles every attempt
 
 
 # Password validation
@@ -157,6 +261,14 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Widths of the resized variants generated for every product image
+PRODUCT_IMAGE_VARIANTS = {
+    'thumb': 160,
+    'small': 480,
+    'medium': 960,
+}
+PRODUCT_IMAGE_QUALITY = 80
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -176,6 +288,27 @@ SIMPLE_JWT = {
 
 AUTH_USER_MODEL = 'core.User'
 
+# Request profiling (alagsbay/profiling.py): Server-Timing headers, the
+# Prometheus /metrics endpoint (served only to `Authorization: Bearer
+# <METRICS_TOKEN>`, so disabled while METRICS_TOKEN is unset) and a log of
+# slow or query-heavy requests with their SQL. Server-Timing exposes query
+# counts and timings to every client, so it defaults to DEBUG.
+PROFILING_SERVER_TIMING = os.environ.get('PROFILING_SERVER_TIMING', str(DEBUG)).lower() in ('1', 'true', 'yes')
+PROFILING_SLOW_REQUEST_MS = int(os.environ.get('PROFILING_SLOW_REQUEST_MS', 500))
+PROFILING_MAX_QUERIES = int(os.environ.get('PROFILING_MAX_QUERIES', 50))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'alagsbay.profiling': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False},
+    },
+}
+
 DJOSER = {
    'SERIALIZERS': {
         'user_create': 'core.serializers.UserCreateSerializer',
@@ -186,3 +319,17 @@ DJOSER = {
 
 PAYSTACK_SECRET_KEY = "sk_test_197975d4855eb33773f0260c5684bd0edb978060"
 PAYSTACK_PUBLIC_KEY = "pk_test_8f922c246850801366ac324249e8574df9a51e93"
+PAYSTACK_BASE_URL = os.environ.get('PAYSTACK_BASE_URL', 'https://api.paystack.co')
+PAYSTACK_TIMEOUT = (3.05, 10)  # (connect, read) seconds
+PAYSTACK_MAX_RETRIES = 3
+PAYSTACK_BACKOFF_FACTOR = 0.3
+PAYSTACK_POOL_SIZE = 10
+# Seconds after initialization before the reconcile_payment job first asks
+# Paystack about a payment whose webhook hasn't arrived; later checks double
+# from it. verify only reads the local status.
+PAYSTACK_WEBHOOK_GRACE_SECONDS = 60
+# The background check for a lost webhook starts after the grace period and
+# backs off (doubling, up to the max delay) while the checkout is unfinished,
+# giving up this long after initialization.
+PAYSTACK_RECONCILE_WINDOW_SECONDS = int(os.environ.get('PAYSTACK_RECONCILE_WINDOW_SECONDS', 2 * 60 * 60))
+PAYSTACK_RECONCILE_MAX_DELAY = 15 * 60
@@ -0,0 +1,10 @@
+"""
+Settings for the test suite: `manage.py test` picks them up, other runners
+need DJANGO_SETTINGS_MODULE=alagsbay.test_settings.
+"""
+from .settings import *  # noqa: F401,F403
+
+# A `replica` alias mirroring the test database: a second connection the
+# routing tests send reads through. It only receives reads where a test
+# lists it in DATABASE_REPLICAS.
+DATABASES['replica'] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
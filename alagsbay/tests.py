@@ -0,0 +1,112 @@
+import re
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connections
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from store.models import Collection
+from .profiling import Metrics, ProfilingMiddleware, QueryRecorder
+# pylint: disable=no-member
+
+
+class MetricsEndpointTests(TestCase):
+    @override_settings(METRICS_TOKEN=None)
+    def test_metrics_are_off_without_a_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+    @override_settings(METRICS_TOKEN='scrape')
+    def test_metrics_need_the_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape').status_code, 200)
+
+
+@override_settings(PROFILING_SERVER_TIMING=True, PROFILING_SLOW_REQUEST_MS=0)
+class ProfilingMiddlewareTests(TransactionTestCase):
+    """Queries run on `default` and on `replica`, a second connection mirroring the test database."""
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        Collection.objects.create(title='Audio')
+        self.metrics = Metrics()
+        patcher = mock.patch('alagsbay.profiling.metrics', self.metrics)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_server_timing_counts_the_queries(self):
+        with self.assertLogs('alagsbay.profiling'):
+            response = self.client.get('/store/collections/')
+        self.assertEqual(response.status_code, 200)
+        db, serialize, total = response['Server-Timing'].split(', ')
+        self.assertRegex(db, r'^db;dur=[\d.]+;desc="[1-9]\d* queries"$')
+        self.assertRegex(serialize, r'^serialize;dur=[\d.]+$')
+        self.assertRegex(total, r'^total;dur=[\d.]+$')
+        queries = int(re.search(r'"(\d+) queries"', db).group(1))
+        self.assertEqual(self.metrics.totals['collections-list']['queries'], queries)
+
+    @override_settings(PROFILING_SERVER_TIMING=False)
+    def test_server_timing_can_be_turned_off(self):
+        with self.assertLogs('alagsbay.profiling'):
+            response = self.client.get('/store/collections/')
+        self.assertNotIn('Server-Timing', response)
+
+    def test_queries_are_recorded_per_alias(self):
+        recorder = QueryRecorder()
+        with connections['default'].execute_wrapper(recorder), connections['replica'].execute_wrapper(recorder):
+            list(Collection.objects.using('default').all())
+            list(Collection.objects.using('replica').all())
+            list(Collection.objects.using('replica').all())
+        self.assertEqual([alias for alias, _, _ in recorder.queries], ['default', 'replica', 'replica'])
+        self.assertEqual(recorder.count, 3)
+        self.assertGreater(recorder.duration, 0)
+
+    def test_slow_requests_are_logged_with_their_sql(self):
+        def view(request):
+            Collection.objects.using('default').count()
+            list(Collection.objects.using('replica').all())
+            list(Collection.objects.using('replica').all())
+            return HttpResponse('{}')
+
+        request = RequestFactory().get('/store/collections/?page=2')
+        request.resolver_match = None
+        with self.assertLogs('alagsbay.profiling', 'WARNING') as logs:
+            ProfilingMiddleware(view)(request)
+        (message,) = logs.records
+        lines = message.getMessage().splitlines()
+        self.assertRegex(lines[0], r'^GET /store/collections/\?page=2 \(<unresolved>\) -> 200 in [\d.]+ ms, 3 queries')
+        self.assertRegex(lines[1], r'^  repeated 2x: SELECT .*"store_collection"')
+        self.assertEqual(sorted(re.search(r'\[(\w+)\]', line).group(1) for line in lines[2:]),
+                         ['default', 'replica', 'replica'])
+
+    @override_settings(PROFILING_SLOW_REQUEST_MS=60_000, PROFILING_MAX_QUERIES=0)
+    def test_requests_over_the_query_budget_are_logged(self):
+        with self.assertLogs('alagsbay.profiling', 'WARNING') as logs:
+            self.client.get('/store/collections/')
+        self.assertIn('(collections-list) -> 200', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+    @override_settings(PROFILING_SLOW_REQUEST_MS=60_000)
+    def test_fast_requests_are_not_logged(self):
+        with self.assertNoLogs('alagsbay.profiling'):
+            self.client.get('/store/collections/')
+
+    def test_render_outputs_prometheus_text(self):
+        with self.assertLogs('alagsbay.profiling'):
+            self.client.get('/store/collections/')
+            self.client.get('/store/collections/')
+        text = self.metrics.render()
+        self.assertIn('# TYPE alagsbay_http_requests_total counter', text)
+        self.assertIn('alagsbay_http_requests_total{view="collections-list",method="GET",status="200"} 2', text)
+        self.assertIn('# TYPE alagsbay_http_request_duration_seconds histogram', text)
+        self.assertIn('alagsbay_http_request_duration_seconds_bucket{view="collections-list",le="+Inf"} 2', text)
+        self.assertIn('alagsbay_http_request_duration_seconds_count{view="collections-list"} 2', text)
+        queries = self.metrics.totals['collections-list']['queries']
+        self.assertIn(f'alagsbay_db_queries_total{{view="collections-list"}} {queries:g}', text)
+        self.assertRegex(text, r'alagsbay_response_bytes_total\{view="collections-list"\} [1-9]\d*\n')
+
+    def test_render_escapes_label_values(self):
+        metrics = Metrics()
+        metrics.record('say "hi"\\', 'GET', 200, 0.001, 0, 0.0, 0.0, 0)
+        self.assertIn('view="say \\"hi\\"\\\\"', metrics.render())
@@ -18,6 +18,7 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
+from .profiling import metrics_view
 
 admin.site.site_header = "AlagsBay"
 
@@ -26,7 +27,8 @@ urlpatterns = [
     path('store/', include('store.urls')), 
     path('payments/', include('payments.urls')), 
     path('auth/', include('djoser.urls')), 
-    path('auth/', include('djoser.urls.jwt')) 
+    path('auth/', include('djoser.urls.jwt')),
+    path('metrics', metrics_view, name='metrics'),
 ] 
 
 if settings.DEBUG:
@@ -1,10 +1,27 @@
 from djoser.serializers import UserSerializer as BaseUserSerializer, UserCreateSerializer as BaseUserCreateSerializer
+from django.db import transaction
 from rest_framework import serializers
+from store.models import Customer
 
 class UserCreateSerializer(BaseUserCreateSerializer):
     birth_date = serializers.DateField(required=False)
     class Meta(BaseUserCreateSerializer.Meta):
         fields = ['id','username', 'password', 'email', 'first_name', 'last_name', 'birth_date'] 
+
+    def validate(self, attrs):
+        # birth_date belongs to the Customer, not the User djoser builds to validate the password.
+        birth_date = attrs.pop('birth_date', None)
+        attrs = super().validate(attrs)
+        attrs['birth_date'] = birth_date
+        return attrs
+
+    def perform_create(self, validated_data):
+        # Create the Customer with the user so request paths never have to.
+        birth_date = validated_data.pop('birth_date', None)
+        with transaction.atomic():
+            user = super().perform_create(validated_data)
+            Customer.objects.create(user=user, birth_date=birth_date)
+        return user
         
 
 class UserSerializer(BaseUserSerializer):
@@ -1,3 +1,26 @@
+from datetime import date
+
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from rest_framework.test import APIClient
+from store.models import Customer
+# pylint: disable=no-member
+
+
+class RegistrationTests(TestCase):
+    def register(self, **data):
+        return APIClient().post('/auth/users/', {
+            'username': 'amara', 'email': 'amara@example.com', 'password': 'x7!kettle-Lagoon', **data,
+        }, format='json')
+
+    def test_signup_creates_one_customer(self):
+        response = self.register(birth_date='1990-04-02')
+        self.assertEqual(response.status_code, 201)
+        customer = Customer.objects.get()
+        self.assertEqual(customer.user_id, response.data['id'])
+        self.assertEqual(customer.birth_date, date(1990, 4, 2))
 
-# Create your tests here.
+    def test_rejected_signup_creates_no_customer(self):
+        self.assertEqual(self.register(password='1234').status_code, 400)
+        self.assertFalse(get_user_model().objects.exists())
+        self.assertFalse(Customer.objects.exists())
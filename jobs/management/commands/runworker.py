@@ -0,0 +1,58 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from jobs.worker import claim_jobs, heartbeat, requeue_stale_jobs, run_job, worker_id
+
+
+def run_in_thread(job):
+    try:
+        return run_job(job)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queue', default='default')
+        parser.add_argument('--concurrency', type=int, default=4, help='Jobs run at once by this worker.')
+        parser.add_argument('--once', action='store_true', help='Exit when no job is due instead of polling.')
+
+    def handle(self, *args, **options):
+        concurrency = options['concurrency']
+        locked_by = worker_id()
+        self.stdout.write(f"Worker {locked_by} on queue '{options['queue']}' with concurrency {concurrency}")
+
+        running = {}  # future -> job id
+        done = failed = 0
+        last_beat = time.monotonic()
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='jobs') as pool:
+            while True:
+                close_old_connections()
+                if time.monotonic() - last_beat >= settings.JOBS_HEARTBEAT_INTERVAL:
+                    heartbeat(list(running.values()), locked_by)
+                    last_beat = time.monotonic()
+                requeue_stale_jobs()
+                free = concurrency - len(running)
+                jobs = claim_jobs(options['queue'], free, locked_by) if free else []
+                running.update((pool.submit(run_in_thread, job), job.id) for job in jobs)
+
+                if not running:
+                    if options['once']:
+                        break
+                    time.sleep(settings.JOBS_POLL_INTERVAL)
+                    continue
+
+                finished, _ = wait(running, timeout=settings.JOBS_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    del running[future]
+                    if future.result():
+                        done += 1
+                    else:
+                        failed += 1
+
+        self.stdout.write(self.style.SUCCESS(f'{done} job(s) done, {failed} failed.'))
@@ -0,0 +1,63 @@
+from datetime import timedelta
+
+from django.utils import timezone
+from .models import Job
+# pylint: disable=no-member
+
+TASKS = {}
+
+
+class Task:
+    def __init__(self, func, name, queue, max_attempts, concurrency):
+        self.func = func
+        self.name = name
+        self.queue = queue
+        self.max_attempts = max_attempts
+        self.concurrency = concurrency  # max jobs of this task running at once, None for no limit
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def enqueue(self, delay=None, run_at=None, **payload):
+        return enqueue(self.name, payload, delay=delay, run_at=run_at)
+
+    def enqueue_many(self, payloads, delay=None, run_at=None):
+        return enqueue_many(self.name, payloads, delay=delay, run_at=run_at)
+
+
+def task(name=None, queue='default', max_attempts=5, concurrency=None):
+    """
+    Register a function as a job. It is called with the job payload as
+    keyword arguments, so the payload must be JSON-serializable.
+    """
+    def register(func):
+        registered = Task(func, name or f'{func.__module__}.{func.__name__}', queue, max_attempts, concurrency)
+        TASKS[registered.name] = registered
+        return registered
+    return register
+
+
+def enqueue(name, payload=None, delay=None, run_at=None):
+    """
+    Queue a job. Inside a transaction the job only becomes visible to workers
+    when it commits, so it never runs against rows that were rolled back.
+    """
+    return Job.objects.create(**_job_fields(name, payload, delay, run_at))
+
+
+def enqueue_many(name, payloads, delay=None, run_at=None):
+    """Queue one job per payload with a single bulk insert."""
+    return Job.objects.bulk_create([Job(**_job_fields(name, payload, delay, run_at)) for payload in payloads])
+
+
+def _job_fields(name, payload, delay, run_at):
+    registered = TASKS[name]
+    if run_at is None:
+        run_at = timezone.now() + (timedelta(seconds=delay) if delay else timedelta())
+    return {
+        'name': name,
+        'payload': payload or {},
+        'queue': registered.queue,
+        'max_attempts': registered.max_attempts,
+        'run_at': run_at,
+    }
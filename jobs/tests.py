@@ -0,0 +1,141 @@
+import threading
+from datetime import timedelta
+from unittest import mock
+
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from .models import Job
+from .registry import TASKS, task
+from .worker import claim_jobs, heartbeat, requeue_stale_jobs, run_job
+# pylint: disable=no-member
+
+
+def register(test, name, func=lambda **payload: None, **options):
+    """Register a task for the length of one test."""
+    registered = task(name=name, **options)(func)
+    test.addCleanup(TASKS.pop, name)
+    return registered
+
+
+@override_settings(JOBS_RETRY_BACKOFF=10)
+class WorkerTests(TestCase):
+    def test_claims_due_jobs_in_order(self):
+        noop = register(self, 'tests.noop')
+        later = noop.enqueue(delay=60)
+        second = noop.enqueue(run_at=timezone.now() - timedelta(seconds=1))
+        first = noop.enqueue(run_at=timezone.now() - timedelta(seconds=2))
+
+        jobs = claim_jobs('default', 5, 'worker-a')
+        self.assertEqual([job.pk for job in jobs], [first.pk, second.pk])
+        self.assertEqual([job.attempts for job in jobs], [1, 1])
+        self.assertEqual(
+            set(Job.objects.filter(status=Job.STATUS_RUNNING).values_list('pk', 'locked_by')),
+            {(first.pk, 'worker-a'), (second.pk, 'worker-a')})
+        self.assertEqual(Job.objects.get(pk=later.pk).status, Job.STATUS_QUEUED)
+        self.assertEqual(claim_jobs('default', 5, 'worker-b'), [])
+
+    def test_run_passes_the_payload_and_marks_the_job_done(self):
+        calls = []
+        record = register(self, 'tests.record', lambda **payload: calls.append(payload))
+        record.enqueue(image_id=7)
+
+        (job,) = claim_jobs('default', 1, 'worker-a')
+        self.assertTrue(run_job(job))
+        self.assertEqual(calls, [{'image_id': 7}])
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_DONE)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_failures_are_retried_with_doubling_backoff_then_failed(self):
+        def explode():
+            raise RuntimeError('boom')
+        register(self, 'tests.explode', explode, max_attempts=3).enqueue()
+
+        for backoff in (10, 20):
+            (job,) = claim_jobs('default', 1, 'worker-a')
+            started = timezone.now()
+            self.assertFalse(run_job(job))
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.locked_by), (Job.STATUS_QUEUED, ''))
+            self.assertAlmostEqual((job.run_at - started).total_seconds(), backoff, delta=1)
+            self.assertIn('RuntimeError: boom', job.last_error)
+            Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+
+        (job,) = claim_jobs('default', 1, 'worker-a')
+        self.assertEqual(job.attempts, 3)
+        self.assertFalse(run_job(job))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_FAILED)
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(claim_jobs('default', 1, 'worker-a'), [])
+
+    def test_unknown_task_fails_the_job(self):
+        Job.objects.create(name='tests.missing', max_attempts=1)
+
+        (job,) = claim_jobs('default', 1, 'worker-a')
+        self.assertFalse(run_job(job))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_FAILED)
+        self.assertIn("No task registered as 'tests.missing'", job.last_error)
+
+    def test_concurrency_limit_holds_across_workers(self):
+        limited = register(self, 'tests.limited', concurrency=2)
+        limited.enqueue_many([{}] * 5)
+        register(self, 'tests.noop').enqueue()
+
+        first = claim_jobs('default', 10, 'worker-a')
+        self.assertEqual(sorted(job.name for job in first), ['tests.limited', 'tests.limited', 'tests.noop'])
+        self.assertEqual(claim_jobs('default', 10, 'worker-b'), [])
+
+        run_job(first[0])
+        self.assertEqual([job.name for job in claim_jobs('default', 10, 'worker-b')], ['tests.limited'])
+
+    def test_stale_jobs_are_requeued_unless_their_worker_is_alive(self):
+        register(self, 'tests.noop').enqueue_many([{}, {}])
+        alive, dead = claim_jobs('default', 2, 'worker-a')
+        register(self, 'tests.crash', max_attempts=1).enqueue()
+        (spent,) = claim_jobs('default', 1, 'worker-a')
+
+        with override_settings(JOBS_LOCK_TIMEOUT=60):
+            with mock.patch('django.utils.timezone.now', return_value=timezone.now() + timedelta(seconds=45)):
+                self.assertEqual(heartbeat([alive.pk], 'worker-a'), 1)
+                self.assertEqual(heartbeat([dead.pk], 'worker-b'), 0)
+            with mock.patch('django.utils.timezone.now', return_value=timezone.now() + timedelta(seconds=90)):
+                self.assertEqual(requeue_stale_jobs(), 1)
+
+        alive.refresh_from_db()
+        dead.refresh_from_db()
+        spent.refresh_from_db()
+        self.assertEqual(alive.status, Job.STATUS_RUNNING)
+        self.assertEqual((dead.status, dead.locked_at, dead.locked_by), (Job.STATUS_QUEUED, None, ''))
+        self.assertEqual((spent.status, spent.locked_by), (Job.STATUS_FAILED, ''))
+        self.assertIsNotNone(spent.finished_at)
+        self.assertIn('Worker stopped responding', spent.last_error)
+        self.assertEqual([job.pk for job in claim_jobs('default', 5, 'worker-b')], [dead.pk])
+
+
+class ConcurrentClaimTests(TransactionTestCase):
+    def test_workers_claiming_together_respect_the_limit(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            # Connections to SQLite's shared in-memory test database raise "table
+            # is locked" instead of waiting for each other; a file database waits.
+            self.skipTest('needs a test database that queues concurrent writers')
+        register(self, 'tests.limited', concurrency=2).enqueue_many([{}] * 8)
+        claimed = []
+        barrier = threading.Barrier(4)
+
+        def claim(worker):
+            try:
+                barrier.wait()
+                claimed.extend(claim_jobs('default', 4, worker))
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=claim, args=(f'worker-{index}',)) for index in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(claimed), 2)
+        self.assertEqual(Job.objects.filter(status=Job.STATUS_RUNNING).count(), 2)
@@ -0,0 +1,122 @@
+import logging
+import os
+import socket
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+from alagsbay.replicas import use_primary
+from .models import Job, TaskLock
+from .registry import TASKS
+# pylint: disable=no-member
+
+logger = logging.getLogger(__name__)
+
+
+def worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def requeue_stale_jobs():
+    """
+    Put back jobs whose worker died mid-run: a live worker refreshes
+    `locked_at` on its running jobs through heartbeat(), however long they take.
+    Jobs that have used up their attempts are failed instead, so one that
+    keeps killing its worker isn't retried forever.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.JOBS_LOCK_TIMEOUT)
+    stale = Job.objects.filter(status=Job.STATUS_RUNNING, locked_at__lt=cutoff)
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.STATUS_FAILED, finished_at=timezone.now(), locked_at=None, locked_by='',
+        last_error='Worker stopped responding on the last attempt')
+    if failed:
+        logger.warning('Failed %s stale job(s) with no attempts left', failed)
+    return stale.update(status=Job.STATUS_QUEUED, locked_at=None, locked_by='')
+
+
+def heartbeat(job_ids, locked_by):
+    """Mark the worker's running jobs as still alive so they aren't requeued."""
+    if not job_ids:
+        return 0
+    return Job.objects.filter(pk__in=job_ids, status=Job.STATUS_RUNNING, locked_by=locked_by).update(
+        locked_at=timezone.now())
+
+
+def claim_jobs(queue, limit, locked_by):
+    """
+    Atomically take up to `limit` due jobs off the queue. `SKIP LOCKED` lets
+    several workers poll the same table without waiting on each other, and
+    tasks with a concurrency limit are skipped while they are at it.
+
+    The running counts of limited tasks are read under a lock on their
+    TaskLock rows, so workers claiming at the same moment take turns instead
+    of all seeing the same free slots.
+    """
+    now = timezone.now()
+    limited = sorted(
+        name for name, registered in TASKS.items()
+        if registered.concurrency is not None and registered.queue == queue
+    )
+    with transaction.atomic():
+        if limited:
+            TaskLock.objects.bulk_create([TaskLock(name=name) for name in limited], ignore_conflicts=True)
+            list(TaskLock.objects.select_for_update().filter(name__in=limited).order_by('name'))
+        running = dict(
+            Job.objects.filter(status=Job.STATUS_RUNNING, queue=queue)
+            .values_list('name').annotate(count=Count('id'))
+        )
+        saturated = [
+            name for name, registered in TASKS.items()
+            if registered.concurrency is not None and running.get(name, 0) >= registered.concurrency
+        ]
+        candidates = (
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status=Job.STATUS_QUEUED, queue=queue, run_at__lte=now)
+            .exclude(name__in=saturated)
+            .order_by('run_at', 'id')[:limit]
+        )
+        jobs = []
+        for job in candidates:
+            registered = TASKS.get(job.name)
+            if registered is not None and registered.concurrency is not None:
+                if running.get(job.name, 0) >= registered.concurrency:
+                    continue
+                running[job.name] = running.get(job.name, 0) + 1
+            jobs.append(job)
+        Job.objects.filter(pk__in=[job.pk for job in jobs]).update(
+            status=Job.STATUS_RUNNING, locked_at=now, locked_by=locked_by, attempts=F('attempts') + 1)
+    for job in jobs:
+        job.attempts += 1
+    return jobs
+
+
+def run_job(job):
+    """
+    Run one claimed job and record the outcome, rescheduling it on failure.
+    Jobs read from the primary: they often run moments after the write that
+    queued them, before a replica has it.
+    """
+    registered = TASKS.get(job.name)
+    try:
+        if registered is None:
+            raise LookupError(f'No task registered as {job.name!r}')
+        with use_primary():
+            registered(**job.payload)
+    except Exception:  # pylint: disable=broad-except
+        error = traceback.format_exc()
+        logger.warning('Job %s (%s) failed on attempt %s', job.id, job.name, job.attempts)
+        if job.attempts < job.max_attempts:
+            backoff = settings.JOBS_RETRY_BACKOFF * 2 ** (job.attempts - 1)
+            Job.objects.filter(pk=job.pk).update(
+                status=Job.STATUS_QUEUED, run_at=timezone.now() + timedelta(seconds=backoff),
+                locked_at=None, locked_by='', last_error=error)
+        else:
+            Job.objects.filter(pk=job.pk).update(
+                status=Job.STATUS_FAILED, finished_at=timezone.now(), last_error=error)
+        return False
+
+    Job.objects.filter(pk=job.pk).update(status=Job.STATUS_DONE, finished_at=timezone.now())
+    return True
@@ -6,7 +6,9 @@ import sys
 
 def main():
     """Run administrative tasks."""
-    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'alagsbay.settings')
+    # The test suite adds a mirrored replica alias; see alagsbay/test_settings.py.
+    default_settings = 'alagsbay.test_settings' if sys.argv[1:2] == ['test'] else 'alagsbay.settings'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', default_settings)
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc:
@@ -0,0 +1,38 @@
+from django.db import transaction
+from store.customers import get_customer_id
+from store.models import Order
+from store.orders import refresh_order_totals
+from .ledger import debit_wallet
+# pylint: disable=no-member
+
+
+class OrderNotPayable(Exception):
+    """The order is already paid or has nothing to pay for."""
+
+
+def pay_order_from_wallet(user_id, order_id):
+    """
+    Settle one of the user's orders from their wallet: a DEBIT ledger entry
+    and the order's payment status flip happen in one transaction.
+
+    The debit reference is derived from the order, so the ledger itself
+    refuses to charge an order twice. Raises Order.DoesNotExist,
+    OrderNotPayable or InsufficientFunds.
+    """
+    with transaction.atomic():
+        order = Order.objects.select_for_update().get(pk=order_id, customer_id=get_customer_id(user_id))
+        if order.payment_status == Order.PAYMENT_STATUS_COMPLETE:
+            raise OrderNotPayable('Order is already paid.')
+
+        if not order.item_count:
+            # Placed before totals were stored and not backfilled yet.
+            refresh_order_totals([order.pk])
+            order.refresh_from_db(fields=['total_amount', 'item_count'])
+        if not order.item_count:
+            raise OrderNotPayable('Order has no items to pay for.')
+        amount = order.total_amount
+
+        entry = debit_wallet(user_id, amount, f'order-{order.pk}', description=f'Payment for order #{order.pk}')
+        order.payment_status = Order.PAYMENT_STATUS_COMPLETE
+        order.save(update_fields=['payment_status'])
+    return order, entry
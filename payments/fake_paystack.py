@@ -0,0 +1,121 @@
+"""
+A local stand-in for the Paystack API, for tests and benchmarks.
+
+Implements `POST /transaction/initialize` and `GET /transaction/verify/<ref>`
+with the same response envelope as Paystack. Point the app at it with
+`PAYSTACK_BASE_URL=http://127.0.0.1:<port>`. Every request is recorded in
+`requests`, and the next `fail_next` ones get a 503, for testing retries.
+"""
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from uuid import uuid4
+
+
+class FakePaystackHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def before_request(self):
+        server = self.server
+        with server.lock:
+            server.requests.append((self.command, self.path))
+            failing = server.fail_next > 0
+            if failing:
+                server.fail_next -= 1
+        if server.latency:
+            time.sleep(server.latency)
+        if failing or server.fail_rate and random.random() < server.fail_rate:
+            self.send_json(503, {'status': False, 'message': 'Service unavailable'})
+            return False
+        if not self.headers.get('Authorization', '').startswith('Bearer '):
+            self.send_json(401, {'status': False, 'message': 'Invalid key'})
+            return False
+        return True
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length) or b'{}')
+        if not self.before_request():
+            return
+        if self.path != '/transaction/initialize':
+            return self.send_json(404, {'status': False, 'message': 'Not found'})
+
+        reference = body.get('reference') or uuid4().hex[:12]
+        with self.server.lock:
+            self.server.transactions[reference] = {
+                'reference': reference,
+                'amount': int(body['amount']),
+                'status': self.server.outcome,
+                'metadata': body.get('metadata') or {},
+                'customer': {'email': body.get('email')},
+            }
+        self.send_json(200, {
+            'status': True,
+            'message': 'Authorization URL created',
+            'data': {
+                'authorization_url': f'https://checkout.paystack.com/{reference}',
+                'access_code': reference,
+                'reference': reference,
+            },
+        })
+
+    def do_GET(self):
+        if not self.before_request():
+            return
+        prefix = '/transaction/verify/'
+        if not self.path.startswith(prefix):
+            return self.send_json(404, {'status': False, 'message': 'Not found'})
+
+        with self.server.lock:
+            transaction = self.server.transactions.get(self.path[len(prefix):])
+        if transaction is None:
+            return self.send_json(400, {'status': False, 'message': 'Transaction reference not found'})
+        self.send_json(200, {'status': True, 'message': 'Verification successful', 'data': transaction})
+
+
+class FakePaystackServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, fail_rate=0.0, outcome='success'):
+        super().__init__((host, port), FakePaystackHandler)
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.outcome = outcome
+        self.transactions = {}
+        self.requests = []
+        self.fail_next = 0
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def handle_error(self, request, client_address):
+        # A client that timed out hangs up before a delayed response is written.
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def start(self):
+        """Serve from a background thread; returns the server for chaining."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
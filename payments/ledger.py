@@ -0,0 +1,142 @@
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, DecimalField, F, Sum, Value, When
+from django.db.models.functions import Coalesce
+from .models import UserWallet, WalletBalanceSnapshot, WalletTransaction
+# pylint: disable=no-member
+
+CREDIT = 'CREDIT'
+DEBIT = 'DEBIT'
+
+
+class InsufficientFunds(Exception):
+    """The wallet balance does not cover the debit."""
+
+
+class ReferenceConflict(Exception):
+    """The reference is already in the ledger for another wallet, type or amount."""
+
+
+def credit_wallet(user_id, amount, reference, description=''):
+    return post_transaction(user_id, CREDIT, amount, reference, description)
+
+
+def debit_wallet(user_id, amount, reference, description=''):
+    return post_transaction(user_id, DEBIT, amount, reference, description)
+
+
+def post_transaction(user_id, transaction_type, amount, reference, description=''):
+    """
+    Move `amount` in or out of the user's wallet and record it in the ledger,
+    in one transaction.
+
+    The balance changes with a single `UPDATE ... SET balance = balance +/- x`
+    (a debit also requires `balance >= x`), which locks the wallet row before
+    the ledger row is inserted. Replaying a reference that is already in the
+    ledger changes nothing and returns the existing entry; reusing it for a
+    different wallet, type or amount raises ReferenceConflict.
+    """
+    amount = Decimal(str(amount)).quantize(Decimal('0.01'))
+    if amount <= 0:
+        raise ValueError('Amount must be positive.')
+
+    wallet, created = UserWallet.objects.get_or_create(user_id=user_id)
+    wallets = UserWallet.objects.filter(pk=wallet.pk)
+
+    try:
+        with transaction.atomic():
+            if transaction_type == CREDIT:
+                wallets.update(balance=F('balance') + amount)
+            elif not wallets.filter(balance__gte=amount).update(balance=F('balance') - amount):
+                raise InsufficientFunds(f'Wallet balance is below {amount}.')
+
+            return WalletTransaction.objects.create(
+                wallet=wallet,
+                transaction_type=transaction_type,
+                amount=amount,
+                reference=reference,
+                description=description
+            )
+    except (IntegrityError, InsufficientFunds):
+        # Either may be a replay (a replayed debit can find its money already
+        # spent); the balance update rolled back with the savepoint.
+        existing = _posted_entry(wallet, transaction_type, amount, reference)
+        if existing is None:
+            raise
+        return existing
+
+
+def _posted_entry(wallet, transaction_type, amount, reference):
+    """
+    The entry already in the ledger under `reference`, or None. A locking
+    read returns the latest committed row even inside a caller's REPEATABLE
+    READ transaction whose snapshot predates the other posting.
+    """
+    with transaction.atomic():
+        existing = WalletTransaction.objects.select_for_update().filter(reference=reference).first()
+    if existing is not None and (existing.wallet_id, existing.transaction_type, existing.amount) != (
+            wallet.pk, transaction_type, amount):
+        raise ReferenceConflict(
+            f'{reference} was posted as a {existing.transaction_type} of {existing.amount} to wallet {existing.wallet_id}.')
+    return existing
+
+
+def ledger_balance(wallet_id, after_id=None):
+    """
+    Sum of the wallet's ledger, credits minus debits, optionally only over
+    entries with an id above `after_id`.
+    """
+    entries = WalletTransaction.objects.filter(wallet_id=wallet_id)
+    if after_id is not None:
+        entries = entries.filter(id__gt=after_id)
+
+    signed = Case(
+        When(transaction_type=DEBIT, then=-F('amount')),
+        default=F('amount'),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+    total = entries.aggregate(total=Coalesce(Sum(signed), Value(Decimal('0.00'))))['total']
+    return Decimal(total).quantize(Decimal('0.01'))
+
+
+def latest_snapshot(wallet_id):
+    return (
+        WalletBalanceSnapshot.objects.filter(wallet_id=wallet_id)
+        .order_by('-last_transaction_id')
+        .first()
+    )
+
+
+def rebuild_balance(wallet_id, snapshot=None):
+    """
+    The wallet balance according to its latest snapshot plus the ledger
+    entries posted since, without scanning the whole history.
+    """
+    snapshot = snapshot or latest_snapshot(wallet_id)
+    if snapshot is None:
+        return ledger_balance(wallet_id)
+    return snapshot.balance + ledger_balance(wallet_id, after_id=snapshot.last_transaction_id)
+
+
+def take_snapshot(wallet_id):
+    """
+    Record the wallet's ledger-derived balance. The wallet row is locked so no
+    posting can be half-way through while the ledger position is read.
+    Returns the new snapshot, or None when nothing was posted since the last one.
+    """
+    with transaction.atomic():
+        UserWallet.objects.select_for_update().get(pk=wallet_id)
+        last_id = (
+            WalletTransaction.objects.filter(wallet_id=wallet_id)
+            .order_by('-id').values_list('id', flat=True).first()
+        )
+        previous = latest_snapshot(wallet_id)
+        if last_id is None or (previous and previous.last_transaction_id >= last_id):
+            return None
+
+        return WalletBalanceSnapshot.objects.create(
+            wallet_id=wallet_id,
+            balance=rebuild_balance(wallet_id, snapshot=previous),
+            last_transaction_id=last_id
+        )
@@ -0,0 +1,47 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from payments.fake_paystack import FakePaystackServer
+from payments.paystack import PaystackClient, PaystackError
+
+
+class Command(BaseCommand):
+    help = 'Compare the pooled Paystack client with one-off requests against the fake Paystack server.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--latency', type=float, default=0.005)
+        parser.add_argument('--fail-rate', type=float, default=0.0)
+
+    def handle(self, *args, **options):
+        server = FakePaystackServer(latency=options['latency'], fail_rate=options['fail_rate']).start()
+        try:
+            client = PaystackClient(base_url=server.base_url, pool_size=options['workers'], backoff_factor=0.01)
+            reference = client.initialize_transaction('bench@example.com', 1000)['data']['reference']
+            headers = {'Authorization': f'Bearer {settings.PAYSTACK_SECRET_KEY}'}
+
+            def one_off(_):
+                requests.get(f'{server.base_url}/transaction/verify/{reference}', headers=headers, timeout=10)
+
+            def pooled(_):
+                try:
+                    client.verify_transaction(reference)
+                except PaystackError:
+                    pass
+
+            for label, call in [('one-off requests.get', one_off), ('pooled client', pooled)]:
+                started = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+                    list(pool.map(call, range(options['requests'])))
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f'{label:>22}: {options["requests"] / elapsed:8.1f} req/s, '
+                    f'{elapsed / options["requests"] * 1000:6.2f} ms/req'
+                )
+            client.close()
+        finally:
+            server.stop()
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from payments.exports import CHUNK_SIZE, CONTENT_TYPES, EXPORTS, ExportParamsSerializer, export_lines
+
+
+class Command(BaseCommand):
+    help = 'Stream orders, order items, payments or wallet transactions to CSV or JSON Lines for reporting.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('export', choices=list(EXPORTS))
+        parser.add_argument('--format', choices=list(CONTENT_TYPES), default='csv')
+        parser.add_argument('--after', help='ISO 8601 date or datetime, inclusive.')
+        parser.add_argument('--before', help='ISO 8601 date or datetime, exclusive.')
+        parser.add_argument('--output', help='File to write; defaults to stdout.')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        params = ExportParamsSerializer(data={
+            name: options[name] for name in ('after', 'before') if options[name]
+        })
+        if not params.is_valid():
+            raise CommandError('; '.join(f'--{name}: {errors[0]}' for name, errors in params.errors.items()))
+
+        lines = export_lines(EXPORTS[options['export']], options['format'], params.validated_data.get('after'),
+                             params.validated_data.get('before'), options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                output.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from payments.fake_paystack import FakePaystackServer
+
+
+class Command(BaseCommand):
+    help = 'Run a local fake Paystack API for development and benchmarks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every response.')
+        parser.add_argument('--fail-rate', type=float, default=0.0, help='Fraction of requests answered with 503.')
+        parser.add_argument('--outcome', default='success', help='Status reported for verified transactions.')
+
+    def handle(self, *args, **options):
+        server = FakePaystackServer(
+            options['host'], options['port'],
+            latency=options['latency'], fail_rate=options['fail_rate'], outcome=options['outcome'])
+        self.stdout.write(f'Fake Paystack listening on {server.base_url} (PAYSTACK_BASE_URL={server.base_url})')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
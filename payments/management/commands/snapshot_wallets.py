@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from payments.ledger import rebuild_balance, take_snapshot
+from payments.models import UserWallet
+# pylint: disable=no-member
+
+
+class Command(BaseCommand):
+    help = 'Snapshot wallet balances from the ledger; run periodically so balances can be rebuilt from recent entries only.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--audit', action='store_true', help='Compare every stored balance with snapshot + ledger first.')
+
+    def handle(self, *args, **options):
+        taken = mismatches = 0
+        for wallet in UserWallet.objects.only('id', 'balance').iterator(chunk_size=1000):
+            if options['audit']:
+                expected = rebuild_balance(wallet.id)
+                if expected != wallet.balance:
+                    mismatches += 1
+                    self.stderr.write(f'Wallet {wallet.id}: stored {wallet.balance}, ledger says {expected}')
+            if take_snapshot(wallet.id):
+                taken += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Took {taken} snapshot(s).'))
+        if options['audit']:
+            self.stdout.write(f'{mismatches} wallet(s) out of balance.')
@@ -0,0 +1,72 @@
+import random
+import threading
+import time
+from decimal import Decimal
+from uuid import uuid4
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections
+from payments.ledger import InsufficientFunds, credit_wallet, debit_wallet, ledger_balance
+from payments.models import UserWallet
+# pylint: disable=no-member
+
+
+class Command(BaseCommand):
+    help = 'Hammer one wallet with concurrent credits, debits and replayed references, then check it against its ledger.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=16)
+        parser.add_argument('--operations', type=int, default=200, help='Operations per worker.')
+        parser.add_argument('--replay-rate', type=float, default=0.2, help='Fraction of operations reusing a posted reference.')
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.create(
+            username=f'stress-{uuid4().hex[:12]}', email=f'{uuid4().hex}@stress.invalid')
+        posted = []
+        counts = {'credit': 0, 'debit': 0, 'insufficient': 0, 'replayed': 0, 'errors': 0}
+        lock = threading.Lock()
+
+        def work():
+            rng = random.Random()
+            for _ in range(options['operations']):
+                with lock:
+                    replay = posted and rng.random() < options['replay_rate']
+                    if replay:
+                        reference, operation, amount = rng.choice(posted)
+                if not replay:
+                    reference = uuid4().hex
+                    operation = credit_wallet if rng.random() < 0.55 else debit_wallet
+                    amount = Decimal(rng.randint(1, 5000)) / 100
+                try:
+                    operation(user.id, amount, reference)
+                    outcome = 'replayed' if replay else operation.__name__.split('_')[0]
+                except InsufficientFunds:
+                    outcome = 'insufficient'
+                except OperationalError:
+                    outcome = 'errors'
+                with lock:
+                    counts[outcome] += 1
+                    if not replay and outcome in ('credit', 'debit'):
+                        posted.append((reference, operation, amount))
+            connections.close_all()
+
+        threads = [threading.Thread(target=work) for _ in range(options['workers'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        wallet = UserWallet.objects.get(user=user)
+        expected = ledger_balance(wallet.id)
+        total = options['workers'] * options['operations']
+        self.stdout.write(f'{total} operations in {elapsed:.2f}s ({total / elapsed:.1f} ops/sec): {counts}')
+        self.stdout.write(f'balance={wallet.balance} ledger={expected}')
+        if wallet.balance != expected or wallet.balance < 0:
+            self.stderr.write(self.style.ERROR('Balance does not match the ledger.'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Balance matches the ledger.'))
+
+        user.delete()
@@ -29,6 +29,16 @@ class WalletTransaction(models.Model):
     # def __str__(self):
     #     return f"{self.transaction_type} - {self.amount} ({self.reference})"
 
+class WalletBalanceSnapshot(models.Model):
+    wallet = models.ForeignKey(UserWallet, on_delete=models.CASCADE, related_name='snapshots')
+    balance = models.DecimalField(max_digits=10, decimal_places=2)
+    last_transaction_id = models.BigIntegerField()  # ledger entries up to and including this id
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['wallet', 'last_transaction_id'])]
+
+
 class PaymentLog(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     gateway = models.CharField(max_length=50)  # 'stripe' or 'paystack'
@@ -0,0 +1,94 @@
+import threading
+
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class PaystackError(Exception):
+    """Paystack could not be reached or rejected the request."""
+
+
+class PaystackClient:
+    """
+    Paystack API client over one pooled keep-alive session.
+
+    Every call has a (connect, read) timeout. Connection failures are retried
+    with exponential backoff for every method, while 429/5xx responses are
+    only retried for idempotent GETs so a transaction is never initialized
+    twice.
+    """
+    def __init__(self, secret_key=None, base_url=None, timeout=None, max_retries=None,
+                 backoff_factor=None, pool_size=None):
+        self.base_url = (base_url or settings.PAYSTACK_BASE_URL).rstrip('/')
+        self.timeout = timeout or settings.PAYSTACK_TIMEOUT
+        retry = Retry(
+            total=settings.PAYSTACK_MAX_RETRIES if max_retries is None else max_retries,
+            backoff_factor=settings.PAYSTACK_BACKOFF_FACTOR if backoff_factor is None else backoff_factor,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=['GET'],
+            raise_on_status=False,
+        )
+        pool_size = pool_size or settings.PAYSTACK_POOL_SIZE
+        adapter = HTTPAdapter(max_retries=retry, pool_connections=1, pool_maxsize=pool_size)
+
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'Authorization': f'Bearer {secret_key or settings.PAYSTACK_SECRET_KEY}',
+            'Content-Type': 'application/json',
+        })
+
+    def request(self, method, path, **kwargs):
+        try:
+            response = self.session.request(method, f'{self.base_url}{path}', timeout=self.timeout, **kwargs)
+            response.raise_for_status()
+            return response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            raise PaystackError(str(e)) from e
+
+    def initialize_transaction(self, email, amount, metadata=None, reference=None):
+        """`amount` is in the smallest currency unit (kobo/pesewas)."""
+        payload = {'email': email, 'amount': str(amount), 'metadata': metadata or {}}
+        if reference:
+            payload['reference'] = reference
+        return self.request('POST', '/transaction/initialize', json=payload)
+
+    def verify_transaction(self, reference):
+        return self.request('GET', f'/transaction/verify/{reference}')
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncPaystackClient:
+    """
+    Awaitable wrapper for ASGI views. Calls run on a worker thread against the
+    shared pooled client, so they don't block the event loop but still reuse
+    its connections, timeouts and retries.
+    """
+    def __init__(self, client=None):
+        self.client = client or get_client()
+
+    async def initialize_transaction(self, *args, **kwargs):
+        return await sync_to_async(self.client.initialize_transaction, thread_sensitive=False)(*args, **kwargs)
+
+    async def verify_transaction(self, reference):
+        return await sync_to_async(self.client.verify_transaction, thread_sensitive=False)(reference)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return the process-wide client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = PaystackClient()
+    return _client
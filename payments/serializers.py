@@ -21,3 +21,7 @@ class PaymentLogSerializer(serializers.ModelSerializer):
         model = PaymentLog
         fields = '__all__'
         read_only_fields = ['id', 'user', 'created_at']
+
+
+class WalletCheckoutSerializer(serializers.Serializer):
+    order_id = serializers.IntegerField()
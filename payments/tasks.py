@@ -0,0 +1,30 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from jobs.registry import task
+from .models import PaymentLog
+from .paystack import get_client
+from .webhooks import confirm_payment
+# pylint: disable=no-member
+
+
+@task(max_attempts=8)
+def reconcile_payment(reference, check=0):
+    """
+    Settle a payment with Paystack directly if its webhook never arrived.
+    While the checkout is unfinished the check is repeated with backoff,
+    until PAYSTACK_RECONCILE_WINDOW_SECONDS after the payment started.
+    A PaystackError fails the job, which is retried with backoff.
+    """
+    payment_log = PaymentLog.objects.filter(reference=reference, status='pending').first()
+    if payment_log is None:
+        return
+    data = get_client().verify_transaction(reference)
+    payment_log = confirm_payment(reference, data.get('data') or {})
+
+    if payment_log.status == 'pending':
+        delay = min(settings.PAYSTACK_WEBHOOK_GRACE_SECONDS * 2 ** (check + 1), settings.PAYSTACK_RECONCILE_MAX_DELAY)
+        deadline = payment_log.created_at + timedelta(seconds=settings.PAYSTACK_RECONCILE_WINDOW_SECONDS)
+        if timezone.now() + timedelta(seconds=delay) <= deadline:
+            reconcile_payment.enqueue(delay=delay, reference=reference, check=check + 1)
@@ -1,3 +1,524 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import json
+import socket
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.utils import timezone
+from jobs.models import Job
+from rest_framework.test import APIClient
+from .exports import CONTENT_TYPES, EXPORTS, export_lines
+from .fake_paystack import FakePaystackServer
+from store.models import Collection, Customer, Order, OrderItem, Product
+from .checkout import OrderNotPayable, pay_order_from_wallet
+from .ledger import (
+    InsufficientFunds, ReferenceConflict, credit_wallet, debit_wallet, ledger_balance, rebuild_balance, take_snapshot
+)
+from .models import PaymentLog, UserWallet, WalletBalanceSnapshot, WalletTransaction
+from .paystack import PaystackClient, PaystackError
+from .tasks import reconcile_payment
+from .webhooks import confirm_payment
+# pylint: disable=no-member
+
+
+class PaystackClientTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = FakePaystackServer().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        with self.server.lock:
+            self.server.transactions.clear()
+            self.server.requests.clear()
+            self.server.fail_next = 0
+        self.server.latency = 0.0
+
+    def client_for(self, base_url=None, **kwargs):
+        client = PaystackClient(base_url=base_url or self.server.base_url, **kwargs)
+        self.addCleanup(client.close)
+        return client
+
+    def backoffs(self, call):
+        """Run `call` and return the backoff sleeps urllib3 took between retries."""
+        with mock.patch('urllib3.util.retry.time') as clock:
+            try:
+                call()
+            finally:
+                sleeps = [args[0] for args, _ in clock.sleep.call_args_list]
+        return sleeps
+
+    def test_initialize_and_verify(self):
+        client = self.client_for()
+        data = client.initialize_transaction('payer@example.com', 5000, metadata={'user_id': 7}, reference='ref-1')['data']
+        self.assertEqual(data['reference'], 'ref-1')
+        self.assertTrue(data['authorization_url'].endswith('/ref-1'))
+
+        transaction = client.verify_transaction('ref-1')['data']
+        self.assertEqual((transaction['status'], transaction['amount']), ('success', 5000))
+        self.assertEqual(transaction['metadata'], {'user_id': 7})
+        with self.assertRaises(PaystackError):
+            client.verify_transaction('missing')
+
+    def test_verify_retries_server_errors_with_backoff(self):
+        client = self.client_for(max_retries=3, backoff_factor=0.1)
+        client.initialize_transaction('payer@example.com', 5000, reference='ref-1')
+        self.server.fail_next = 3
+
+        sleeps = self.backoffs(lambda: client.verify_transaction('ref-1'))
+        self.assertEqual(sleeps, [0.2, 0.4])
+        self.assertEqual(self.server.requests.count(('GET', '/transaction/verify/ref-1')), 4)
+
+    def test_verify_gives_up_after_max_retries(self):
+        client = self.client_for(max_retries=2, backoff_factor=0)
+        self.server.fail_next = 5
+
+        with self.assertRaises(PaystackError):
+            client.verify_transaction('ref-1')
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_initialize_is_not_retried_after_a_server_error(self):
+        client = self.client_for(max_retries=3, backoff_factor=0)
+        self.server.fail_next = 1
+
+        with self.assertRaises(PaystackError):
+            client.initialize_transaction('payer@example.com', 5000)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_read_timeouts(self):
+        self.server.latency = 0.5
+        client = self.client_for(timeout=(1, 0.1), max_retries=1, backoff_factor=0)
+
+        started = time.perf_counter()
+        with self.assertRaises(PaystackError):
+            client.initialize_transaction('payer@example.com', 5000)
+        self.assertLess(time.perf_counter() - started, 0.5)
+        with self.assertRaises(PaystackError):
+            client.verify_transaction('ref-1')
+        # The POST may have reached Paystack, so only the GET is sent again.
+        self.assertEqual([method for method, _ in self.server.requests], ['POST', 'GET', 'GET'])
+
+    def test_connection_failures_are_retried_with_backoff(self):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            closed_url = 'http://127.0.0.1:{}'.format(sock.getsockname()[1])
+        client = self.client_for(closed_url, max_retries=3, backoff_factor=0.1)
+
+        # Nothing was sent, so even the POST is tried again.
+        for call in (lambda: client.initialize_transaction('payer@example.com', 5000),
+                     lambda: client.verify_transaction('ref-1')):
+            self.assertEqual(self.backoffs(lambda: self.assertRaises(PaystackError, call)), [0.2, 0.4])
+
+
+class ConfirmPaymentTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='payer', password='!')
+        self.log = PaymentLog.objects.create(
+            user=self.user, gateway='paystack', reference='ref-1', amount=50, status='pending')
+
+    def send_webhook(self, status, amount=5000):
+        body = json.dumps({'event': 'charge.success', 'data': {
+            'reference': 'ref-1', 'status': status, 'amount': amount}}).encode()
+        signature = hmac.new(settings.PAYSTACK_SECRET_KEY.encode(), body, hashlib.sha512).hexdigest()
+        return APIClient().post('/payments/paystack/webhook/', body, content_type='application/json',
+                                HTTP_X_PAYSTACK_SIGNATURE=signature)
+
+    def balance(self):
+        return UserWallet.objects.get(user=self.user).balance
+
+    def test_unfinished_checkout_stays_pending(self):
+        for status in ('abandoned', 'ongoing', 'pending'):
+            confirm_payment('ref-1', {'status': status, 'amount': 5000})
+            self.log.refresh_from_db()
+            self.assertEqual(self.log.status, 'pending')
+
+    def test_success_after_abandoned_credits_wallet(self):
+        confirm_payment('ref-1', {'status': 'abandoned', 'amount': 5000})
+        self.assertEqual(self.send_webhook('success').status_code, 200)
+        self.log.refresh_from_db()
+        self.assertEqual(self.log.status, 'success')
+        self.assertEqual(self.balance(), Decimal('50.00'))
+
+    def test_success_completes_failed_log_once(self):
+        confirm_payment('ref-1', {'status': 'failed', 'amount': 5000})
+        self.log.refresh_from_db()
+        self.assertEqual(self.log.status, 'failed')
+
+        self.send_webhook('success')
+        self.send_webhook('success')
+        self.log.refresh_from_db()
+        self.assertEqual(self.log.status, 'success')
+        self.assertEqual(self.balance(), Decimal('50.00'))
+        self.assertEqual(WalletTransaction.objects.filter(reference='ref-1').count(), 1)
+
+    def test_verify_is_a_local_read(self):
+        PaymentLog.objects.filter(pk=self.log.pk).update(created_at=timezone.now() - timedelta(hours=1))
+        api = APIClient()
+        api.force_authenticate(self.user)
+
+        with mock.patch('payments.views.get_client') as get_client:
+            response = api.post('/payments/paystack/verify/', {'reference': 'ref-1'})
+            self.assertEqual(response.data['status'], 'pending')
+            self.send_webhook('success')
+            response = api.post('/payments/paystack/verify/', {'reference': 'ref-1'})
+            self.assertEqual(response.data['status'], 'success')
+        get_client.assert_not_called()
+
+    def test_failure_does_not_undo_success(self):
+        self.send_webhook('success')
+        confirm_payment('ref-1', {'status': 'reversed', 'amount': 5000})
+        self.log.refresh_from_db()
+        self.assertEqual(self.log.status, 'success')
+
+
+class ReconcilePaymentTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = FakePaystackServer(outcome='abandoned').start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.paystack = PaystackClient(base_url=self.server.base_url, backoff_factor=0)
+        patcher = mock.patch('payments.tasks.get_client', return_value=self.paystack)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.paystack.close)
+
+        self.user = get_user_model().objects.create_user(username='payer', password='!')
+        reference = self.paystack.initialize_transaction('payer@example.com', 5000)['data']['reference']
+        self.log = PaymentLog.objects.create(
+            user=self.user, gateway='paystack', reference=reference, amount=50, status='pending')
+
+    def set_outcome(self, status):
+        with self.server.lock:
+            self.server.transactions[self.log.reference]['status'] = status
+
+    def scheduled_checks(self):
+        return list(Job.objects.filter(name=reconcile_payment.name).order_by('run_at').values_list('payload', 'run_at'))
+
+    def test_unfinished_checkout_is_checked_again_with_backoff(self):
+        reconcile_payment(reference=self.log.reference)
+        reconcile_payment(reference=self.log.reference, check=1)
+        self.log.refresh_from_db()
+        self.assertEqual(self.log.status, 'pending')
+
+        (first, first_at), (second, second_at) = self.scheduled_checks()
+        self.assertEqual([first['check'], second['check']], [1, 2])
+        self.assertGreater(second_at - first_at, timedelta(seconds=100))
+
+        self.set_outcome('success')
+        reconcile_payment(**second)
+        self.log.refresh_from_db()
+        self.assertEqual(self.log.status, 'success')
+        self.assertEqual(UserWallet.objects.get(user=self.user).balance, Decimal('50.00'))
+
+    def test_gives_up_after_the_window(self):
+        PaymentLog.objects.filter(pk=self.log.pk).update(created_at=timezone.now() - timedelta(hours=3))
+        reconcile_payment(reference=self.log.reference, check=6)
+        self.assertEqual(self.scheduled_checks(), [])
+        self.log.refresh_from_db()
+        self.assertEqual(self.log.status, 'pending')
+
+
+class LedgerTests(TransactionTestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='holder', email='holder@example.com', password='!')
+
+    def wallet(self):
+        return UserWallet.objects.get(user=self.user)
+
+    def run_concurrently(self, operations):
+        """Run each operation on its own thread and connection; returns the outcomes in order."""
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            # Connections to SQLite's shared in-memory test database raise "table
+            # is locked" instead of waiting for each other; a file database waits.
+            self.skipTest('needs a test database that queues concurrent writers')
+        outcomes = [None] * len(operations)
+        barrier = threading.Barrier(len(operations))
+
+        def run(index, operation):
+            try:
+                barrier.wait()
+                outcomes[index] = operation()
+            except Exception as e:  # pylint: disable=broad-except
+                outcomes[index] = e
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=run, args=pair) for pair in enumerate(operations)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return outcomes
+
+    def test_concurrent_posts_of_one_reference_apply_once(self):
+        outcomes = self.run_concurrently([lambda: credit_wallet(self.user.id, 25, 'topup-1')] * 8)
+
+        self.assertEqual({entry.pk for entry in outcomes}, {WalletTransaction.objects.get(reference='topup-1').pk})
+        self.assertEqual(self.wallet().balance, Decimal('25.00'))
+
+    def test_concurrent_debits_never_overdraw(self):
+        credit_wallet(self.user.id, 100, 'topup-1')
+        outcomes = self.run_concurrently([
+            lambda index=index: debit_wallet(self.user.id, 30, f'order-{index}') for index in range(6)
+        ])
+
+        self.assertEqual(sum(isinstance(outcome, WalletTransaction) for outcome in outcomes), 3)
+        self.assertEqual(sum(isinstance(outcome, InsufficientFunds) for outcome in outcomes), 3)
+        self.assertEqual(self.wallet().balance, Decimal('10.00'))
+        self.assertEqual(ledger_balance(self.wallet().pk), Decimal('10.00'))
+
+    def test_replay_returns_the_existing_entry(self):
+        entry = credit_wallet(self.user.id, 40, 'topup-1')
+        debit = debit_wallet(self.user.id, 40, 'order-1')
+
+        self.assertEqual(credit_wallet(self.user.id, '40.00', 'topup-1'), entry)
+        # The balance is spent, but the debit was already posted.
+        self.assertEqual(debit_wallet(self.user.id, 40, 'order-1'), debit)
+        with transaction.atomic():
+            self.assertEqual(credit_wallet(self.user.id, 40, 'topup-1'), entry)
+        self.assertEqual(self.wallet().balance, Decimal('0.00'))
+
+    def test_replay_with_other_details_raises(self):
+        credit_wallet(self.user.id, 40, 'topup-1')
+        other = get_user_model().objects.create_user(username='other', email='other@example.com', password='!')
+
+        with self.assertRaises(ReferenceConflict):
+            credit_wallet(self.user.id, 41, 'topup-1')
+        with self.assertRaises(ReferenceConflict):
+            debit_wallet(self.user.id, 40, 'topup-1')
+        with self.assertRaises(ReferenceConflict):
+            credit_wallet(other.id, 40, 'topup-1')
+        self.assertEqual(self.wallet().balance, Decimal('40.00'))
+
+
+class WalletApiTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='holder', email='holder@example.com', password='!')
+        self.wallet = credit_wallet(self.user.id, 40, 'topup-1').wallet
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def test_wallet_is_read_only(self):
+        self.assertEqual(self.api.get('/payments/wallet/').status_code, 200)
+        self.assertEqual(self.api.get(f'/payments/wallet/{self.wallet.pk}/').status_code, 200)
+        self.assertEqual(self.api.get('/payments/wallet/balance/').data['balance'], Decimal('40.00'))
+
+        detail = f'/payments/wallet/{self.wallet.pk}/'
+        for response in (
+            self.api.post('/payments/wallet/', {'currency': 'USD'}),
+            self.api.put(detail, {'currency': 'USD'}),
+            self.api.patch(detail, {'currency': 'USD'}),
+            self.api.delete(detail),
+        ):
+            self.assertEqual(response.status_code, 405)
+        self.assertEqual(UserWallet.objects.get().currency, self.wallet.currency)
+        self.assertEqual(WalletTransaction.objects.count(), 1)
+
+    def test_balance_without_a_wallet_is_zero(self):
+        newcomer = get_user_model().objects.create_user(username='new', email='new@example.com', password='!')
+        self.api.force_authenticate(newcomer)
+
+        response = self.api.get('/payments/wallet/balance/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['balance'], Decimal('0.00'))
+        self.assertIsInstance(response.data['balance'], Decimal)
+        self.assertEqual(response.data['currency'], 'GHS')
+        self.assertFalse(UserWallet.objects.filter(user=newcomer).exists())
+
+
+class WalletCheckoutTests(TestCase):
+    def setUp(self):
+        cache.clear()  # customer ids cached by earlier tests
+        self.user = get_user_model().objects.create_user(username='holder', email='holder@example.com', password='!')
+        credit_wallet(self.user.id, 40, 'topup-1')
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+        self.product = Product.objects.create(
+            title='Mug', description='', unit_price=5, inventory=10,
+            collection=Collection.objects.create(title='Kitchen'))
+
+    def order(self, quantity, user=None):
+        customer, _ = Customer.objects.get_or_create(user=user or self.user)
+        order = Order.objects.create(customer=customer, total_amount=5 * quantity, item_count=quantity)
+        OrderItem.objects.create(order=order, product=self.product, quantity=quantity, unit_price=5)
+        return order
+
+    def pay(self, order):
+        return self.api.post('/payments/wallet/pay/', {'order_id': order.pk}, format='json')
+
+    def balance(self):
+        return UserWallet.objects.get(user=self.user).balance
+
+    def test_pays_the_order_from_the_wallet(self):
+        order = self.order(3)
+        response = self.pay(order)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['payment_status'], Order.PAYMENT_STATUS_COMPLETE)
+        self.assertEqual(response.data['reference'], f'order-{order.pk}')
+
+        order.refresh_from_db()
+        self.assertEqual(order.payment_status, Order.PAYMENT_STATUS_COMPLETE)
+        entry = WalletTransaction.objects.get(reference=f'order-{order.pk}')
+        self.assertEqual((entry.transaction_type, entry.amount), ('DEBIT', Decimal('15.00')))
+        self.assertEqual(self.balance(), Decimal('25.00'))
+
+    def test_debit_rolls_back_when_the_status_flip_fails(self):
+        order = self.order(3)
+        with mock.patch.object(Order, 'save', side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                pay_order_from_wallet(self.user.id, order.pk)
+
+        self.assertFalse(WalletTransaction.objects.filter(reference=f'order-{order.pk}').exists())
+        self.assertEqual(self.balance(), Decimal('40.00'))
+
+    def test_paid_order_is_refused(self):
+        order = self.order(1)
+        self.assertEqual(self.pay(order).status_code, 200)
+
+        response = self.pay(order)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'Order is already paid.')
+        with self.assertRaises(OrderNotPayable):
+            pay_order_from_wallet(self.user.id, order.pk)
+        self.assertEqual(WalletTransaction.objects.filter(transaction_type='DEBIT').count(), 1)
+        self.assertEqual(self.balance(), Decimal('35.00'))
+
+    def test_insufficient_funds_leave_the_order_pending(self):
+        order = self.order(9)
+        response = self.pay(order)
+        self.assertEqual(response.status_code, 400)
+
+        order.refresh_from_db()
+        self.assertEqual(order.payment_status, Order.PAYMENT_STATUS_PENDING)
+        self.assertFalse(WalletTransaction.objects.filter(transaction_type='DEBIT').exists())
+        self.assertEqual(self.balance(), Decimal('40.00'))
+
+    def test_another_customers_order_is_not_found(self):
+        other = get_user_model().objects.create_user(username='other', email='other@example.com', password='!')
+        order = self.order(1, user=other)
+
+        self.assertEqual(self.pay(order).status_code, 404)
+        order.refresh_from_db()
+        self.assertEqual(order.payment_status, Order.PAYMENT_STATUS_PENDING)
+        self.assertEqual(self.balance(), Decimal('40.00'))
+
+
+class WalletSnapshotTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='holder', email='holder@example.com', password='!')
+        self.wallet = credit_wallet(self.user.id, 40, 'topup-1').wallet
+
+    def stored_balance(self):
+        return UserWallet.objects.get(pk=self.wallet.pk).balance
+
+    def test_snapshot_plus_recent_entries_equal_the_balance(self):
+        debit_wallet(self.user.id, 15, 'order-1')
+        snapshot = take_snapshot(self.wallet.pk)
+        self.assertEqual(snapshot.balance, Decimal('25.00'))
+        self.assertEqual(snapshot.last_transaction_id, WalletTransaction.objects.latest('id').pk)
+
+        credit_wallet(self.user.id, 10, 'topup-2')
+        debit_wallet(self.user.id, 5, 'order-2')
+        self.assertEqual(rebuild_balance(self.wallet.pk), self.stored_balance())
+        self.assertEqual(self.stored_balance(), Decimal('30.00'))
+
+        # Only the entries after the snapshot are summed.
+        with mock.patch('payments.ledger.ledger_balance', wraps=ledger_balance) as summed:
+            rebuild_balance(self.wallet.pk)
+        summed.assert_called_once_with(self.wallet.pk, after_id=snapshot.last_transaction_id)
+
+    def test_snapshot_is_skipped_when_nothing_was_posted(self):
+        self.assertIsNotNone(take_snapshot(self.wallet.pk))
+        self.assertIsNone(take_snapshot(self.wallet.pk))
+
+        credit_wallet(self.user.id, 5, 'topup-2')
+        self.assertEqual(take_snapshot(self.wallet.pk).balance, self.stored_balance())
+        self.assertEqual(WalletBalanceSnapshot.objects.count(), 2)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='payer', email='payer@example.com', password='!')
+        self.logs = []
+        for day in range(1, 6):
+            log = PaymentLog.objects.create(
+                user=self.user, gateway='paystack', reference=f'ref-{day}', amount=day, status='success')
+            PaymentLog.objects.filter(pk=log.pk).update(created_at=datetime(2026, 1, day, 12, tzinfo=dt_timezone.utc))
+            self.logs.append(log)
+
+    def test_batches_page_through_every_row_by_key(self):
+        with self.assertNumQueries(4):
+            batches = list(EXPORTS['payments'].batches(chunk_size=2))
+        self.assertEqual([len(rows) for rows in batches], [2, 2, 1])
+        self.assertEqual([row[0] for rows in batches for row in rows], [log.pk for log in self.logs])
+
+    def test_date_range_is_inclusive_after_and_exclusive_before(self):
+        rows = [row for rows in EXPORTS['payments'].batches(
+            after=datetime(2026, 1, 2, 12, tzinfo=dt_timezone.utc),
+            before=datetime(2026, 1, 4, 12, tzinfo=dt_timezone.utc), chunk_size=1) for row in rows]
+        self.assertEqual([row[0] for row in rows], [log.pk for log in self.logs[1:3]])
+
+    def test_csv_has_a_header_and_one_line_per_row(self):
+        lines = ''.join(export_lines(EXPORTS['payments'], 'csv', chunk_size=2)).splitlines()
+        self.assertEqual(lines[0], ','.join(EXPORTS['payments'].headers))
+        self.assertEqual(len(lines), 6)
+        self.assertEqual(lines[1], f'{self.logs[0].pk},2026-01-01T12:00:00+00:00,{self.user.pk},'
+                                   'payer@example.com,paystack,ref-1,1.00,success')
+
+    def test_jsonl_has_one_object_per_row(self):
+        lines = ''.join(export_lines(EXPORTS['payments'], 'jsonl', chunk_size=2)).splitlines()
+        self.assertEqual([json.loads(line)['reference'] for line in lines], [f'ref-{day}' for day in range(1, 6)])
+        self.assertEqual(json.loads(lines[0])['amount'], '1.00')
+
+    def test_export_data_writes_every_batch(self):
+        out = StringIO()
+        call_command('export_data', 'payments', '--format', 'jsonl', '--chunk-size', '2',
+                     '--after', '2026-01-03', stdout=out)
+        self.assertEqual([json.loads(line)['reference'] for line in out.getvalue().splitlines()],
+                         ['ref-3', 'ref-4', 'ref-5'])
+
+    def test_endpoint_is_staff_only(self):
+        api = APIClient()
+        self.assertEqual(api.get('/payments/exports/payments/').status_code, 401)
+        api.force_authenticate(self.user)
+        self.assertEqual(api.get('/payments/exports/').status_code, 403)
+        self.assertEqual(api.get('/payments/exports/payments/').status_code, 403)
+
+    def test_endpoint_streams_the_export(self):
+        api = APIClient()
+        api.force_authenticate(get_user_model().objects.create_user(
+            username='staff', email='staff@example.com', password='!', is_staff=True))
+        self.assertEqual(api.get('/payments/exports/').data['payments'], EXPORTS['payments'].headers)
+
+        response = api.get('/payments/exports/payments/', {'file_format': 'jsonl', 'before': '2026-01-03'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], CONTENT_TYPES['jsonl'])
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="payments.jsonl"')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['reference'] for line in lines], ['ref-1', 'ref-2'])
+
+        self.assertEqual(api.get('/payments/exports/refunds/').status_code, 404)
+        self.assertEqual(api.get('/payments/exports/payments/', {'after': 'yesterday'}).status_code, 400)
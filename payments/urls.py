@@ -5,7 +5,9 @@ router = DefaultRouter()
 
 router.register('payments', views.PaymentLogViewSet, basename='payments')
 router.register('verify-payment', views.PaymentLogViewSet, basename='verify-payments')
-router.register('transactions', views.PaymentLogViewSet, basename='transactions')
-router.register('wallet', views.PaymentLogViewSet, basename='wallet')
+router.register('transactions', views.WalletTransactionViewSet, basename='transactions')
+router.register('wallet', views.UserWalletViewSet, basename='wallet')
+router.register('paystack', views.PaystackPaymentViewSet, basename='paystack')
+router.register('exports', views.ExportViewSet, basename='exports')
 
 urlpatterns = router.urls
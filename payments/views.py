@@ -1,30 +1,64 @@
 # views.py
-import requests
-from rest_framework import viewsets, permissions, status
+import json
+from decimal import Decimal
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework import viewsets, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
-from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
+from rest_framework.mixins import ListModelMixin, RetrieveModelMixin
+from rest_framework.viewsets import GenericViewSet, ReadOnlyModelViewSet
+from store.models import Order
+from .checkout import OrderNotPayable, pay_order_from_wallet
+from .exports import CONTENT_TYPES, EXPORTS, ExportParamsSerializer, export_lines
+from .ledger import InsufficientFunds
 from .models import UserWallet, WalletTransaction, PaymentLog
-from .serializers import UserWalletSerializer, WalletTransactionSerializer, PaymentLogSerializer
-from django.conf import settings
+from .serializers import UserWalletSerializer, WalletTransactionSerializer, PaymentLogSerializer, WalletCheckoutSerializer
+from .paystack import PaystackError, get_client
+from .tasks import reconcile_payment
+from .webhooks import confirm_payment, is_valid_signature
 # pylint: disable=no-member
 
-class UserWalletViewSet(ModelViewSet):
+class UserWalletViewSet(ListModelMixin, RetrieveModelMixin, GenericViewSet):
+    # Read-only apart from `pay`: the wallet only changes through the ledger.
     serializer_class = UserWalletSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         return UserWallet.objects.filter(user=self.request.user)
 
-    def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
-
     @action(detail=False, methods=['GET'])
     def balance(self, request):
-        wallet = UserWallet.objects.get(user=request.user)
+        # A read: wallets are only created by the first ledger posting.
+        wallet = UserWallet.objects.filter(user=request.user).first()
+        if wallet is None:
+            return Response({'balance': Decimal('0.00'), 'currency': 'GHS'})
         return Response({'balance': wallet.balance, 'currency': wallet.currency})
 
+    @action(detail=False, methods=['POST'])
+    def pay(self, request):
+        """
+        Pay for an order from the wallet balance
+        """
+        serializer = WalletCheckoutSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            order, entry = pay_order_from_wallet(request.user.id, serializer.validated_data['order_id'])
+        except Order.DoesNotExist:
+            return Response({'error': 'Order not found'}, status=status.HTTP_404_NOT_FOUND)
+        except (OrderNotPayable, InsufficientFunds) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'status': 'success',
+            'order_id': order.id,
+            'payment_status': order.payment_status,
+            'amount': entry.amount,
+            'reference': entry.reference
+        })
+
 class WalletTransactionViewSet(ReadOnlyModelViewSet):
     serializer_class = WalletTransactionSerializer
     permission_classes = [IsAuthenticated]
@@ -39,6 +73,31 @@ class PaymentLogViewSet(viewsets.ReadOnlyModelViewSet):
     def get_queryset(self):
         return PaymentLog.objects.filter(user=self.request.user)
 
+class ExportViewSet(viewsets.ViewSet):
+    """
+    Staff-only reporting exports, streamed as they are read:
+    `/payments/exports/<name>/?after=&before=&file_format=csv|jsonl`.
+    """
+    permission_classes = [IsAdminUser]
+
+    def list(self, request):
+        return Response({name: export.headers for name, export in EXPORTS.items()})
+
+    def retrieve(self, request, pk=None):
+        export = EXPORTS.get(pk)
+        if export is None:
+            return Response({'error': 'Unknown export'}, status=status.HTTP_404_NOT_FOUND)
+        params = ExportParamsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+
+        file_format = params.validated_data['file_format']
+        response = StreamingHttpResponse(
+            export_lines(export, file_format, params.validated_data.get('after'), params.validated_data.get('before')),
+            content_type=CONTENT_TYPES[file_format],
+        )
+        response['Content-Disposition'] = f'attachment; filename="{pk}.{file_format}"'
+        return response
+
 class PaystackPaymentViewSet(viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
 
@@ -65,30 +124,19 @@ class PaystackPaymentViewSet(viewsets.ViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        url = "https://api.paystack.co/transaction/initialize"
-        headers = {
-            "Authorization": f"Bearer {settings.PAYSTACK_SECRET_KEY}",
-            "Content-Type": "application/json",
-        }
-        payload = {
-            "email": email,
-            "amount": str(amount_in_kobo),
-            "metadata": {
-                "user_id": request.user.id,
-                "custom_fields": [
-                    {
-                        "display_name": "User ID",
-                        "variable_name": "user_id",
-                        "value": request.user.id
-                    }
-                ]
-            }
+        metadata = {
+            "user_id": request.user.id,
+            "custom_fields": [
+                {
+                    "display_name": "User ID",
+                    "variable_name": "user_id",
+                    "value": request.user.id
+                }
+            ]
         }
 
         try:
-            response = requests.post(url, headers=headers, json=payload)
-            response.raise_for_status()
-            data = response.json()
+            data = get_client().initialize_transaction(email, amount_in_kobo, metadata)
             
             # Create a pending payment log
             PaymentLog.objects.create(
@@ -98,9 +146,12 @@ class PaystackPaymentViewSet(viewsets.ViewSet):
                 amount=amount,
                 status='pending'
             )
+            # Settle it directly if the webhook hasn't by the end of the grace period
+            reconcile_payment.enqueue(
+                delay=settings.PAYSTACK_WEBHOOK_GRACE_SECONDS, reference=data['data']['reference'])
             
             return Response(data)
-        except requests.exceptions.RequestException as e:
+        except PaystackError as e:
             return Response(
                 {'error': str(e)},
                 status=status.HTTP_400_BAD_REQUEST
@@ -109,7 +160,9 @@ class PaystackPaymentViewSet(viewsets.ViewSet):
     @action(detail=False, methods=['post'], url_path='verify')
     def verify_payment(self, request):
         """
-        Verify Paystack payment
+        Report a payment's status. This is a local read: payments are settled
+        by the Paystack webhook, or by the reconcile_payment job when a
+        webhook is lost.
         """
         reference = request.data.get('reference')
         if not reference:
@@ -118,63 +171,51 @@ class PaystackPaymentViewSet(viewsets.ViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        url = f"https://api.paystack.co/transaction/verify/{reference}"
-        headers = {
-            "Authorization": f"Bearer {settings.PAYSTACK_SECRET_KEY}",
-        }
+        payment_log = PaymentLog.objects.filter(reference=reference, user=request.user).first()
+        if payment_log is None:
+            return Response(
+                {'error': 'Payment reference not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
 
-        try:
-            response = requests.get(url, headers=headers)
-            response.raise_for_status()
-            data = response.json()
-
-            if not data.get('status') or data['data']['status'] != 'success':
-                PaymentLog.objects.filter(reference=reference).update(status='failed')
-                return Response(
-                    {'status': 'failed', 'message': 'Payment not successful'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-            amount = data['data']['amount'] / 100  # Convert back from kobo/pesewas
-            
-            try:
-                payment_log = PaymentLog.objects.get(reference=reference)
-                payment_log.status = 'success'
-                payment_log.amount = amount
-                payment_log.save()
-
-                # Credit user's wallet
-                wallet, created = UserWallet.objects.get_or_create(user=request.user)
-                wallet.balance += amount
-                wallet.save()
-
-                # Create wallet transaction
-                WalletTransaction.objects.create(
-                    wallet=wallet,
-                    transaction_type='CREDIT',
-                    amount=amount,
-                    reference=reference,
-                    description='Payment via Paystack'
-                )
-
-                return Response({
-                    'status': 'success',
-                    'message': 'Payment verified and wallet credited',
-                    'amount': amount,
-                    'reference': reference
-                })
-
-            except PaymentLog.DoesNotExist:
-                return Response(
-                    {'error': 'Payment reference not found'},
-                    status=status.HTTP_404_NOT_FOUND
-                )
-
-        except requests.exceptions.RequestException as e:
+        if payment_log.status == 'failed':
             return Response(
-                {'error': str(e)},
+                {'status': 'failed', 'message': 'Payment not successful'},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        if payment_log.status == 'pending':
+            return Response({
+                'status': 'pending',
+                'message': 'Awaiting confirmation from Paystack',
+                'reference': reference
+            })
+        return Response({
+            'status': 'success',
+            'message': 'Payment verified and wallet credited',
+            'amount': payment_log.amount,
+            'reference': reference
+        })
+
+    @action(detail=False, methods=['post'], url_path='webhook',
+            permission_classes=[AllowAny], authentication_classes=[])
+    def webhook(self, request):
+        """
+        Paystack event receiver. Confirms payments without any outbound call;
+        Paystack retries until it gets a 200, and duplicates are ignored.
+        """
+        if not is_valid_signature(request.body, request.headers.get('X-Paystack-Signature')):
+            return Response({'error': 'Invalid signature'}, status=status.HTTP_401_UNAUTHORIZED)
+
+        try:
+            event = json.loads(request.body)
+        except ValueError:
+            return Response({'error': 'Invalid payload'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if event.get('event') == 'charge.success':
+            charge = event.get('data') or {}
+            if charge.get('reference'):
+                confirm_payment(charge['reference'], charge)
+        return Response(status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['get'], url_path='history')
     def payment_history(self, request):
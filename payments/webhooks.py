@@ -0,0 +1,53 @@
+import hashlib
+import hmac
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from .ledger import credit_wallet
+from .models import PaymentLog
+# pylint: disable=no-member
+
+
+def is_valid_signature(body, signature):
+    """Paystack signs the raw request body with HMAC-SHA512 of the secret key."""
+    expected = hmac.new(settings.PAYSTACK_SECRET_KEY.encode(), body, hashlib.sha512).hexdigest()
+    return hmac.compare_digest(expected, signature or '')
+
+
+# Paystack statuses after which a charge can no longer succeed. Anything else
+# ('abandoned', 'ongoing', 'pending', ...) means checkout isn't finished yet.
+FAILED_STATUSES = {'failed', 'reversed'}
+
+
+def confirm_payment(reference, charge):
+    """
+    Apply a Paystack charge (the `data` of a webhook event or a verify
+    response) to the PaymentLog with this reference.
+
+    A successful charge completes a pending or failed log and credits the
+    wallet; only a terminal failure marks a pending log failed, and any
+    other status leaves it pending. The log row is locked and the credit is
+    keyed on the reference in the ledger, so webhook retries and a racing
+    verify never credit the wallet twice. Returns the PaymentLog, or None
+    for an unknown reference.
+    """
+    with transaction.atomic():
+        payment_log = PaymentLog.objects.select_for_update().filter(reference=reference).first()
+        if payment_log is None or payment_log.status == 'success':
+            return payment_log
+
+        status = charge.get('status')
+        if status != 'success':
+            if status in FAILED_STATUSES and payment_log.status == 'pending':
+                payment_log.status = 'failed'
+                payment_log.save(update_fields=['status'])
+            return payment_log
+
+        amount = Decimal(charge['amount']) / 100  # Convert back from kobo/pesewas
+        payment_log.status = 'success'
+        payment_log.amount = amount
+        payment_log.save(update_fields=['status', 'amount'])
+
+        credit_wallet(payment_log.user_id, amount, reference, description='Payment via Paystack')
+    return payment_log
@@ -43,10 +43,10 @@ class CartItemAdmin(admin.ModelAdmin):
 
 @admin.register(models.Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ['id', 'customer', 'payment_status', 'placed_at']
+    list_display = ['id', 'customer', 'payment_status', 'total_amount', 'item_count', 'placed_at']
     list_filter = ['payment_status']
     autocomplete_fields = ['customer']
-    readonly_fields = ['placed_at']
+    readonly_fields = ['placed_at', 'total_amount', 'item_count']
     search_fields = ['id']  # Required for autocomplete in OrderItemAdmin
 
 
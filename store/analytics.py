@@ -0,0 +1,134 @@
+"""
+Daily sales rollups.
+
+Revenue, units and order counts are summed per day overall, per
+collection and per product into small tables, so dashboards never scan
+OrderItem. `update_sales_rollups` is incremental: it remembers the last
+order id it folded in and only reads orders past it.
+
+The figures are for placed orders, whatever their payment status, and
+the API names them `placed_*`. An order is read once: editing or
+deleting it after it was rolled up isn't reflected until
+`rebuild_sales_rollups` starts over.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .models import DailyCollectionSales, DailyProductSales, DailySales, Order, OrderItem, RollupWatermark
+# pylint: disable=no-member
+
+WATERMARK = 'sales'
+# Order ids are handed out before their transactions commit, so a lower id
+# can still become visible after a higher one. Only orders placed at least
+# this long ago are read, which leaves checkouts time to commit.
+SETTLE_DELAY = timedelta(minutes=1)
+METRICS = ['revenue', 'units', 'orders']
+
+
+def _sales(items, *fields, **expressions):
+    line_total = ExpressionWrapper(F('quantity') * F('unit_price'), output_field=DecimalField(max_digits=14, decimal_places=2))
+    return (
+        items.values(*fields, day=TruncDate('order__placed_at'), **expressions)
+        .annotate(revenue=Sum(line_total), units=Sum('quantity'), orders=Count('order_id', distinct=True))
+        .order_by()
+    )
+
+
+def _accumulate(model, keys, rows):
+    """Add `rows` onto the matching rollup rows of `model`, creating the missing ones."""
+    if not rows:
+        return
+    existing = {
+        tuple(getattr(obj, key) for key in keys): obj
+        for obj in model.objects.filter(**{f'{key}__in': {row[key] for row in rows} for key in keys})
+    }
+    changed, new = [], []
+    for row in rows:
+        obj = existing.get(tuple(row[key] for key in keys))
+        if obj is None:
+            new.append(model(**row))
+            continue
+        for metric in METRICS:
+            setattr(obj, metric, getattr(obj, metric) + row[metric])
+        changed.append(obj)
+    model.objects.bulk_update(changed, METRICS, batch_size=1000)
+    model.objects.bulk_create(new, batch_size=1000)
+
+
+def update_sales_rollups(batch_size=5000):
+    """
+    Fold orders placed since the watermark into the rollups, `batch_size`
+    orders per transaction. Returns the number of orders read.
+    """
+    settled = timezone.now() - SETTLE_DELAY
+    done = 0
+    while True:
+        with transaction.atomic():
+            # The lock also keeps two concurrent runs from counting an order twice.
+            RollupWatermark.objects.get_or_create(name=WATERMARK)
+            watermark = RollupWatermark.objects.select_for_update().get(name=WATERMARK)
+            orders = list(
+                Order.objects.filter(pk__gt=watermark.last_order_id)
+                .order_by('pk')
+                .values_list('pk', 'placed_at')[:batch_size]
+            )
+            order_ids = []
+            for order_id, placed_at in orders:
+                if placed_at >= settled:
+                    break
+                order_ids.append(order_id)
+            if not order_ids:
+                return done
+
+            items = OrderItem.objects.filter(order_id__gt=watermark.last_order_id, order_id__lte=order_ids[-1])
+            _accumulate(DailySales, ['day'], list(_sales(items)))
+            _accumulate(DailyCollectionSales, ['day', 'collection_id'],
+                        list(_sales(items, collection_id=F('product__collection_id'))))
+            _accumulate(DailyProductSales, ['day', 'product_id'],
+                        list(_sales(items, 'product_id', collection_id=F('product__collection_id'))))
+
+            watermark.last_order_id = order_ids[-1]
+            watermark.save(update_fields=['last_order_id', 'updated_at'])
+        done += len(order_ids)
+        if len(order_ids) < len(orders):
+            return done
+
+
+def rebuild_sales_rollups(batch_size=5000):
+    """Empty the rollups and read every order again."""
+    with transaction.atomic():
+        for model in (DailySales, DailyCollectionSales, DailyProductSales):
+            model.objects.all().delete()
+        RollupWatermark.objects.filter(name=WATERMARK).delete()
+    return update_sales_rollups(batch_size)
+
+
+def _totals(queryset, *fields, **expressions):
+    return queryset.values(*fields, **expressions).annotate(
+        **{f'placed_{metric}': Sum(metric) for metric in METRICS}).order_by()
+
+
+def daily_sales(start, end, collection_id=None):
+    """Per-day totals between two dates, inclusive."""
+    if collection_id is None:
+        rows = DailySales.objects.filter(day__range=(start, end))
+    else:
+        rows = DailyCollectionSales.objects.filter(day__range=(start, end), collection_id=collection_id)
+    return list(rows.values('day', **{f'placed_{metric}': F(metric) for metric in METRICS}).order_by('day'))
+
+
+def collection_sales(start, end):
+    """Per-collection totals between two dates, best sellers first."""
+    rows = _totals(DailyCollectionSales.objects.filter(day__range=(start, end)), 'collection_id', title=F('collection__title'))
+    return list(rows.order_by('-placed_revenue'))
+
+
+def top_products(start, end, collection_id=None, limit=20):
+    """The `limit` best-selling products between two dates."""
+    queryset = DailyProductSales.objects.filter(day__range=(start, end))
+    if collection_id is not None:
+        queryset = queryset.filter(collection_id=collection_id)
+    return list(_totals(queryset, 'product_id', title=F('product__title')).order_by('-placed_revenue')[:limit])
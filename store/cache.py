@@ -0,0 +1,154 @@
+import hashlib
+import time
+
+from alagsbay.replicas import use_primary
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.response import Response
+from .models import Product
+# pylint: disable=no-member
+
+CATALOG_VERSION_KEY = 'store:catalog:version'
+CATALOG_MODIFIED_KEY = 'store:catalog:modified'
+PRODUCTS_COUNT_KEY = 'store:collection:{}:products_count'
+INVENTORY_KEY = 'store:catalog:{}:inventory:{}'
+
+
+def get_catalog_state():
+    """
+    Return `(version, last_modified)` for the catalog. Every cached page is
+    keyed on the version, so bumping it invalidates them all at once.
+    """
+    state = cache.get_many([CATALOG_VERSION_KEY, CATALOG_MODIFIED_KEY])
+    if len(state) < 2:
+        # Seed from the clock so an evicted version never reuses an old number.
+        now = time.time()
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), timeout=None)
+        cache.add(CATALOG_MODIFIED_KEY, now, timeout=None)
+        state = cache.get_many([CATALOG_VERSION_KEY, CATALOG_MODIFIED_KEY])
+    return state.get(CATALOG_VERSION_KEY, 0), state.get(CATALOG_MODIFIED_KEY, time.time())
+
+
+def bump_catalog_version():
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.set(CATALOG_VERSION_KEY, time.time_ns(), timeout=None)
+    cache.set(CATALOG_MODIFIED_KEY, time.time(), timeout=None)
+
+
+def invalidate_products_count(*collection_ids):
+    cache.delete_many([PRODUCTS_COUNT_KEY.format(pk) for pk in collection_ids if pk is not None])
+
+
+def get_inventory(version, product_ids):
+    """
+    Current stock of `product_ids`, cached per product under the catalog
+    version, with the misses read from the primary in a single query.
+    """
+    keys = {pk: INVENTORY_KEY.format(version, pk) for pk in product_ids}
+    cached = cache.get_many(keys.values())
+
+    missing = [pk for pk, key in keys.items() if key not in cached]
+    if missing:
+        with use_primary():
+            stock = dict(Product.objects.filter(pk__in=missing).values_list('id', 'inventory'))
+        fresh = {keys[pk]: stock[pk] for pk in missing if pk in stock}
+        cache.set_many(fresh, timeout=settings.INVENTORY_CACHE_TIMEOUT)
+        cached.update(fresh)
+
+    return {pk: cached[key] for pk, key in keys.items() if key in cached}
+
+
+def invalidate_inventory(*product_ids):
+    version, _ = get_catalog_state()
+    cache.delete_many([INVENTORY_KEY.format(version, pk) for pk in product_ids])
+
+
+def attach_products_count(collections):
+    """
+    Set `products_count` on each collection, reading the per-collection counts
+    from the cache and computing the misses in a single aggregate query.
+    """
+    keys = {collection.id: PRODUCTS_COUNT_KEY.format(collection.id) for collection in collections}
+    cached = cache.get_many(keys.values())
+
+    missing = [pk for pk, key in keys.items() if key not in cached]
+    if missing:
+        counts = dict(
+            Product.objects.filter(collection_id__in=missing)
+            .values_list('collection_id')
+            .annotate(count=Count('id'))
+        )
+        fresh = {keys[pk]: counts.get(pk, 0) for pk in missing}
+        cache.set_many(fresh, timeout=settings.CATALOG_CACHE_TIMEOUT)
+        cached.update(fresh)
+
+    for collection in collections:
+        collection.products_count = cached[keys[collection.id]]
+    return collections
+
+
+class CatalogCacheMixin:
+    """
+    Serve `list` and `retrieve` from the cache, keyed on the catalog version
+    and the full request URL, and answer conditional GETs with 304 before
+    touching the database. Misses are filled from the primary.
+
+    Stock changes too often to be cached with the page: each product's
+    `inventory` is filled in from get_inventory() on the way out, and the
+    ETag covers it, so an order doesn't invalidate the whole catalog. Those
+    responses carry no Last-Modified, which orders don't move.
+    """
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        version, last_modified = get_catalog_state()
+        url = request.build_absolute_uri()
+        digest = hashlib.md5(f'{request.accepted_renderer.format}:{url}'.encode()).hexdigest()
+        last_modified = int(last_modified)
+
+        key = f'store:catalog:{version}:{digest}'
+        data = cache.get(key)
+        if data is None:
+            # A replica may not have the write that bumped the version yet,
+            # and what is cached here is served to everyone until it expires.
+            with use_primary():
+                response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            data = response.data
+            cache.set(key, data, timeout=settings.CATALOG_CACHE_TIMEOUT)
+
+        stock = self.fill_inventory(data, version)
+        if stock:
+            digest = hashlib.md5(f'{digest}:{sorted(stock.items())}'.encode()).hexdigest()
+            last_modified = None
+        etag = f'"{version}-{digest}"'
+        not_modified = get_conditional_response(request._request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        response = Response(data)
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def fill_inventory(self, data, version):
+        """Set the current stock on every product in `data` that shows it; returns that stock."""
+        items = data.get('results', [data]) if isinstance(data, dict) else data
+        products = [item for item in items if isinstance(item, dict) and 'inventory' in item and 'id' in item]
+        if not products:
+            return {}
+        stock = get_inventory(version, [product['id'] for product in products])
+        for product in products:
+            product['inventory'] = stock.get(product['id'], product['inventory'])
+        return stock
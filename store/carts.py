@@ -0,0 +1,412 @@
+"""
+Cart storage.
+
+Carts live either in the relational tables (`database`, the default) or in
+the `carts` Django cache (`cache`, which has to be shared between worker
+processes, so Redis), selected with the CART_STORAGE setting. Views and serializers only talk to
+the store returned by `get_cart_store()`; both stores hand back `Cart` and
+`CartItem` instances, so the API renders them the same way. A cached cart
+only reaches the database as an order, in `CreateOrderSerializer.save`.
+"""
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from datetime import timedelta
+from decimal import Decimal
+from uuid import UUID
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, connection, transaction
+from django.db.models import DecimalField, F, Prefetch, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException
+from .models import Cart, CartItem, Product
+# pylint: disable=no-member
+
+# last_activity is only rewritten when it is older than this, so a busy cart
+# doesn't turn every request into a row write.
+ACTIVITY_RESOLUTION = timedelta(minutes=5)
+
+CART_CACHE = 'carts'
+# Per-process caches: carts in them would vanish between gunicorn workers.
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+CART_KEY = 'store:cart:{}'
+CART_LOCK_KEY = 'store:cart:{}:lock'
+# Seconds a cached cart stays locked at most, and a writer waits for the lock.
+CART_LOCK_TIMEOUT = 10
+CART_LOCK_WAIT = 2
+
+
+class CartBusy(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'The cart is being updated, try again.'
+
+
+def parse_cart_id(value):
+    """The cart id in a URL as a UUID, or None when it isn't one."""
+    try:
+        return UUID(str(value))
+    except ValueError:
+        return None
+
+
+def merge_quantities(items):
+    quantities = Counter()
+    for product_id, quantity in items:
+        if quantity < 1:
+            # Added onto an existing line, this would shrink it below one.
+            raise serializers.ValidationError({'quantity': 'Ensure this value is greater than or equal to 1.'})
+        quantities[product_id] += quantity
+    return quantities
+
+
+def missing_products_error(missing):
+    return serializers.ValidationError(
+        {'product_id': f"No product with the given ID was found: {', '.join(map(str, sorted(missing)))}"}
+    )
+
+
+def foreign_keys_deferred():
+    """
+    True where a bad foreign key only fails when the outermost transaction
+    commits (SQLite inside an atomic block), so the upsert can't report it.
+    """
+    return connection.vendor == 'sqlite' and connection.in_atomic_block
+
+
+def missing_cart_error():
+    return serializers.ValidationError({'cart_id': 'No cart with the given ID was found.'})
+
+
+def cart_items_queryset():
+    """
+    Cart items with their product joined, product images prefetched and the
+    line total computed by the database.
+    """
+    return (
+        CartItem.objects
+        .select_related('product')
+        .prefetch_related('product__images')
+        .annotate(total_price=F('quantity') * F('product__unit_price'))
+    )
+
+
+def _upsert_sql(row_count):
+    table = connection.ops.quote_name(CartItem._meta.db_table)
+    values = ', '.join(['(%s, %s, %s)'] * row_count)
+    sql = f'INSERT INTO {table} (cart_id, product_id, quantity) VALUES {values}'
+
+    if connection.vendor == 'mysql':
+        return sql + ' ON DUPLICATE KEY UPDATE quantity = quantity + VALUES(quantity)'
+    return sql + (
+        ' ON CONFLICT (product_id, cart_id)'
+        f' DO UPDATE SET quantity = {table}.quantity + excluded.quantity'
+    )
+
+
+class DatabaseCartStore:
+    """Carts in the Cart and CartItem tables."""
+
+    def create_cart(self):
+        cart = Cart.objects.create()
+        cart.line_items = []
+        cart.total_price = Decimal('0.00')
+        return cart
+
+    def get_cart(self, cart_id):
+        return (
+            Cart.objects
+            .prefetch_related(Prefetch('items', queryset=cart_items_queryset(), to_attr='line_items'))
+            .annotate(total_price=Coalesce(
+                Sum(F('items__quantity') * F('items__product__unit_price')),
+                Value(Decimal('0.00')),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            ))
+            .filter(pk=cart_id)
+            .first()
+        )
+
+    def delete_cart(self, cart_id):
+        deleted, _ = Cart.objects.filter(pk=cart_id).delete()
+        return bool(deleted)
+
+    def touch(self, cart_id, last_activity=None):
+        """
+        Record activity on the cart. Pass the `last_activity` already read
+        with the cart to skip the UPDATE while it is fresh.
+        """
+        now = timezone.now()
+        if last_activity is not None and last_activity >= now - ACTIVITY_RESOLUTION:
+            return
+        Cart.objects.filter(pk=cart_id, last_activity__lt=now - ACTIVITY_RESOLUTION).update(last_activity=now)
+
+    def get_items(self, cart_id):
+        return list(cart_items_queryset().filter(cart_id=cart_id))
+
+    def get_item(self, cart_id, item_id):
+        return cart_items_queryset().filter(cart_id=cart_id, pk=item_id).first()
+
+    def add_items(self, cart_id, items):
+        """
+        Add `(product_id, quantity)` pairs to a cart in one INSERT ... ON CONFLICT
+        statement, incrementing the quantity of products already in the cart.
+        Returns the affected CartItem rows.
+        """
+        quantities = merge_quantities(items)
+        if not quantities:
+            return []
+
+        db_cart_id = CartItem._meta.get_field('cart').get_db_prep_value(cart_id, connection)
+        params = []
+        for product_id, quantity in quantities.items():
+            params += [db_cart_id, product_id, quantity]
+
+        # In autocommit mode the statement is atomic on its own; inside a caller's
+        # transaction, use a savepoint so a bad reference doesn't poison it.
+        # A bad reference comes back as an IntegrityError, except where
+        # foreign_keys_deferred(); the serializers check products first there.
+        atomic = transaction.atomic() if connection.in_atomic_block else nullcontext()
+        try:
+            with atomic:
+                with connection.cursor() as cursor:
+                    cursor.execute(_upsert_sql(len(quantities)), params)
+        except IntegrityError:
+            # Only the error path pays for finding out which reference was bad.
+            found = set(Product.objects.filter(pk__in=quantities).values_list('pk', flat=True))
+            missing = set(quantities) - found
+            if missing:
+                raise missing_products_error(missing)
+            raise missing_cart_error()
+
+        return list(CartItem.objects.filter(cart_id=cart_id, product_id__in=quantities))
+
+    def update_item(self, cart_id, item_id, quantity):
+        return bool(CartItem.objects.filter(cart_id=cart_id, pk=item_id).update(quantity=quantity))
+
+    def remove_item(self, cart_id, item_id):
+        deleted, _ = CartItem.objects.filter(cart_id=cart_id, pk=item_id).delete()
+        return bool(deleted)
+
+    @contextmanager
+    def checkout(self, cart_id):
+        """
+        Yield the cart's items with their products, then delete the cart.
+        Use inside `transaction.atomic()` together with the order writes.
+        """
+        yield list(CartItem.objects.select_related('product').filter(cart_id=cart_id))
+        Cart.objects.filter(pk=cart_id).delete()
+
+
+class CacheCartStore:
+    """
+    Carts in the `carts` cache, one key per cart holding
+    `{'created_at', 'next_id', 'items': {product_id: (item_id, quantity)}}`.
+    Item ids count up per cart. A key expires after CART_TTL without
+    activity, so nothing needs purging, and writes to a cart are serialized
+    with a short lock taken through `cache.add()` (SET NX on Redis).
+    """
+
+    @property
+    def cache(self):
+        return caches[CART_CACHE]
+
+    def _timeout(self):
+        return settings.CART_TTL.total_seconds()
+
+    def _load(self, cart_id):
+        return self.cache.get(CART_KEY.format(cart_id))
+
+    def _save(self, cart_id, data):
+        self.cache.set(CART_KEY.format(cart_id), data, timeout=self._timeout())
+
+    def _acquire(self, cart_id):
+        lock = CART_LOCK_KEY.format(cart_id)
+        deadline = time.monotonic() + CART_LOCK_WAIT
+        while not self.cache.add(lock, 1, timeout=CART_LOCK_TIMEOUT):
+            if time.monotonic() > deadline:
+                raise CartBusy()
+            time.sleep(0.01)
+
+    def _release(self, cart_id):
+        self.cache.delete(CART_LOCK_KEY.format(cart_id))
+
+    @contextmanager
+    def _locked(self, cart_id):
+        self._acquire(cart_id)
+        try:
+            yield
+        finally:
+            self._release(cart_id)
+
+    def _build_items(self, cart_id, entries, products):
+        # Products deleted since they were added drop out, as the foreign key
+        # cascade does for stored carts.
+        items = []
+        for product_id, (item_id, quantity) in sorted(entries.items(), key=lambda entry: entry[1][0]):
+            product = products.get(product_id)
+            if product is None:
+                continue
+            item = CartItem(id=item_id, cart_id=cart_id, product=product, quantity=quantity)
+            item.total_price = quantity * product.unit_price
+            items.append(item)
+        return items
+
+    def _items_with_products(self, cart_id, entries):
+        products = Product.objects.prefetch_related('images').in_bulk(list(entries))
+        return self._build_items(cart_id, entries, products)
+
+    def create_cart(self):
+        cart = Cart(created_at=timezone.now())
+        self._save(cart.id, {'created_at': cart.created_at, 'next_id': 1, 'items': {}})
+        cart.line_items = []
+        cart.total_price = Decimal('0.00')
+        return cart
+
+    def get_cart(self, cart_id):
+        data = self._load(cart_id)
+        if data is None:
+            return None
+        cart = Cart(id=cart_id, created_at=data['created_at'])
+        cart.line_items = self._items_with_products(cart_id, data['items'])
+        cart.total_price = sum((item.total_price for item in cart.line_items), Decimal('0.00'))
+        return cart
+
+    def delete_cart(self, cart_id):
+        with self._locked(cart_id):
+            return self.cache.delete(CART_KEY.format(cart_id))
+
+    def touch(self, cart_id, last_activity=None):
+        self.cache.touch(CART_KEY.format(cart_id), timeout=self._timeout())
+
+    def get_items(self, cart_id):
+        data = self._load(cart_id)
+        return self._items_with_products(cart_id, data['items']) if data else []
+
+    def get_item(self, cart_id, item_id):
+        data = self._load(cart_id) or {'items': {}}
+        entries = {
+            product_id: entry for product_id, entry in data['items'].items() if entry[0] == item_id
+        }
+        items = self._items_with_products(cart_id, entries)
+        return items[0] if items else None
+
+    def add_items(self, cart_id, items):
+        quantities = merge_quantities(items)
+        if not quantities:
+            return []
+
+        found = set(Product.objects.filter(pk__in=quantities).values_list('pk', flat=True))
+        missing = set(quantities) - found
+        if missing:
+            raise missing_products_error(missing)
+
+        with self._locked(cart_id):
+            data = self._load(cart_id)
+            if data is None:
+                raise missing_cart_error()
+            for product_id, quantity in quantities.items():
+                item_id, current = data['items'].get(product_id, (None, 0))
+                if item_id is None:
+                    item_id = data['next_id']
+                    data['next_id'] += 1
+                data['items'][product_id] = (item_id, current + quantity)
+            self._save(cart_id, data)
+
+        return [
+            CartItem(id=data['items'][product_id][0], cart_id=cart_id,
+                     product_id=product_id, quantity=data['items'][product_id][1])
+            for product_id in quantities
+        ]
+
+    def _change_item(self, cart_id, item_id, quantity):
+        # A quantity of None removes the item.
+        with self._locked(cart_id):
+            data = self._load(cart_id)
+            if data is None:
+                return False
+            for product_id, (entry_id, _) in data['items'].items():
+                if entry_id == item_id:
+                    break
+            else:
+                return False
+            if quantity is None:
+                del data['items'][product_id]
+            else:
+                data['items'][product_id] = (item_id, quantity)
+            self._save(cart_id, data)
+            return True
+
+    def update_item(self, cart_id, item_id, quantity):
+        return self._change_item(cart_id, item_id, quantity)
+
+    def remove_item(self, cart_id, item_id):
+        return self._change_item(cart_id, item_id, None)
+
+    @contextmanager
+    def checkout(self, cart_id):
+        """
+        Yield the cart's items with their products while holding the cart's
+        lock. The cart is dropped, and the lock released, once the caller's
+        transaction commits, so a concurrent checkout can't order it twice.
+        """
+        self._acquire(cart_id)
+        try:
+            data = self._load(cart_id) or {'items': {}}
+            yield self._build_items(cart_id, data['items'], Product.objects.in_bulk(list(data['items'])))
+        except BaseException:
+            self._release(cart_id)
+            raise
+        transaction.on_commit(
+            lambda: self.cache.delete_many([CART_KEY.format(cart_id), CART_LOCK_KEY.format(cart_id)])
+        )
+
+
+CART_STORES = {
+    'database': DatabaseCartStore(),
+    'cache': CacheCartStore(),
+}
+
+
+def get_cart_store():
+    if settings.CART_STORAGE == 'cache' and settings.CACHES[CART_CACHE]['BACKEND'] in LOCAL_CACHE_BACKENDS:
+        raise ImproperlyConfigured(
+            f"CART_STORAGE = 'cache' needs a shared '{CART_CACHE}' cache such as Redis, not a per-process one.")
+    return CART_STORES[settings.CART_STORAGE]
+
+
+def purge_expired_carts(batch_size=1000, pause=0.0):
+    """
+    Delete carts idle for longer than CART_TTL together with their items,
+    `batch_size` carts per short transaction so no lock is held for long.
+    Yields `(carts, items)` deleted per batch. Only the database store needs
+    this; cached carts expire on their own.
+    """
+    cutoff = timezone.now() - settings.CART_TTL
+    while True:
+        cart_ids = list(
+            Cart.objects.filter(last_activity__lt=cutoff)
+            .order_by('last_activity')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not cart_ids:
+            return
+        with transaction.atomic():
+            # A cart can be used again between the two queries; lock the ones
+            # still idle so none is touched while its items are deleted.
+            cart_ids = list(
+                Cart.objects.select_for_update()
+                .filter(pk__in=cart_ids, last_activity__lt=cutoff)
+                .values_list('id', flat=True)
+            )
+            items, _ = CartItem.objects.filter(cart_id__in=cart_ids).delete()
+            carts, _ = Cart.objects.filter(pk__in=cart_ids, last_activity__lt=cutoff).delete()
+        yield carts, items
+        if pause:
+            time.sleep(pause)
@@ -0,0 +1,33 @@
+from django.core.cache import cache
+from .models import Customer
+# pylint: disable=no-member
+
+CUSTOMER_ID_KEY = 'store:user:{}:customer_id'
+
+
+def get_customer_id(user_id):
+    """
+    Map a user to their customer id through the cache. Customers are created
+    at registration, so the database is only asked on a cold cache, and only
+    users that predate that get one created here.
+    """
+    key = CUSTOMER_ID_KEY.format(user_id)
+    customer_id = cache.get(key)
+    if customer_id is None:
+        customer_id = Customer.objects.filter(user_id=user_id).values_list('id', flat=True).first()
+        if customer_id is None:
+            (customer, created) = Customer.objects.get_or_create(user_id=user_id)
+            customer_id = customer.id
+        cache.set(key, customer_id, timeout=None)
+    return customer_id
+
+
+def get_request_customer_id(request):
+    """Memoize the current user's customer id for the rest of the request."""
+    if not hasattr(request, '_customer_id'):
+        request._customer_id = get_customer_id(request.user.id)
+    return request._customer_id
+
+
+def forget_customer(user_id):
+    cache.delete(CUSTOMER_ID_KEY.format(user_id))
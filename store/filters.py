@@ -0,0 +1,134 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Case, CharField, Count, Value, When
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.filters import BaseFilterBackend
+
+
+class OrderDateRangeSerializer(serializers.Serializer):
+    placed_after = serializers.DateTimeField(required=False)
+    placed_before = serializers.DateTimeField(required=False)
+
+
+class OrderDateRangeFilter(BaseFilterBackend):
+    """
+    Filter orders with `?placed_after=` / `?placed_before=`, given as ISO 8601
+    dates or datetimes.
+    """
+    def filter_queryset(self, request, queryset, view):
+        params = OrderDateRangeSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+
+        if 'placed_after' in params.validated_data:
+            queryset = queryset.filter(placed_at__gte=params.validated_data['placed_after'])
+        if 'placed_before' in params.validated_data:
+            queryset = queryset.filter(placed_at__lt=params.validated_data['placed_before'])
+        return queryset
+
+
+class OrderTotalSerializer(serializers.Serializer):
+    min_total = serializers.DecimalField(max_digits=12, decimal_places=2, required=False)
+    max_total = serializers.DecimalField(max_digits=12, decimal_places=2, required=False)
+
+
+class OrderTotalFilter(BaseFilterBackend):
+    """Filter orders by their stored value with `?min_total=` / `?max_total=`."""
+    def filter_queryset(self, request, queryset, view):
+        params = OrderTotalSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+
+        if 'min_total' in params.validated_data:
+            queryset = queryset.filter(total_amount__gte=params.validated_data['min_total'])
+        if 'max_total' in params.validated_data:
+            queryset = queryset.filter(total_amount__lte=params.validated_data['max_total'])
+        return queryset
+
+
+class SalesAnalyticsSerializer(serializers.Serializer):
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    collection_id = serializers.IntegerField(required=False)
+    limit = serializers.IntegerField(required=False, default=20, min_value=1, max_value=100)
+
+    def validate(self, attrs):
+        attrs.setdefault('end', timezone.localdate())
+        attrs.setdefault('start', attrs['end'] - timedelta(days=29))
+        if attrs['start'] > attrs['end']:
+            raise serializers.ValidationError('start must not be after end.')
+        return attrs
+
+
+class ProductSearchSerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=200)
+    collection_id = serializers.IntegerField(required=False)
+    limit = serializers.IntegerField(required=False, default=20, min_value=1, max_value=50)
+
+
+class ProductFilterSerializer(serializers.Serializer):
+    collection_id = serializers.IntegerField(required=False)
+    min_price = serializers.DecimalField(max_digits=8, decimal_places=2, required=False)
+    max_price = serializers.DecimalField(max_digits=8, decimal_places=2, required=False)
+    in_stock = serializers.BooleanField(required=False)
+
+
+class ProductFilter(BaseFilterBackend):
+    """
+    Filter products with `?collection_id=`, `?min_price=`, `?max_price=` and
+    `?in_stock=true`.
+    """
+    def filter_queryset(self, request, queryset, view):
+        # A plain dict, so an absent in_stock means "any", not false.
+        params = ProductFilterSerializer(data=request.query_params.dict())
+        params.is_valid(raise_exception=True)
+        filters = params.validated_data
+
+        if 'collection_id' in filters:
+            queryset = queryset.filter(collection_id=filters['collection_id'])
+        if 'min_price' in filters:
+            queryset = queryset.filter(unit_price__gte=filters['min_price'])
+        if 'max_price' in filters:
+            queryset = queryset.filter(unit_price__lte=filters['max_price'])
+        if filters.get('in_stock') is True:
+            queryset = queryset.filter(inventory__gt=0)
+        elif filters.get('in_stock') is False:
+            queryset = queryset.filter(inventory__lte=0)
+        return queryset
+
+
+def price_bucket_labels():
+    bounds = settings.PRODUCT_PRICE_BUCKETS
+    return [f'{low}-{high}' for low, high in zip(bounds, bounds[1:])] + [f'{bounds[-1]}+']
+
+
+def product_facets(queryset):
+    """
+    Product counts per collection and per price bucket, from one
+    GROUP BY (collection, bucket) query over the filtered products.
+    """
+    bounds = settings.PRODUCT_PRICE_BUCKETS
+    labels = price_bucket_labels()
+    bucket = Case(
+        *[When(unit_price__lt=high, then=Value(label)) for high, label in zip(bounds[1:], labels)],
+        default=Value(labels[-1]),
+        output_field=CharField(),
+    )
+    rows = (
+        queryset.order_by()
+        .values('collection_id', 'collection__title', price_bucket=bucket)
+        .annotate(count=Count('id'))
+    )
+
+    collections = {}
+    prices = dict.fromkeys(labels, 0)
+    for row in rows:
+        collection = collections.setdefault(
+            row['collection_id'], {'id': row['collection_id'], 'title': row['collection__title'], 'count': 0})
+        collection['count'] += row['count']
+        prices[row['price_bucket']] += row['count']
+
+    return {
+        'collections': sorted(collections.values(), key=lambda collection: collection['id']),
+        'price_buckets': [{'range': label, 'count': count} for label, count in prices.items()],
+    }
@@ -0,0 +1,86 @@
+import base64
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps
+from .cache import bump_catalog_version
+from .models import ProductImage
+# pylint: disable=no-member
+
+FORMATS = [('webp', 'WEBP'), ('jpeg', 'JPEG')]
+PLACEHOLDER_WIDTH = 16
+
+
+def resize(image, width):
+    """Scale down to `width` keeping the aspect ratio; never scale up."""
+    if image.width <= width:
+        return image.copy()
+    height = max(1, round(image.height * width / image.width))
+    return image.resize((width, height), Image.LANCZOS)
+
+
+def encode(image, pil_format, **options):
+    if pil_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def save_file(path, content):
+    if default_storage.exists(path):
+        default_storage.delete(path)
+    return default_storage.save(path, ContentFile(content))
+
+
+def process_product_image(image_id):
+    """
+    Generate the resized WebP/JPEG variants and the inline LQIP placeholder
+    for one ProductImage and store their paths on it.
+    """
+    product_image = ProductImage.objects.filter(pk=image_id).first()
+    if product_image is None or not product_image.image:
+        return None
+
+    with product_image.image.open('rb') as source:
+        image = ImageOps.exif_transpose(Image.open(source))
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+    # Under the image's pk: names that only differ by extension share a stem.
+    directory, filename = os.path.split(product_image.image.name)
+    stem = os.path.splitext(filename)[0]
+    variants = {}
+    for name, width in settings.PRODUCT_IMAGE_VARIANTS.items():
+        resized = resize(image, width)
+        variant = {'width': resized.width, 'height': resized.height}
+        for extension, pil_format in FORMATS:
+            content = encode(resized, pil_format, quality=settings.PRODUCT_IMAGE_QUALITY)
+            variant[extension] = save_file(f'{directory}/variants/{image_id}/{stem}_{name}.{extension}', content)
+        variants[name] = variant
+
+    tiny = encode(resize(image, PLACEHOLDER_WIDTH), 'JPEG', quality=40)
+    placeholder = 'data:image/jpeg;base64,' + base64.b64encode(tiny).decode()
+
+    # update() rather than save(): don't re-trigger processing from post_save.
+    if not ProductImage.objects.filter(pk=image_id, image=product_image.image.name).update(
+            variants=variants, placeholder=placeholder):
+        # Deleted or given another image while this one was being resized.
+        delete_variants(variants)
+        return None
+    transaction.on_commit(bump_catalog_version)
+    return variants
+
+
+def delete_variants(variants):
+    """Remove the files of a ProductImage's `variants` from storage."""
+    for variant in variants.values():
+        for extension, _ in FORMATS:
+            if variant.get(extension):
+                default_storage.delete(variant[extension])
+
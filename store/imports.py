@@ -0,0 +1,150 @@
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+
+from .cache import invalidate_products_count
+from .models import Collection, Product, ProductImage
+from .search import index_products, use_fulltext
+from .tasks import process_image
+# pylint: disable=no-member
+
+PRODUCT_FIELDS = ['title', 'description', 'unit_price', 'inventory', 'collection']
+
+
+def read_rows(path, file_format):
+    """
+    Stream raw records from a CSV file with a header row, or from a JSON
+    Lines file with one object per line.
+    """
+    with open(path, newline='', encoding='utf-8-sig') as source:
+        if file_format == 'csv':
+            yield from csv.DictReader(source)
+        else:
+            for line in source:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def _clean(model, name, value):
+    """Run a model field's own conversion and validators (lengths, digits, integer range)."""
+    try:
+        return model._meta.get_field(name).clean(value, None)
+    except ValidationError as e:
+        raise ValueError(f"{name}: {' '.join(e.messages)}") from e
+
+
+def parse_row(raw):
+    """
+    Validate one record: `sku`, `title`, `unit_price` and `collection` (a
+    title) are required; `description`, `inventory` and `images` (storage
+    paths, a list in JSONL or `|`-separated in CSV) are optional. Values are
+    checked against the model fields, so a row the database would reject
+    is reported here instead of failing its whole chunk.
+    Raises ValueError with a readable message.
+    """
+    missing = [name for name in ('sku', 'title', 'unit_price', 'collection') if not str(raw.get(name) or '').strip()]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+    try:
+        unit_price = Decimal(str(raw['unit_price'])).quantize(Decimal('0.01'))
+    except InvalidOperation as e:
+        raise ValueError(f"unit_price: {raw['unit_price']!r} is not a number") from e
+
+    images = raw.get('images') or []
+    if isinstance(images, str):
+        images = images.split('|')
+    return {
+        'sku': _clean(Product, 'sku', str(raw['sku']).strip()),
+        'title': _clean(Product, 'title', str(raw['title']).strip()),
+        'description': str(raw.get('description') or ''),
+        'unit_price': _clean(Product, 'unit_price', unit_price),
+        'inventory': _clean(Product, 'inventory', raw.get('inventory') or 0),
+        'collection': _clean(Collection, 'title', str(raw['collection']).strip()),
+        'images': [path.strip() for path in images if path.strip()],
+    }
+
+
+def ensure_collections(titles, collection_ids):
+    """Fill `collection_ids` (title -> id) for `titles`, creating collections that don't exist."""
+    missing = set(titles) - set(collection_ids)
+    if not missing:
+        return
+    collection_ids.update(Collection.objects.filter(title__in=missing).values_list('title', 'id'))
+    new = missing - set(collection_ids)
+    if new:
+        Collection.objects.bulk_create([Collection(title=title) for title in new])
+        collection_ids.update(Collection.objects.filter(title__in=new).values_list('title', 'id'))
+
+
+def upsert_target():
+    """
+    ON CONFLICT needs the unique column on PostgreSQL and SQLite; MySQL's
+    ON DUPLICATE KEY UPDATE takes none and relies on the unique `sku` index.
+    """
+    if connection.features.supports_update_conflicts_with_target:
+        return {'unique_fields': ['sku']}
+    return {}
+
+
+def import_products(rows, collection_ids):
+    """
+    Upsert a chunk of parsed rows keyed on SKU with one INSERT ... ON
+    CONFLICT / ON DUPLICATE KEY UPDATE, attach new image references and
+    reindex the chunk for search. Bulk writes skip the model signals, so
+    collection counts are invalidated here; the caller bumps the catalog
+    version. Returns `(created, updated, images)`.
+    """
+    products = {row['sku']: row for row in rows}  # the last row for a SKU wins
+    ensure_collections({row['collection'] for row in products.values()}, collection_ids)
+    previous = dict(Product.objects.filter(sku__in=products).values_list('sku', 'collection_id'))
+
+    Product.objects.bulk_create(
+        [
+            Product(sku=sku, title=row['title'], description=row['description'], unit_price=row['unit_price'],
+                    inventory=row['inventory'], collection_id=collection_ids[row['collection']])
+            for sku, row in products.items()
+        ],
+        update_conflicts=True,
+        update_fields=PRODUCT_FIELDS,
+        **upsert_target(),
+    )
+    product_ids = dict(Product.objects.filter(sku__in=products).values_list('sku', 'id'))
+
+    if not use_fulltext():
+        index_products([
+            Product(id=product_ids[sku], title=row['title'], description=row['description'])
+            for sku, row in products.items()
+        ])
+
+    images = import_images({
+        (product_ids[sku], path) for sku, row in products.items() for path in row['images']
+    })
+
+    counted = {collection_ids[row['collection']] for row in products.values()} | set(previous.values())
+    transaction.on_commit(lambda: invalidate_products_count(*counted))
+    return len(products) - len(previous), len(previous), images
+
+
+def import_images(references):
+    """
+    Create ProductImage rows for `(product_id, path)` references that don't
+    exist yet and queue their variants. Returns the number created.
+    """
+    if not references:
+        return 0
+    product_ids = {product_id for product_id, _ in references}
+    images = ProductImage.objects.filter(product_id__in=product_ids)
+    new = references - set(images.values_list('product_id', 'image'))
+    if not new:
+        return 0
+
+    ProductImage.objects.bulk_create([ProductImage(product_id=product_id, image=path) for product_id, path in new])
+    process_image.enqueue_many([
+        {'image_id': image_id}
+        for image_id, product_id, path in images.values_list('id', 'product_id', 'image')
+        if (product_id, path) in new
+    ])
+    return len(new)
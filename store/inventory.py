@@ -0,0 +1,73 @@
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from rest_framework import serializers
+from .cache import bump_catalog_version, invalidate_inventory
+from .models import Product
+# pylint: disable=no-member
+
+
+def reserve_inventory(quantities):
+    """
+    Take `{product_id: quantity}` out of stock. Must run inside the caller's
+    transaction so the decrement rolls back with it if the order fails.
+
+    The product rows are locked in one `SELECT ... FOR UPDATE` ordered by id,
+    so concurrent orders over overlapping products always lock in the same
+    order and cannot deadlock, then decremented with a single conditional
+    `UPDATE ... WHERE inventory >= quantity`.
+    """
+    if not quantities:
+        return
+    invalid = {product_id: quantity for product_id, quantity in quantities.items() if quantity < 1}
+    if invalid:
+        # A negative line would put stock back and take money off the order.
+        raise serializers.ValidationError({
+            'cart_id': [
+                f'Quantity {quantity} for product {product_id} must be at least 1.'
+                for product_id, quantity in sorted(invalid.items())
+            ]
+        })
+
+    stock = dict(
+        Product.objects.select_for_update()
+        .filter(pk__in=quantities)
+        .order_by('id')
+        .values_list('id', 'inventory')
+    )
+
+    shortages = {
+        product_id: stock.get(product_id, 0)
+        for product_id, quantity in quantities.items()
+        if stock.get(product_id, 0) < quantity
+    }
+    if shortages:
+        raise serializers.ValidationError({
+            'cart_id': [
+                f'Only {available} left in stock for product {product_id}.'
+                for product_id, available in sorted(shortages.items())
+            ]
+        })
+
+    requested = Case(
+        *[When(pk=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+        output_field=IntegerField(),
+    )
+    updated = (
+        Product.objects
+        .filter(pk__in=quantities, inventory__gte=requested)
+        .update(inventory=F('inventory') - requested)
+    )
+    if updated != len(quantities):
+        # Only reachable where FOR UPDATE is a no-op (SQLite): a concurrent
+        # order took the stock between the read and the write.
+        raise serializers.ValidationError({'cart_id': ['Some items in the cart just went out of stock.']})
+
+    # update() skips model signals, so invalidate the cache ourselves. Cached
+    # pages take their stock from the per-product inventory keys; only a
+    # product selling out changes which pages list it (`?in_stock=`, facets).
+    if any(stock[product_id] == quantity for product_id, quantity in quantities.items()):
+        transaction.on_commit(bump_catalog_version)
+    else:
+        product_ids = list(quantities)
+        transaction.on_commit(lambda: invalidate_inventory(*product_ids))
+
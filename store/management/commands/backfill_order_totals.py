@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import reset_queries, transaction
+from store.models import Order
+from store.orders import refresh_order_totals
+# pylint: disable=no-member
+
+
+class Command(BaseCommand):
+    help = "Fill in the stored total_amount and item_count of orders placed before they existed."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--all', action='store_true', help='Recompute every order, not only those without totals.')
+
+    def handle(self, *args, **options):
+        orders = Order.objects.order_by('pk')
+        if not options['all']:
+            orders = orders.filter(item_count=0)
+
+        started = time.perf_counter()
+        done = last_pk = 0
+        while True:
+            order_ids = list(orders.filter(pk__gt=last_pk).values_list('pk', flat=True)[:options['batch_size']])
+            if not order_ids:
+                break
+            with transaction.atomic():
+                done += refresh_order_totals(order_ids)
+            last_pk = order_ids[-1]
+            reset_queries()  # with DEBUG on, every statement would otherwise be kept
+            self.stdout.write(f'{done} orders ({done / (time.perf_counter() - started):.0f}/s)')
+
+        self.stdout.write(self.style.SUCCESS(f'Backfilled {done} orders in {time.perf_counter() - started:.1f}s.'))
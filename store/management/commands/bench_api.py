@@ -0,0 +1,273 @@
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+
+import requests
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from store.models import Collection, Product
+from .seed_bench import COLLECTION_PREFIX, USERNAME_PREFIX
+# pylint: disable=no-member
+
+SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries"')
+SERVER_TIMING_DB = re.compile(r'db;dur=([\d.]+)')
+
+
+class InProcessTransport:
+    """Calls the URL routes through Django's test client, in this process."""
+
+    def __init__(self, host, token):
+        self.client = Client(raise_request_exception=False, HTTP_HOST=host, HTTP_AUTHORIZATION=f'JWT {token}')
+
+    def request(self, method, path, data=None):
+        body = json.dumps(data) if data is not None else None
+        response = self.client.generic(method, path, body or '', content_type='application/json')
+        return response.status_code, response.get('Server-Timing', ''), response.content
+
+    def close(self):
+        connections.close_all()
+
+
+class HttpTransport:
+    """Calls a running server over HTTP."""
+
+    def __init__(self, base_url, token):
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+        self.session.headers['Authorization'] = f'JWT {token}'
+
+    def request(self, method, path, data=None):
+        response = self.session.request(method, self.base_url + path, json=data, timeout=30)
+        return response.status_code, response.headers.get('Server-Timing', ''), response.content
+
+    def close(self):
+        self.session.close()
+
+
+class Worker:
+    """One simulated shopper: browses, searches, fills a cart, checks out and looks at payments."""
+
+    def __init__(self, transport, rng, product_ids, collection_ids, words, record):
+        self.transport = transport
+        self.rng = rng
+        self.product_ids = product_ids
+        self.collection_ids = collection_ids
+        self.words = words
+        self.record = record
+        self.cart_id = None
+        self.cart_items = 0
+
+    def call(self, endpoint, method, path, data=None):
+        started = time.perf_counter()
+        try:
+            status, server_timing, content = self.transport.request(method, path, data)
+        except requests.RequestException:
+            status, server_timing, content = 0, '', b''
+        self.record(endpoint, time.perf_counter() - started, status, server_timing)
+        return status, content
+
+    def ensure_cart(self):
+        if self.cart_id is None:
+            status, content = self.call('POST /store/carts/', 'POST', '/store/carts/')
+            if status == 201:
+                self.cart_id = json.loads(content)['id']
+                self.cart_items = 0
+        return self.cart_id
+
+    def list_products(self):
+        path = '/store/products/?page_size=20'
+        if self.rng.random() < 0.5:
+            path += f'&collection_id={self.rng.choice(self.collection_ids)}&ordering=unit_price'
+        self.call('GET /store/products/', 'GET', path)
+
+    def get_product(self):
+        self.call('GET /store/products/{id}/', 'GET', f'/store/products/{self.rng.choice(self.product_ids)}/')
+
+    def search(self):
+        query = ' '.join(self.rng.sample(self.words, 2))[:-2]
+        self.call('GET /store/products/search/', 'GET', f'/store/products/search/?q={query}')
+
+    def list_collections(self):
+        self.call('GET /store/collections/', 'GET', '/store/collections/')
+
+    def add_to_cart(self):
+        if self.ensure_cart():
+            data = {'product_id': self.rng.choice(self.product_ids), 'quantity': self.rng.randint(1, 3)}
+            status, _ = self.call('POST /store/carts/{id}/items/', 'POST', f'/store/carts/{self.cart_id}/items/', data)
+            self.cart_items += status == 201
+
+    def list_cart_items(self):
+        if self.ensure_cart():
+            self.call('GET /store/carts/{id}/items/', 'GET', f'/store/carts/{self.cart_id}/items/')
+
+    def get_cart(self):
+        if self.ensure_cart():
+            self.call('GET /store/carts/{id}/', 'GET', f'/store/carts/{self.cart_id}/')
+
+    def place_order(self):
+        if not self.cart_items:
+            return self.add_to_cart()
+        status, _ = self.call('POST /store/orders/', 'POST', '/store/orders/', {'cart_id': self.cart_id})
+        if status == 200:
+            self.cart_id = None
+
+    def list_orders(self):
+        self.call('GET /store/orders/', 'GET', '/store/orders/')
+
+    def wallet_balance(self):
+        self.call('GET /payments/wallet/balance/', 'GET', '/payments/wallet/balance/')
+
+    def wallet_transactions(self):
+        self.call('GET /payments/transactions/', 'GET', '/payments/transactions/')
+
+    def payment_history(self):
+        self.call('GET /payments/paystack/history/', 'GET', '/payments/paystack/history/')
+
+    SCENARIOS = [
+        (list_products, 20), (get_product, 20), (search, 10), (list_collections, 5),
+        (add_to_cart, 10), (list_cart_items, 8), (get_cart, 5), (place_order, 3),
+        (list_orders, 6), (wallet_balance, 4), (wallet_transactions, 3), (payment_history, 3),
+    ]
+
+    def run(self, count):
+        scenarios = [scenario for scenario, _ in self.SCENARIOS]
+        weights = [weight for _, weight in self.SCENARIOS]
+        try:
+            for scenario in self.rng.choices(scenarios, weights, k=count):
+                scenario(self)
+        finally:
+            self.transport.close()
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Drive the real URL routes with concurrent simulated shoppers against the seed_bench data '
+        'and report latency percentiles, throughput and query counts per endpoint.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=2000, help='Total requests across all clients.')
+        parser.add_argument('--url', help='Base URL of a running server; by default requests run in-process.')
+        parser.add_argument('--host', default='localhost', help='Host header for in-process requests.')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--save', help='Write the results to this JSON file.')
+        parser.add_argument('--compare', help='Fail if p95 or queries per request regress against this JSON file.')
+        parser.add_argument('--max-regression', type=float, default=0.25,
+                            help='Allowed p95 slowdown for --compare, as a fraction.')
+        parser.add_argument('--min-regression-ms', type=float, default=5.0,
+                            help='p95 slowdowns smaller than this are treated as noise.')
+
+    def handle(self, *args, **options):
+        users = list(get_user_model().objects.filter(username__startswith=USERNAME_PREFIX)[:options['clients']])
+        collection_ids = list(Collection.objects.filter(title__startswith=COLLECTION_PREFIX).values_list('id', flat=True))
+        product_ids = list(
+            Product.objects.filter(collection_id__in=collection_ids).values_list('id', flat=True)[:5000])
+        if len(users) < options['clients'] or not product_ids:
+            raise CommandError(f"Seed the database first: manage.py seed_bench --users {options['clients']}")
+        words = sorted({
+            word.lower() for title in Product.objects.filter(pk__in=product_ids[:200]).values_list('title', flat=True)
+            for word in title.split()
+        })
+
+        samples = defaultdict(list)
+        lock = threading.Lock()
+
+        def record(endpoint, duration, status, server_timing):
+            queries = SERVER_TIMING_QUERIES.search(server_timing)
+            db = SERVER_TIMING_DB.search(server_timing)
+            with lock:
+                samples[endpoint].append((
+                    duration, status,
+                    int(queries.group(1)) if queries else None,
+                    float(db.group(1)) if db else None,
+                ))
+
+        workers = []
+        for index, user in enumerate(users):
+            token = str(AccessToken.for_user(user))
+            transport = HttpTransport(options['url'], token) if options['url'] else InProcessTransport(options['host'], token)
+            workers.append(Worker(transport, random.Random(options['seed'] + index),
+                                  product_ids, collection_ids, words, record))
+
+        per_worker = options['requests'] // options['clients']
+        threads = [threading.Thread(target=worker.run, args=(per_worker,)) for worker in workers]
+        started = time.perf_counter()
+        # Query counts come from Server-Timing; a server run with --url needs PROFILING_SERVER_TIMING on.
+        with override_settings(PROFILING_SERVER_TIMING=True):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        elapsed = time.perf_counter() - started
+
+        results = self.summarize(samples, elapsed)
+        self.report(results, elapsed, options)
+        if options['save']:
+            with open(options['save'], 'w') as output:
+                json.dump(results, output, indent=2)
+        if options['compare']:
+            self.compare(results, options['compare'], options['max_regression'], options['min_regression_ms'])
+
+    def summarize(self, samples, elapsed):
+        results = {}
+        for endpoint, rows in sorted(samples.items()):
+            durations = sorted(row[0] * 1000 for row in rows)
+            queries = [row[2] for row in rows if row[2] is not None]
+            db = [row[3] for row in rows if row[3] is not None]
+            results[endpoint] = {
+                'requests': len(rows),
+                'errors': sum(1 for row in rows if not 200 <= row[1] < 400),
+                'rps': len(rows) / elapsed,
+                'p50_ms': percentile(durations, 0.50),
+                'p95_ms': percentile(durations, 0.95),
+                'p99_ms': percentile(durations, 0.99),
+                'queries': sum(queries) / len(queries) if queries else None,
+                'db_ms': sum(db) / len(db) if db else None,
+            }
+        return results
+
+    def report(self, results, elapsed, options):
+        total = sum(result['requests'] for result in results.values())
+        errors = sum(result['errors'] for result in results.values())
+        self.stdout.write(
+            f"{options['clients']} clients, {total} requests in {elapsed:.1f}s: "
+            f"{total / elapsed:.1f} req/s, {errors} error(s)\n")
+        self.stdout.write(
+            f"{'endpoint':<34} {'reqs':>6} {'err':>4} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} "
+            f"{'p99 ms':>8} {'queries':>8} {'db ms':>7}")
+        for endpoint, result in results.items():
+            queries = f"{result['queries']:.1f}" if result['queries'] is not None else '-'
+            db = f"{result['db_ms']:.1f}" if result['db_ms'] is not None else '-'
+            self.stdout.write(
+                f"{endpoint:<34} {result['requests']:>6} {result['errors']:>4} {result['rps']:>7.1f} "
+                f"{result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f} {queries:>8} {db:>7}")
+
+    def compare(self, results, path, max_regression, min_regression_ms):
+        with open(path) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = []
+        for endpoint, result in results.items():
+            before = baseline.get(endpoint)
+            if not before:
+                continue
+            slowdown = result['p95_ms'] - before['p95_ms']
+            if slowdown > min_regression_ms and result['p95_ms'] > before['p95_ms'] * (1 + max_regression):
+                regressions.append(f"{endpoint}: p95 {before['p95_ms']:.1f} -> {result['p95_ms']:.1f} ms")
+            if result['queries'] is not None and before['queries'] is not None \
+                    and result['queries'] > before['queries'] + 0.5:
+                regressions.append(f"{endpoint}: queries {before['queries']:.1f} -> {result['queries']:.1f}")
+        if regressions:
+            raise CommandError('Regressions against the baseline:\n  ' + '\n  '.join(regressions))
+        self.stdout.write(self.style.SUCCESS(f'No regressions against {path}.'))
@@ -0,0 +1,77 @@
+import statistics
+import time
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from store.models import Cart
+# pylint: disable=no-member
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare per-request latency with a new database connection per request '
+        '(CONN_MAX_AGE=0) and with persistent connections, through the full WSGI handler.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', help='Defaults to the items of a throwaway database cart.')
+        parser.add_argument('--host', default='localhost', help='Must be in ALLOWED_HOSTS.')
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--max-age', type=int, default=60, help='CONN_MAX_AGE for the persistent run.')
+
+    def handle(self, *args, **options):
+        cart = Cart.objects.create()
+        path = options['path'] or f'/store/carts/{cart.id}/items/'
+        handler = WSGIHandler()
+        factory = RequestFactory(HTTP_HOST=options['host'])
+        connects = []
+
+        def count_connect(sender, **kwargs):
+            connects.append(1)
+
+        def call():
+            # The same path a real server takes, including the request_started /
+            # request_finished signals that close or keep the connection.
+            response = handler(factory.get(path).environ, lambda status, headers: None)
+            b''.join(response)
+            response.close()
+            return response.status_code
+
+        settings_dict = connection.settings_dict
+        self.stdout.write(f"{connection.vendor} at {settings_dict['HOST'] or settings_dict['NAME']}, GET {path}")
+        original = settings_dict['CONN_MAX_AGE']
+        connection_created.connect(count_connect)
+        try:
+            with override_settings(CART_STORAGE='database'):
+                runs = [('new connection per request', 0), (f'persistent ({options["max_age"]}s)', options['max_age'])]
+                for label, max_age in runs:
+                    settings_dict['CONN_MAX_AGE'] = max_age
+                    connection.close()
+                    status_code = call()
+                    if status_code != 200:
+                        self.stderr.write(self.style.ERROR(f'{path} returned {status_code}'))
+                        return
+
+                    connects.clear()
+                    timings = []
+                    for _ in range(options['requests']):
+                        started = time.perf_counter()
+                        call()
+                        timings.append((time.perf_counter() - started) * 1000)
+
+                    timings.sort()
+                    self.stdout.write(
+                        f'{label:>28}: mean {statistics.mean(timings):7.2f} ms, '
+                        f'p50 {timings[len(timings) // 2]:7.2f} ms, '
+                        f'p95 {timings[int(len(timings) * 0.95)]:7.2f} ms, '
+                        f'{len(connects)} connection(s) opened'
+                    )
+        finally:
+            connection_created.disconnect(count_connect)
+            settings_dict['CONN_MAX_AGE'] = original
+            connection.close()
+            cart.delete()
@@ -0,0 +1,89 @@
+import threading
+import time
+from uuid import uuid4
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections
+from rest_framework import serializers
+from store.carts import get_cart_store
+from store.models import Collection, Customer, Order, Product
+from store.serializers import CreateOrderSerializer
+# pylint: disable=no-member
+
+
+class Command(BaseCommand):
+    help = 'Measure order throughput with many workers buying the same hot product.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=16)
+        parser.add_argument('--orders', type=int, default=500, help='Total orders attempted.')
+        parser.add_argument('--stock', type=int, default=400, help='Starting inventory of the hot product.')
+        parser.add_argument('--quantity', type=int, default=1, help='Units bought per order.')
+
+    def handle(self, *args, **options):
+        workers, orders, quantity = options['workers'], options['orders'], options['quantity']
+
+        user = get_user_model().objects.create(
+            username=f'bench-{uuid4().hex[:12]}', email=f'{uuid4().hex}@bench.invalid')
+        customer = Customer.objects.create(user=user)
+        collection = Collection.objects.create(title='Inventory benchmark')
+        product = Product.objects.create(
+            title='Hot SKU', description='', unit_price=10, inventory=options['stock'], collection=collection)
+
+        store = get_cart_store()
+        carts = [store.create_cart() for _ in range(orders)]
+        for cart in carts:
+            store.add_items(cart.id, [(product.id, quantity)])
+
+        results = {'placed': 0, 'sold_out': 0, 'errors': 0}
+        lock = threading.Lock()
+        chunks = [carts[i::workers] for i in range(workers)]
+
+        def buy(chunk):
+            for cart in chunk:
+                serializer = CreateOrderSerializer(data={'cart_id': cart.id}, context={'user_id': user.id})
+                serializer.is_valid(raise_exception=True)
+                try:
+                    serializer.save()
+                    outcome = 'placed'
+                except serializers.ValidationError:
+                    outcome = 'sold_out'
+                except OperationalError:
+                    outcome = 'errors'
+                with lock:
+                    results[outcome] += 1
+            connections.close_all()
+
+        threads = [threading.Thread(target=buy, args=(chunk,)) for chunk in chunks]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        product.refresh_from_db()
+        sold = options['stock'] - product.inventory
+        oversold = product.inventory < 0 or sold != results['placed'] * quantity
+
+        self.stdout.write(
+            f"{workers} workers, {orders} orders in {elapsed:.2f}s: "
+            f"{results['placed'] / elapsed:.1f} orders/sec placed, "
+            f"{orders / elapsed:.1f} attempts/sec"
+        )
+        self.stdout.write(
+            f"placed={results['placed']} sold_out={results['sold_out']} errors={results['errors']} "
+            f"remaining_stock={product.inventory}"
+        )
+        if oversold:
+            self.stderr.write(self.style.ERROR(f'Inventory mismatch: sold {sold}, placed {results["placed"]}'))
+        else:
+            self.stdout.write(self.style.SUCCESS('No overselling.'))
+
+        Order.objects.filter(customer=customer).delete()
+        for cart in carts:
+            store.delete_cart(cart.id)
+        product.delete()
+        collection.delete()
+        user.delete()
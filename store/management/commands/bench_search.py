@@ -0,0 +1,67 @@
+import random
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+from store.models import Collection, Product, ProductSearchToken
+from store.search import search_product_ids, tokenize, use_fulltext
+from .bench_api import percentile
+# pylint: disable=no-member
+
+
+class Command(BaseCommand):
+    help = (
+        'Time product search against the current catalog (see seed_bench) with typeahead-style queries '
+        'and report latency percentiles per kind of query.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=500)
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--max-p99', type=float, help='Fail if the overall p99 exceeds this many milliseconds.')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        product_count = Product.objects.count()
+        last_id = Product.objects.order_by('-id').values_list('id', flat=True).first()
+        if not last_id:
+            raise CommandError('The catalog is empty; seed it first with manage.py seed_bench.')
+        titles = []
+        while len(titles) < 200:
+            title = Product.objects.filter(id__gte=rng.randint(1, last_id)).values_list('title', flat=True).first()
+            if title and tokenize(title):
+                titles.append(tokenize(title))
+        collection_ids = list(Collection.objects.values_list('id', flat=True)[:100])
+
+        def prefix(word):
+            return word[:rng.randint(2, max(2, len(word) - 1))]
+
+        kinds = {
+            'prefix': lambda words: prefix(words[0]),
+            'word prefix': lambda words: f'{words[0]} {prefix(words[-1])}',
+            'two words': lambda words: f'{words[0]} {words[-1]}',
+            'in collection': lambda words: f'{words[0]} {prefix(words[-1])}',
+        }
+        samples = defaultdict(list)
+        for _ in range(options['queries']):
+            kind = rng.choice(list(kinds))
+            query = kinds[kind](rng.choice(titles))
+            collection_id = rng.choice(collection_ids) if kind == 'in collection' else None
+            started = time.perf_counter()
+            search_product_ids(query, collection_id, options['limit'])
+            samples[kind].append((time.perf_counter() - started) * 1000)
+
+        backend = 'FULLTEXT' if use_fulltext() else f'inverted index, {ProductSearchToken.objects.count()} postings'
+        self.stdout.write(f'{product_count} products ({backend})')
+        self.stdout.write(f'{"queries":<16}{"n":>6}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}')
+        samples['all'] = [duration for durations in list(samples.values()) for duration in durations]
+        for kind, durations in samples.items():
+            durations.sort()
+            self.stdout.write(
+                f'{kind:<16}{len(durations):>6}{percentile(durations, 0.50):>10.1f}'
+                f'{percentile(durations, 0.95):>10.1f}{percentile(durations, 0.99):>10.1f}')
+
+        p99 = percentile(samples['all'], 0.99)
+        if options['max_p99'] is not None and p99 > options['max_p99']:
+            raise CommandError(f'p99 {p99:.1f} ms is over the {options["max_p99"]:.1f} ms budget.')
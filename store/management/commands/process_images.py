@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from store.images import process_product_image
+from store.models import ProductImage
+# pylint: disable=no-member
+
+
+class Command(BaseCommand):
+    help = 'Generate resized variants and placeholders for product images.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Reprocess images that already have variants.')
+
+    def handle(self, *args, **options):
+        images = ProductImage.objects.order_by('id')
+        if not options['all']:
+            images = images.filter(placeholder='')
+
+        processed = failed = 0
+        for image_id in images.values_list('id', flat=True).iterator():
+            try:
+                process_product_image(image_id)
+                processed += 1
+            except (OSError, ValueError) as e:
+                failed += 1
+                self.stderr.write(f'Image {image_id}: {e}')
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} image(s), {failed} failed.'))
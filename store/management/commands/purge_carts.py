@@ -0,0 +1,28 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from store.carts import purge_expired_carts
+
+
+class Command(BaseCommand):
+    help = 'Delete carts (and their items) idle for longer than CART_TTL, in small batches. Run it daily from cron.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--pause', type=float, default=0.0, help='Seconds to sleep between batches.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        total_carts = total_items = 0
+        for carts, items in purge_expired_carts(options['batch_size'], options['pause']):
+            total_carts += carts
+            total_items += items
+            self.stdout.write(f'Deleted {carts} cart(s) and {items} item(s)')
+
+        elapsed = time.perf_counter() - started
+        rows = total_carts + total_items
+        self.stdout.write(self.style.SUCCESS(
+            f'Purged {total_carts} cart(s) and {total_items} item(s) idle for over {settings.CART_TTL.days} day(s) '
+            f'in {elapsed:.2f}s ({rows / elapsed if elapsed else 0:.0f} rows/sec)'
+        ))
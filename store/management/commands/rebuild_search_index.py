@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from store.search import rebuild_index, use_fulltext
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the built-in product search index (not needed with MySQL FULLTEXT).'
+
+    def handle(self, *args, **options):
+        if use_fulltext():
+            self.stdout.write('Search uses MySQL FULLTEXT; nothing to rebuild.')
+            return
+        indexed = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} product(s).'))
@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+from store.analytics import rebuild_sales_rollups, update_sales_rollups
+
+
+class Command(BaseCommand):
+    help = 'Fold orders placed since the last run into the daily sales rollups; schedule it every few minutes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Orders per transaction.')
+        parser.add_argument('--rebuild', action='store_true', help='Empty the rollups and read every order again.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options['rebuild']:
+            done = rebuild_sales_rollups(options['batch_size'])
+        else:
+            done = update_sales_rollups(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rolled up {done} orders in {time.perf_counter() - started:.1f}s.'))
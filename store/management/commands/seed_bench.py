@@ -0,0 +1,172 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+from uuid import UUID, uuid4
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Max
+from django.utils import timezone
+from payments.models import PaymentLog, UserWallet, WalletTransaction
+from store.cache import bump_catalog_version
+from store.models import Cart, CartItem, Collection, Customer, Order, OrderItem, Product
+from store.orders import refresh_order_totals
+from store.search import rebuild_index, use_fulltext
+# pylint: disable=no-member
+
+# Everything seeded is recognisable by these, so --clear only removes benchmark data.
+COLLECTION_PREFIX = 'Bench: '
+USERNAME_PREFIX = 'bench-user-'
+CART_ID_PREFIX = 'be4c0000'
+
+WORDS = (
+    'wireless bluetooth headphones speaker portable smart watch fitness tracker leather wallet '
+    'cotton shirt denim jacket running shoes yoga mat kitchen knife ceramic mug coffee grinder '
+    'desk lamp office chair gaming keyboard mouse monitor stand laptop backpack travel bottle '
+    'steel organic tea honey skincare serum vitamin charger cable phone case camera tripod'
+).split()
+
+
+def bulk_create_with_ids(model, objs):
+    """bulk_create that sets primary keys even where the backend doesn't return them (MySQL)."""
+    if connection.features.can_return_rows_from_bulk_insert:
+        return model.objects.bulk_create(objs)
+    last_id = model.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+    model.objects.bulk_create(objs)
+    for obj, pk in zip(objs, model.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)):
+        obj.id = pk
+    return objs
+
+
+def bench_cart_id():
+    return UUID(CART_ID_PREFIX + uuid4().hex[len(CART_ID_PREFIX):])
+
+
+class Command(BaseCommand):
+    help = 'Seed a large benchmark catalog with users, wallets, carts and orders into the local database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--collections', type=int, default=50)
+        parser.add_argument('--products', type=int, default=50000)
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--carts', type=int, default=2000)
+        parser.add_argument('--orders', type=int, default=20000)
+        parser.add_argument('--days', type=int, default=365, help='Orders are spread over this many past days.')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--clear', action='store_true', help='Remove previously seeded benchmark data and stop.')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            self.clear()
+            return
+
+        rng = random.Random(options['seed'])
+        batch_size = options['batch_size']
+        started = time.perf_counter()
+
+        collections = bulk_create_with_ids(Collection, [
+            Collection(title=f'{COLLECTION_PREFIX}{" ".join(rng.sample(WORDS, 2)).title()} {i}')
+            for i in range(options['collections'])
+        ])
+        self.step('collections', len(collections), started)
+
+        product_ids = []
+        for offset in range(0, options['products'], batch_size):
+            products = bulk_create_with_ids(Product, [
+                Product(
+                    title=' '.join(rng.sample(WORDS, 3)).title(),
+                    description=' '.join(rng.choices(WORDS, k=20)),
+                    unit_price=Decimal(rng.randint(100, 99999)) / 100,
+                    inventory=1_000_000,
+                    collection=rng.choice(collections),
+                ) for _ in range(min(batch_size, options['products'] - offset))
+            ])
+            product_ids += [product.id for product in products]
+        self.step('products', len(product_ids), started)
+
+        User = get_user_model()
+        first = User.objects.filter(username__startswith=USERNAME_PREFIX).count()
+        users = User.objects.bulk_create([
+            User(username=f'{USERNAME_PREFIX}{i}', email=f'{USERNAME_PREFIX}{i}@bench.invalid', password='!')
+            for i in range(first, first + options['users'])
+        ])
+        users = list(User.objects.filter(username__in=[user.username for user in users]))
+        Customer.objects.bulk_create([Customer(user=user) for user in users])
+        customers = list(Customer.objects.filter(user__in=users))
+        UserWallet.objects.bulk_create([UserWallet(user=user, balance=100000) for user in users])
+        wallets = list(UserWallet.objects.filter(user__in=users))
+        WalletTransaction.objects.bulk_create([
+            WalletTransaction(wallet=wallet, transaction_type='CREDIT', amount=20000,
+                              reference=f'bench-{uuid4().hex}', description='Benchmark top-up')
+            for wallet in wallets for _ in range(5)
+        ], batch_size=batch_size)
+        PaymentLog.objects.bulk_create([
+            PaymentLog(user=user, gateway='paystack', reference=f'bench-{uuid4().hex}',
+                       amount=20000, status='success')
+            for user in users for _ in range(5)
+        ], batch_size=batch_size)
+        self.step('users with wallets and payments', len(users), started)
+
+        carts = Cart.objects.bulk_create([Cart(id=bench_cart_id()) for _ in range(options['carts'])],
+                                         batch_size=batch_size)
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, product_id=product_id, quantity=rng.randint(1, 3))
+            for cart in carts for product_id in rng.sample(product_ids, 3)
+        ], batch_size=batch_size)
+        self.step('carts', len(carts), started)
+
+        prices = dict(Product.objects.filter(pk__in=product_ids).values_list('id', 'unit_price'))
+        orders_by_day = {}
+        for offset in range(0, options['orders'], batch_size):
+            orders = bulk_create_with_ids(Order, [
+                Order(customer=rng.choice(customers), payment_status=rng.choice('PCC'))
+                for _ in range(min(batch_size, options['orders'] - offset))
+            ])
+            items = []
+            for order in orders:
+                orders_by_day.setdefault(rng.randrange(options['days']), []).append(order.id)
+                for product_id in rng.sample(product_ids, rng.randint(1, 4)):
+                    items.append(OrderItem(order=order, product_id=product_id,
+                                           quantity=rng.randint(1, 5), unit_price=prices[product_id]))
+            OrderItem.objects.bulk_create(items)
+            refresh_order_totals([order.id for order in orders])
+
+        # placed_at is auto_now_add; spread the orders over the past days afterwards.
+        now = timezone.now()
+        for day, order_ids in orders_by_day.items():
+            for offset in range(0, len(order_ids), batch_size):
+                Order.objects.filter(pk__in=order_ids[offset:offset + batch_size]).update(
+                    placed_at=now - timedelta(days=day, seconds=rng.randrange(86400)))
+        self.step('orders', options['orders'], started)
+
+        # Bulk inserts skip the signals that keep the catalog cache and search index current.
+        bump_catalog_version()
+        if not use_fulltext():
+            rebuild_index()
+            self.step('search index', len(product_ids), started)
+        self.stdout.write(self.style.SUCCESS(f'Seeded in {time.perf_counter() - started:.1f}s.'))
+
+    def step(self, label, count, started):
+        self.stdout.write(f'{time.perf_counter() - started:7.1f}s  {count} {label}')
+
+    def clear(self):
+        User = get_user_model()
+        users = User.objects.filter(username__startswith=USERNAME_PREFIX)
+        OrderItem.objects.filter(order__customer__user__in=users).delete()
+        Order.objects.filter(customer__user__in=users).delete()
+        users.delete()
+        carts = Cart.objects.filter(id__startswith=CART_ID_PREFIX)
+        CartItem.objects.filter(cart__in=carts).delete()
+        carts.delete()
+        collections = Collection.objects.filter(title__startswith=COLLECTION_PREFIX)
+        OrderItem.objects.filter(product__collection__in=collections).delete()
+        CartItem.objects.filter(product__collection__in=collections).delete()
+        Product.objects.filter(collection__in=collections).delete()
+        collections.delete()
+        bump_catalog_version()
+        if not use_fulltext():
+            rebuild_index()
+        self.stdout.write(self.style.SUCCESS('Removed benchmark data.'))
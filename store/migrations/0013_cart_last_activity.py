@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:23
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0012_productimage_variants'),
+    ]
+
+    operations = [
+        # Existing carts get the migration time: their real last activity is
+        # unknown, so they are kept for a full expiry period.
+        migrations.AddField(
+            model_name='cart',
+            name='last_activity',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from uuid import uuid4
 
 # pylint: disable=no-member
@@ -42,23 +43,44 @@ class Collection(models.Model):
     
 
 class Product(models.Model):
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)  # external key for catalog imports
     title = models.CharField(max_length=255)
     description = models.TextField()
     unit_price = models.DecimalField(max_digits=6, decimal_places=2)
     inventory = models.IntegerField()
     collection = models.ForeignKey(Collection, on_delete=models.CASCADE, related_name='products')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['collection', 'unit_price']),
+            models.Index(fields=['inventory']),
+        ]
     
     def __str__(self) ->str:
         return str(self.title)
     
+class ProductSearchToken(models.Model):
+    # Built-in inverted index for databases without FULLTEXT support
+    token = models.CharField(max_length=64)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='search_tokens')
+    weight = models.PositiveSmallIntegerField()
+
+    class Meta:
+        # Covers the search query, so postings are read from the index alone
+        indexes = [models.Index(fields=['token', 'product', 'weight'])]
+
+
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images')
     image = models.ImageField(upload_to='store/images')
+    variants = models.JSONField(default=dict, blank=True)  # {name: {width, height, webp, jpeg}}
+    placeholder = models.TextField(blank=True)  # inline LQIP data URI
     
 
 class Cart(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid4)
     created_at = models.DateTimeField(auto_now_add=True)
+    last_activity = models.DateTimeField(default=timezone.now, db_index=True)
     
 class CartItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
@@ -81,6 +103,17 @@ class Order(models.Model):
     placed_at = models.DateTimeField(auto_now_add=True)
     payment_status = models.CharField(max_length=1, choices=PAYMENT_STATUS_CHOICES, default=PAYMENT_STATUS_PENDING)
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='orders')
+    # Stored when the order is placed so lists and reports don't sum the items.
+    total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    item_count = models.PositiveIntegerField(default=0)  # units across all lines
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['placed_at']),
+            models.Index(fields=['customer', 'placed_at']),
+            models.Index(fields=['total_amount']),
+            models.Index(fields=['customer', 'total_amount']),
+        ]
     
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
@@ -88,4 +121,46 @@ class OrderItem(models.Model):
     quantity = models.IntegerField()
     unit_price = models.DecimalField(max_digits=6, decimal_places=2)
     
-    
\ No newline at end of file
+    
+
+class RollupWatermark(models.Model):
+    """How far an incremental rollup has read the order table."""
+    name = models.CharField(max_length=50, primary_key=True)
+    last_order_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class DailySales(models.Model):
+    day = models.DateField(unique=True)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    units = models.PositiveIntegerField(default=0)
+    orders = models.PositiveIntegerField(default=0)
+
+
+class DailyCollectionSales(models.Model):
+    day = models.DateField()
+    collection = models.ForeignKey(Collection, on_delete=models.CASCADE, related_name='+')
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    units = models.PositiveIntegerField(default=0)
+    orders = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = [['day', 'collection']]
+        indexes = [models.Index(fields=['collection', 'day'])]
+
+
+class DailyProductSales(models.Model):
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    # The product's collection when the orders were rolled up, for per-collection top products.
+    collection = models.ForeignKey(Collection, on_delete=models.CASCADE, related_name='+')
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    units = models.PositiveIntegerField(default=0)
+    orders = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = [['day', 'product']]
+        indexes = [
+            models.Index(fields=['product', 'day']),
+            models.Index(fields=['collection', 'day']),
+        ]
@@ -0,0 +1,37 @@
+from decimal import Decimal
+
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+from .models import Order, OrderItem
+# pylint: disable=no-member
+
+
+def order_totals(items):
+    """`(total_amount, item_count)` for OrderItem instances that aren't saved yet."""
+    return (
+        sum((item.unit_price * item.quantity for item in items), Decimal('0')),
+        sum(item.quantity for item in items),
+    )
+
+
+def refresh_order_totals(order_ids):
+    """
+    Recompute the stored totals of `order_ids` from their items with one
+    grouped query and one bulk UPDATE. Returns the number of orders.
+    """
+    line_total = ExpressionWrapper(F('quantity') * F('unit_price'), output_field=DecimalField(max_digits=12, decimal_places=2))
+    totals = {
+        row['order_id']: row
+        for row in OrderItem.objects.filter(order_id__in=order_ids)
+        .values('order_id')
+        .annotate(total=Sum(line_total), count=Sum('quantity'))
+    }
+    orders = [
+        Order(
+            pk=order_id,
+            total_amount=totals[order_id]['total'] if order_id in totals else 0,
+            item_count=totals[order_id]['count'] if order_id in totals else 0,
+        )
+        for order_id in order_ids
+    ]
+    Order.objects.bulk_update(orders, ['total_amount', 'item_count'])
+    return len(orders)
@@ -0,0 +1,35 @@
+from rest_framework.pagination import CursorPagination
+
+
+class TieBreakingCursorPagination(CursorPagination):
+    """
+    Appends the primary key to the requested ordering. A cursor on a field
+    that isn't unique (`?ordering=unit_price`) steps over ties by offset,
+    which only works if the tied rows come back in the same order each time.
+    """
+
+    def get_ordering(self, request, queryset, view):
+        ordering = tuple(super().get_ordering(request, queryset, view))
+        if any(field.lstrip('-') in ('id', 'pk') for field in ordering):
+            return ordering
+        return (*ordering, '-id' if ordering[0].startswith('-') else 'id')
+
+
+class ProductCursorPagination(TieBreakingCursorPagination):
+    # Keyset pagination on the primary key: every page is a
+    # `WHERE id > <cursor> ORDER BY id LIMIT n` no matter how deep the client goes.
+    ordering = 'id'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class OrderCursorPagination(TieBreakingCursorPagination):
+    # Newest first; matches the (customer, placed_at) and placed_at indexes
+    # so a page is an index range scan even over the whole order table
+    # (InnoDB keeps the id at the end of every secondary index entry, so the
+    # appended id tie-breaker is served by the same index).
+    ordering = '-placed_at'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
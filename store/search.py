@@ -0,0 +1,165 @@
+import re
+from collections import Counter
+from functools import lru_cache, reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, IntegerField, Max, Q, Sum, When
+from django.db.models.expressions import RawSQL
+from .models import Product, ProductSearchToken
+# pylint: disable=no-member
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+TITLE_WEIGHT = 3
+DESCRIPTION_WEIGHT = 1
+
+
+def tokenize(text):
+    return [token[:64] for token in TOKEN_RE.findall(text.lower()) if len(token) > 1]
+
+
+def use_fulltext():
+    backend = settings.PRODUCT_SEARCH_BACKEND
+    if backend == 'auto':
+        return connection.vendor == 'mysql'
+    return backend == 'fulltext'
+
+
+def token_weights(product):
+    weights = Counter()
+    for token in tokenize(product.title):
+        weights[token] += TITLE_WEIGHT
+    for token in tokenize(product.description):
+        weights[token] += DESCRIPTION_WEIGHT
+    return {token: min(weight, 32767) for token, weight in weights.items()}
+
+
+def product_tokens(product):
+    return [
+        ProductSearchToken(product_id=product.id, token=token, weight=weight)
+        for token, weight in token_weights(product).items()
+    ]
+
+
+def index_products(products, batch_size=1000):
+    """
+    Bring the built-in inverted index rows of `products` up to date, writing
+    only the tokens that were added, dropped or reweighted: re-saving a
+    product with an unchanged title and description is a single read.
+    """
+    wanted = {product.id: token_weights(product) for product in products}
+    stale, changed = [], []
+    with transaction.atomic():
+        rows = ProductSearchToken.objects.filter(product_id__in=wanted).values_list('id', 'product_id', 'token', 'weight')
+        for pk, product_id, token, weight in rows:
+            new_weight = wanted[product_id].pop(token, None)  # what is left afterwards is new
+            if new_weight is None:
+                stale.append(pk)
+            elif new_weight != weight:
+                changed.append(ProductSearchToken(id=pk, weight=new_weight))
+        for offset in range(0, len(stale), batch_size):
+            ProductSearchToken.objects.filter(pk__in=stale[offset:offset + batch_size]).delete()
+        ProductSearchToken.objects.bulk_update(changed, ['weight'], batch_size=batch_size)
+        ProductSearchToken.objects.bulk_create([
+            ProductSearchToken(product_id=product_id, token=token, weight=weight)
+            for product_id, weights in wanted.items() for token, weight in weights.items()
+        ], batch_size=batch_size)
+
+
+def index_product(product):
+    """Update the product's rows in the built-in inverted index."""
+    index_products([product])
+
+
+def rebuild_index(chunk_size=2000):
+    """Rebuild the inverted index for the whole catalog, a chunk at a time."""
+    ProductSearchToken.objects.all().delete()
+    indexed = 0
+    products = Product.objects.only('id', 'title', 'description').order_by('id')
+    last_id = 0
+    while True:
+        chunk = list(products.filter(id__gt=last_id)[:chunk_size])
+        if not chunk:
+            return indexed
+        ProductSearchToken.objects.bulk_create(
+            [token for product in chunk for token in product_tokens(product)], batch_size=chunk_size)
+        indexed += len(chunk)
+        last_id = chunk[-1].id
+
+
+def search_product_ids(query, collection_id=None, limit=20):
+    """
+    Return the ids of products matching every term of `query`, best match
+    first. The last term matches as a prefix, for typeahead.
+    """
+    terms = tokenize(query)
+    if not terms:
+        return []
+    if use_fulltext():
+        return _fulltext_search(terms, collection_id, limit)
+    return _inverted_index_search(terms, collection_id, limit)
+
+
+@lru_cache(maxsize=None)
+def fulltext_limits():
+    """
+    `(min_token_size, stopwords)` of the server's InnoDB FULLTEXT parser,
+    read once per process: shorter words and stopwords are never indexed.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT @@innodb_ft_min_token_size, @@innodb_ft_enable_stopword, @@innodb_ft_server_stopword_table')
+        min_token_size, stopwords_enabled, stopword_table = cursor.fetchone()
+        stopwords = frozenset()
+        if stopwords_enabled:
+            if stopword_table:
+                schema, table = stopword_table.split('/', 1)
+                cursor.execute(f'SELECT value FROM `{schema}`.`{table}`')
+            else:
+                cursor.execute('SELECT value FROM INFORMATION_SCHEMA.INNODB_FT_DEFAULT_STOPWORD')
+            stopwords = frozenset(row[0].lower() for row in cursor.fetchall())
+    return int(min_token_size), stopwords
+
+
+def boolean_query(terms, min_token_size, stopwords):
+    """
+    The BOOLEAN MODE query requiring every term, the last as a prefix.
+    Words the index never holds are left out rather than required, or no
+    product could match; the prefix is kept, as MySQL still expands it.
+    """
+    *words, prefix = terms
+    required = [f'+{word}' for word in words if len(word) >= min_token_size and word not in stopwords]
+    return ' '.join([*required, f'+{prefix}*'])
+
+
+def _fulltext_search(terms, collection_id, limit):
+    min_token_size, stopwords = fulltext_limits()
+    match = 'MATCH (store_product.title, store_product.description) AGAINST (%s IN BOOLEAN MODE)'
+    query = boolean_query(terms, min_token_size, stopwords)
+    products = Product.objects.annotate(rank=RawSQL(match, [query])).filter(rank__gt=0)
+    if collection_id is not None:
+        products = products.filter(collection_id=collection_id)
+    return list(products.order_by('-rank', 'id').values_list('id', flat=True)[:limit])
+
+
+def _inverted_index_search(terms, collection_id, limit):
+    # The prefix is a range over the (token, product) index rather than a
+    # LIKE, which SQLite can't serve from an index.
+    prefix = terms[-1]
+    conditions = [Q(token=term) for term in terms[:-1]] + [Q(token__gte=prefix, token__lt=prefix + '\uffff')]
+    matched = {
+        f'term_{i}': Max(Case(When(condition, then=1), default=0, output_field=IntegerField()))
+        for i, condition in enumerate(conditions)
+    }
+
+    tokens = ProductSearchToken.objects.filter(reduce(or_, conditions))
+    if collection_id is not None:
+        tokens = tokens.filter(product__collection_id=collection_id)
+    return list(
+        tokens.values('product_id')
+        .annotate(rank=Sum('weight'), **matched)
+        .filter(**{name: 1 for name in matched})
+        .order_by('-rank', 'product_id')
+        .values_list('product_id', flat=True)[:limit]
+    )
@@ -1,25 +1,57 @@
 from rest_framework import serializers
 from .models import Product, ProductImage,Collection,Order, OrderItem, Cart,CartItem, Customer
+from django.core.files.storage import default_storage
 from django.db import transaction
+from .carts import foreign_keys_deferred, get_cart_store, missing_products_error
+from .customers import get_customer_id
+from .inventory import reserve_inventory
+from .orders import order_totals
 # pylint: disable=no-member
 
         
 class ProductImageSerializer(serializers.ModelSerializer):
     class Meta:
         model = ProductImage
-        fields = ['id', 'image']
+        fields = ['id', 'image', 'variants', 'placeholder']
+        read_only_fields = ['placeholder']
+
+    variants = serializers.SerializerMethodField(method_name='get_variants')
+
+    def get_variants(self, product_image:ProductImage):
+        request = self.context.get('request')
+        variants = {}
+        for name, variant in product_image.variants.items():
+            variants[name] = dict(variant)
+            for extension in ('webp', 'jpeg'):
+                url = default_storage.url(variant[extension])
+                variants[name][extension] = request.build_absolute_uri(url) if request else url
+        return variants
         
     def create(self, validated_data):
         product_id = self.context['product_id']
         return ProductImage.objects.create(product_id=product_id, **validated_data)
     
+
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """
+    A ModelSerializer that takes an optional `fields` argument
+    restricting which of its declared fields are rendered.
+    """
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+    
 class CollectionSerializer(serializers.ModelSerializer):
-    products_count = serializers.IntegerField()
+    products_count = serializers.IntegerField(read_only=True)
     class Meta:
         model = Collection
         fields = ['id', 'title', 'products_count']
         
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Product
         fields = ['id', 'title',  'description','unit_price', 'inventory', 'collection', 'images']
@@ -45,6 +77,9 @@ class CartItemSerializer(serializers.ModelSerializer):
     total_price = serializers.SerializerMethodField(method_name='get_total_price')
     
     def get_total_price(self, cartItem:CartItem):
+        # Annotated by the cart item querysets; computed here for fresh instances.
+        if hasattr(cartItem, 'total_price'):
+            return cartItem.total_price
         return cartItem.quantity * cartItem.product.unit_price
         
 
@@ -55,21 +90,38 @@ class CartSerializer(serializers.ModelSerializer):
         model = Cart
         fields = ['id', 'items','total_price']
     
-    items = CartItemSerializer(many=True, read_only=True)
+    # Both cart stores attach the items and the total to the carts they return.
+    items = CartItemSerializer(many=True, read_only=True, source='line_items')
     total_price = serializers.SerializerMethodField(method_name='get_total_price')
     
     def get_total_price(self, cart:Cart):
-        return sum([item.quantity * item.product.unit_price for item in cart.items.all()])
-    
+        return cart.total_price
+    
+class AddCartItemListSerializer(serializers.ListSerializer):
+    def validate(self, attrs):
+        # Otherwise the upsert reports unknown products itself.
+        if not foreign_keys_deferred():
+            return attrs
+        # One query for the whole batch instead of one per item.
+        product_ids = {item['product_id'] for item in attrs}
+        missing = product_ids - set(Product.objects.filter(pk__in=product_ids).values_list('pk', flat=True))
+        if missing:
+            raise missing_products_error(missing)
+        return attrs
+
+
 class AddCartItemSerializer(serializers.ModelSerializer):
     product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
     
     class Meta:
         model = CartItem
         fields = ['id', 'product_id', 'quantity']
-        
+        list_serializer_class = AddCartItemListSerializer
+
     def validate_product_id(self, value):
-        if not Product.objects.filter(pk=value).exists():
+        # Otherwise the upsert reports an unknown product itself.
+        if self.parent is None and foreign_keys_deferred() and not Product.objects.filter(pk=value).exists():
             raise serializers.ValidationError("No product with the given ID was found.")
         return value
         
@@ -78,30 +130,21 @@ class AddCartItemSerializer(serializers.ModelSerializer):
         product_id = self.validated_data['product_id']
         quantity = self.validated_data['quantity']
 
-        try:
-            # Update existing item
-            cart_item = CartItem.objects.get(
-                cart_id=cart_id,
-                product_id=product_id
-            )
-            cart_item.quantity += quantity
-            cart_item.save()
-            self.instance = cart_item
-        except CartItem.DoesNotExist:
-            # Create new item
-            self.instance = CartItem.objects.create(
-                cart_id=cart_id,
-                product_id=product_id,
-                quantity=quantity
-            )
-            
+        (self.instance,) = get_cart_store().add_items(cart_id, [(product_id, quantity)])
         return self.instance
     
     
 class UpdateCartItemSerializer(serializers.ModelSerializer):
+    quantity = serializers.IntegerField(min_value=1)
+
     class Meta:
         model = CartItem
         fields = ['quantity']
+
+    def update(self, instance, validated_data):
+        instance.quantity = validated_data['quantity']
+        get_cart_store().update_item(instance.cart_id, instance.id, instance.quantity)
+        return instance
         
 
 class CustomerSerializer(serializers.ModelSerializer):
@@ -122,7 +165,8 @@ class OrderItemSerializer(serializers.ModelSerializer):
 class OrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
-        fields = ['id', 'customer', 'placed_at', 'payment_status', 'items']
+        fields = ['id', 'customer', 'placed_at', 'payment_status', 'total_amount', 'item_count', 'items']
+        read_only_fields = ['total_amount', 'item_count']
         
     items = OrderItemSerializer(many=True, read_only=True)
     
@@ -131,6 +175,8 @@ class OrderSerializer(serializers.ModelSerializer):
 
 # Takes a cart_id as input.
 
+# Takes the ordered quantities out of product inventory, failing if stock is short.
+
 # Finds the customer based on the user making the request.
 
 # Creates a new order.
@@ -144,23 +190,31 @@ class CreateOrderSerializer(serializers.Serializer):
     cart_id = serializers.UUIDField()
     
     def save(self, **kwargs):
-        with transaction.atomic():
-            cart_id = self.validated_data['cart_id']
-            user_id = self.context['user_id']
-            
-            (customer, created) = Customer.objects.get_or_create(user_id=user_id)
-            order = Order.objects.create(customer=customer)
-            
-            cart_items = CartItem.objects.select_related('product').filter(cart_id=cart_id)
+        cart_id = self.validated_data['cart_id']
+        user_id = self.context['user_id']
+
+        # The store hands over the cart's items and drops the cart when the
+        # order commits; for cached carts this is their first database write.
+        with transaction.atomic(), get_cart_store().checkout(cart_id) as cart_items:
+            if not cart_items:
+                raise serializers.ValidationError({'cart_id': ['The cart is empty.']})
+            if any(item.quantity < 1 for item in cart_items):
+                raise serializers.ValidationError({'cart_id': ['Every item in the cart needs a quantity of at least 1.']})
+            reserve_inventory({item.product_id: item.quantity for item in cart_items})
+
             order_items = [
                 OrderItem(
-                    order=order,
                     product=item.product,
                     unit_price=item.product.unit_price,
                     quantity=item.quantity
                 ) for item in cart_items
             ]
+            total_amount, item_count = order_totals(order_items)
+            order = Order.objects.create(
+                customer_id=get_customer_id(user_id), total_amount=total_amount, item_count=item_count)
+
+            for order_item in order_items:
+                order_item.order = order
             OrderItem.objects.bulk_create(order_items)
-            Cart.objects.filter(pk=cart_id).delete()
             
             return order
\ No newline at end of file
@@ -0,0 +1,116 @@
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from .cache import bump_catalog_version, invalidate_products_count
+from .customers import forget_customer
+from .images import delete_variants
+from .models import Collection, Customer, OrderItem, Product, ProductImage
+from .orders import refresh_order_totals
+from .search import index_product, use_fulltext
+from .tasks import process_image
+# pylint: disable=no-member
+
+
+@receiver(pre_save, sender=Product)
+def remember_previous_collection(sender, instance, **kwargs):
+    # A product moved between collections changes two counts, so note the old one.
+    instance._previous_collection_id = None
+    if not instance._state.adding and instance.pk is not None:
+        instance._previous_collection_id = (
+            Product.objects.filter(pk=instance.pk).values_list('collection_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Product)
+def invalidate_saved_product(sender, instance, created, **kwargs):
+    # Invalidate once the write commits: a read before that would cache the
+    # old rows under the new version.
+    previous_collection_id = getattr(instance, '_previous_collection_id', None)
+    collection_ids = []
+    if created:
+        collection_ids = [instance.collection_id]
+    elif previous_collection_id != instance.collection_id:
+        collection_ids = [instance.collection_id, previous_collection_id]
+    if collection_ids:
+        transaction.on_commit(lambda: invalidate_products_count(*collection_ids))
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=Product)
+def index_saved_product(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not {'title', 'description'} & set(update_fields):
+        return
+    if not use_fulltext():
+        index_product(instance)
+
+
+@receiver(post_delete, sender=Product)
+def invalidate_deleted_product(sender, instance, **kwargs):
+    collection_id = instance.collection_id
+    transaction.on_commit(lambda: invalidate_products_count(collection_id))
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=Collection)
+@receiver(post_delete, sender=Collection)
+def invalidate_collection(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: invalidate_products_count(pk))
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def invalidate_product_image(sender, instance, **kwargs):
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(pre_save, sender=ProductImage)
+def remember_replaced_variants(sender, instance, **kwargs):
+    # A new image makes the old variants stale; clear them and note the files.
+    instance._replaced_variants = None
+    instance._image_changed = False
+    if not instance._state.adding and instance.pk is not None:
+        previous = ProductImage.objects.filter(pk=instance.pk).values('image', 'variants').first()
+        if previous and previous['image'] != instance.image.name:
+            instance._replaced_variants = previous['variants']
+            instance._image_changed = True
+            instance.variants, instance.placeholder = {}, ''
+
+
+@receiver(post_save, sender=ProductImage)
+def process_saved_product_image(sender, instance, created, **kwargs):
+    replaced = getattr(instance, '_replaced_variants', None)
+    if replaced:
+        transaction.on_commit(lambda: delete_variants(replaced))
+    # Resizing runs on the job worker, off the upload request, and only
+    # for a new file: other saves leave the variants as they are.
+    if created or getattr(instance, '_image_changed', False):
+        process_image.enqueue(image_id=instance.pk)
+
+
+@receiver(post_delete, sender=ProductImage)
+def delete_product_image_variants(sender, instance, **kwargs):
+    if instance.variants:
+        transaction.on_commit(lambda: delete_variants(instance.variants))
+
+
+@receiver(post_delete, sender=Customer)
+def invalidate_customer(sender, instance, **kwargs):
+    forget_customer(instance.user_id)
+
+
+@receiver(post_save, sender=OrderItem)
+def refresh_edited_order(sender, instance, **kwargs):
+    # Checkout bulk-creates items with the totals already set; this covers edits made afterwards.
+    refresh_order_totals([instance.order_id])
+
+
+@receiver(post_delete, sender=OrderItem)
+def refresh_order_after_item_delete(sender, instance, origin=None, **kwargs):
+    # Items are only deleted by cascade when their order is (products are
+    # protected), and an order on its way out needs no new totals.
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if model is OrderItem:
+        refresh_order_totals([instance.order_id])
@@ -0,0 +1,7 @@
+from jobs.registry import task
+from .images import process_product_image
+
+
+@task(concurrency=2)
+def process_image(image_id):
+    process_product_image(image_id)
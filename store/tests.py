@@ -1,3 +1,1007 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.contrib.auth import get_user_model
+from django.db import connection, connections, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import http_date
+from PIL import Image
+from alagsbay.replicas import PrimaryPinningMiddleware, use_primary
+from jobs.models import Job
+from jobs.worker import claim_jobs, run_job
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from .analytics import SETTLE_DELAY, daily_sales, update_sales_rollups
+from .cache import get_catalog_state
+from .carts import CART_KEY, CART_LOCK_KEY, CacheCartStore, CartBusy, DatabaseCartStore, get_cart_store, purge_expired_carts
+from .filters import product_facets
+from .images import process_product_image
+from .imports import upsert_target
+from .inventory import reserve_inventory
+from .management.commands import import_catalog
+from .models import Cart, CartItem, Collection, Customer, DailySales, Order, OrderItem, Product, ProductImage, ProductSearchToken
+from .orders import refresh_order_totals
+from .search import boolean_query, search_product_ids
+from .tasks import process_image
+from .serializers import ProductSerializer
+# pylint: disable=no-member
+
+
+class CartBrowsableApiTests(TestCase):
+    def test_cart_items_render_as_html(self):
+        product = Product.objects.create(
+            title='Mug', description='', unit_price=5, inventory=10,
+            collection=Collection.objects.create(title='Kitchen'))
+        client = APIClient()
+        cart_id = client.post('/store/carts/').data['id']
+        client.post(f'/store/carts/{cart_id}/items/', {'product_id': product.id, 'quantity': 1}, format='json')
+
+        response = client.get(f'/store/carts/{cart_id}/items/', HTTP_ACCEPT='text/html')
+        self.assertEqual(response.status_code, 200)
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.collection = Collection.objects.create(title='Kitchen')
+        self.product = Product.objects.create(
+            title='Mug', description='', unit_price=5, inventory=10, collection=self.collection)
+        self.url = f'/store/products/{self.product.pk}/'
+        self.api = APIClient()
+
+    def test_repeated_reads_come_from_the_cache(self):
+        first = self.api.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            second = self.api.get(self.url)
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(second.data, first.data)
+
+    def test_writes_invalidate_once_committed(self):
+        self.api.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.title = 'Bowl'
+            self.product.save()
+            # Not committed yet, so the cached page still stands.
+            self.assertEqual(self.api.get(self.url).data['title'], 'Mug')
+        self.assertEqual(self.api.get(self.url).data['title'], 'Bowl')
+
+    def test_collection_counts_follow_new_products(self):
+        collection_url = f'/store/collections/{self.collection.pk}/'
+        self.assertEqual(self.api.get(collection_url).data['products_count'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(title='Bowl', description='', unit_price=5, inventory=10, collection=self.collection)
+        self.assertEqual(self.api.get(collection_url).data['products_count'], 2)
+
+    def test_conditional_requests(self):
+        response = self.api.get(self.url)
+        etag = response['ETag']
+        self.assertEqual(self.api.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Pages without live stock also answer If-Modified-Since.
+        last_modified = self.api.get(self.url, {'fields': 'title'})['Last-Modified']
+        self.assertEqual(
+            self.api.get(self.url, {'fields': 'title'}, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        response = self.api.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_orders_refresh_stock_without_invalidating_the_catalog(self):
+        response = self.api.get(self.url)
+        etag = response['ETag']
+        # Orders don't move a modified time, so pages with stock carry none.
+        self.assertFalse(response.has_header('Last-Modified'))
+        self.api.get('/store/products/')
+        version, _ = get_catalog_state()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reserve_inventory({self.product.pk: 3})
+        self.assertEqual(get_catalog_state()[0], version)
+
+        # The cached pages stand; only the product's stock is read again.
+        with self.assertNumQueries(1):
+            response = self.api.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['inventory'], 7)
+        self.assertEqual(self.api.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        response = self.api.get(self.url, HTTP_IF_MODIFIED_SINCE=http_date())
+        self.assertEqual((response.status_code, response.data['inventory']), (200, 7))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.api.get('/store/products/').data['results'][0]['inventory'], 7)
+
+    def test_selling_out_invalidates_the_catalog(self):
+        self.assertEqual(len(self.api.get('/store/products/', {'in_stock': 'true'}).data['results']), 1)
+        version, _ = get_catalog_state()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reserve_inventory({self.product.pk: 10})
+        self.assertNotEqual(get_catalog_state()[0], version)
+        self.assertEqual(self.api.get('/store/products/', {'in_stock': 'true'}).data['results'], [])
+
+
+class ImportCatalogTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'catalog.jsonl')
+
+    def write(self, *rows):
+        with open(self.path, 'w') as catalog:
+            catalog.writelines(json.dumps(row) + '\n' for row in rows)
+
+    def row(self, sku, **fields):
+        return {'sku': sku, 'title': f'Product {sku}', 'unit_price': '9.99', 'collection': 'Kitchen', **fields}
+
+    def run_import(self, *args):
+        out, err = StringIO(), StringIO()
+        call_command('import_catalog', self.path, *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_upserts_on_sku(self):
+        existing = Product.objects.create(
+            sku='A', title='Old', description='', unit_price=1, inventory=1,
+            collection=Collection.objects.create(title='Kitchen'))
+        self.write(self.row('A', title='Mug', inventory=5), self.row('B'))
+
+        out, _ = self.run_import()
+        self.assertIn('1 created, 1 updated', out)
+        existing.refresh_from_db()
+        self.assertEqual((existing.title, existing.inventory), ('Mug', 5))
+        self.assertEqual(set(Product.objects.values_list('sku', flat=True)), {'A', 'B'})
+        self.assertEqual(Collection.objects.count(), 1)
+
+    def test_bad_rows_are_skipped_and_reported(self):
+        self.write(
+            self.row('A'),
+            self.row('B', title=''),
+            self.row('C', unit_price='cheap'),
+            self.row('D', unit_price='123456.00'),
+            self.row('E', inventory=2 ** 70),
+            self.row('F'),
+        )
+
+        out, err = self.run_import()
+        self.assertIn('4 skipped', out)
+        self.assertEqual([line.split(':')[0] for line in err.splitlines()], ['Row 2', 'Row 3', 'Row 4', 'Row 5'])
+        self.assertEqual(set(Product.objects.values_list('sku', flat=True)), {'A', 'F'})
+
+    def test_resumes_after_an_interruption(self):
+        self.write(*[self.row(sku) for sku in 'ABCD'])
+        real_import = import_catalog.import_products
+        calls = []
+
+        def crash_on_second_chunk(rows, collection_ids):
+            calls.append(rows)
+            if len(calls) == 2:
+                raise RuntimeError('interrupted')
+            return real_import(rows, collection_ids)
+
+        with mock.patch.object(import_catalog, 'import_products', crash_on_second_chunk):
+            with self.assertRaises(RuntimeError):
+                self.run_import('--chunk-size', '2')
+        self.assertEqual(set(Product.objects.values_list('sku', flat=True)), {'A', 'B'})
+
+        out, _ = self.run_import('--chunk-size', '2')
+        self.assertIn('Resuming after row 2.', out)
+        self.assertIn('2 created, 0 updated', out)
+        self.assertEqual(Product.objects.count(), 4)
+        self.assertFalse(os.path.exists(f'{self.path}.checkpoint'))
+
+    def test_upsert_target_follows_the_backend(self):
+        with mock.patch.object(connection.features, 'supports_update_conflicts_with_target', True):
+            self.assertEqual(upsert_target(), {'unique_fields': ['sku']})
+        # MySQL: ON DUPLICATE KEY UPDATE takes no conflict target.
+        with mock.patch.object(connection.features, 'supports_update_conflicts_with_target', False):
+            self.assertEqual(upsert_target(), {})
+
+
+class SalesRollupTests(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user(username='buyer', email='buyer@example.com', password='!')
+        self.customer = Customer.objects.create(user=user)
+        self.collection = Collection.objects.create(title='Kitchen')
+        self.mug, self.bowl = [
+            Product.objects.create(title=title, description='', unit_price=5, inventory=10, collection=self.collection)
+            for title in ('Mug', 'Bowl')
+        ]
+        self.day = timezone.localdate() - timedelta(days=1)
+
+    def order(self, *lines, placed_at=None):
+        order = Order.objects.create(customer=self.customer)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, quantity=quantity, unit_price=price)
+            for product, quantity, price in lines
+        ])
+        placed_at = placed_at or timezone.now() - timedelta(days=1)
+        Order.objects.filter(pk=order.pk).update(placed_at=placed_at)
+        return order
+
+    def totals(self):
+        return [(row['placed_revenue'], row['placed_units'], row['placed_orders'])
+                for row in daily_sales(self.day - timedelta(days=1), timezone.localdate())]
+
+    def test_runs_fold_in_only_new_settled_orders(self):
+        self.order((self.mug, 2, 5), (self.bowl, 1, 8))
+        self.assertEqual(update_sales_rollups(), 1)
+        self.assertEqual(self.totals(), [(18, 3, 1)])
+
+        self.order((self.mug, 1, 5))
+        # Too recent: its transaction may still be committing next to older ids.
+        unsettled = self.order((self.bowl, 4, 8), placed_at=timezone.now())
+        self.assertEqual(update_sales_rollups(), 1)
+        self.assertEqual(self.totals(), [(23, 4, 2)])
+
+        Order.objects.filter(pk=unsettled.pk).update(placed_at=timezone.now() - SETTLE_DELAY * 2)
+        self.assertEqual(update_sales_rollups(), 1)
+        self.assertEqual(update_sales_rollups(), 0)
+        self.assertEqual(sum(row[1] for row in self.totals()), 8)
+
+    def test_rebuild_starts_over(self):
+        self.order((self.mug, 2, 5))
+        update_sales_rollups()
+        DailySales.objects.update(revenue=999)
+
+        call_command('rollup_sales', '--rebuild', stdout=StringIO())
+        self.assertEqual(self.totals(), [(10, 2, 1)])
+
+    def test_api(self):
+        self.order((self.mug, 2, 5), (self.bowl, 1, 8))
+        update_sales_rollups()
+        staff = get_user_model().objects.create_user(
+            username='staff', email='staff@example.com', password='!', is_staff=True)
+        api = APIClient()
+        self.assertEqual(api.get('/store/analytics/').status_code, 401)
+        api.force_authenticate(self.customer.user)
+        self.assertEqual(api.get('/store/analytics/').status_code, 403)
+
+        api.force_authenticate(staff)
+        data = api.get('/store/analytics/').data
+        self.assertEqual(data['daily'][0]['placed_revenue'], 18)
+        self.assertEqual(data['collections'][0]['title'], 'Kitchen')
+        self.assertEqual([row['title'] for row in data['products']], ['Mug', 'Bowl'])
+
+        products = api.get('/store/analytics/products/', {'limit': 1, 'collection_id': self.collection.pk}).data
+        self.assertEqual([row['product_id'] for row in products], [self.mug.pk])
+        daily = api.get('/store/analytics/daily/', {'collection_id': self.collection.pk}).data
+        self.assertEqual(daily[0]['placed_units'], 3)
+        self.assertEqual(api.get('/store/analytics/', {'start': '2030-01-02', 'end': '2030-01-01'}).status_code, 400)
+
+
+class CartItemTests(TestCase):
+    def setUp(self):
+        collection = Collection.objects.create(title='Kitchen')
+        self.mug, self.bowl = [
+            Product.objects.create(title=title, description='', unit_price=5, inventory=10, collection=collection)
+            for title in ('Mug', 'Bowl')
+        ]
+        self.api = APIClient()
+        self.cart_id = self.api.post('/store/carts/').data['id']
+        self.items_url = f'/store/carts/{self.cart_id}/items/'
+
+    def quantities(self):
+        return dict(CartItem.objects.filter(cart_id=self.cart_id).values_list('product_id', 'quantity'))
+
+    def test_adding_a_product_again_merges_the_line(self):
+        self.assertEqual(self.api.post(self.items_url, {'product_id': self.mug.pk, 'quantity': 2}).status_code, 201)
+        self.assertEqual(self.api.post(self.items_url, {'product_id': self.mug.pk, 'quantity': 3}).status_code, 201)
+        self.assertEqual(self.quantities(), {self.mug.pk: 5})
+
+    def test_bulk_add(self):
+        response = self.api.post(f'{self.items_url}bulk/', [
+            {'product_id': self.mug.pk, 'quantity': 2},
+            {'product_id': self.bowl.pk, 'quantity': 1},
+            {'product_id': self.mug.pk, 'quantity': 1},
+        ], format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.quantities(), {self.mug.pk: 3, self.bowl.pk: 1})
+
+    def test_non_positive_quantities_and_unknown_products_are_rejected(self):
+        self.api.post(self.items_url, {'product_id': self.mug.pk, 'quantity': 2})
+        item_id = CartItem.objects.get().pk
+
+        for response in (
+            self.api.post(self.items_url, {'product_id': self.mug.pk, 'quantity': 0}),
+            self.api.post(self.items_url, {'product_id': self.mug.pk, 'quantity': -5}),
+            self.api.post(self.items_url, {'product_id': 999, 'quantity': 1}),
+            self.api.post(f'{self.items_url}bulk/', [{'product_id': self.mug.pk, 'quantity': -1}], format='json'),
+            self.api.post(f'{self.items_url}bulk/', [{'product_id': 999, 'quantity': 1}], format='json'),
+            self.api.patch(f'{self.items_url}{item_id}/', {'quantity': -100}),
+        ):
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.quantities(), {self.mug.pk: 2})
+
+        with self.assertRaises(ValidationError):
+            DatabaseCartStore().add_items(self.cart_id, [(self.mug.pk, -2)])
+
+    def test_cart_is_read_in_a_fixed_number_of_queries(self):
+        ProductImage.objects.create(product=self.mug, image='store/images/mug.jpg')
+        self.api.post(self.items_url, {'product_id': self.mug.pk, 'quantity': 2})
+        for index in range(1, 4):
+            product = Product.objects.create(
+                title=f'Plate {index}', description='', unit_price=3, inventory=10, collection=self.mug.collection)
+            ProductImage.objects.create(product=product, image=f'store/images/plate-{index}.jpg')
+            self.api.post(self.items_url, {'product_id': product.pk, 'quantity': index})
+
+        # The cart with its total, the items with their products, the images.
+        with self.assertNumQueries(3):
+            response = self.api.get(f'/store/carts/{self.cart_id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['items']), 4)
+        self.assertEqual(response.data['total_price'], Decimal('28.00'))
+
+
+class CartItemAutocommitTests(TransactionTestCase):
+    """Outside a transaction, as in production, the upsert reports unknown products."""
+
+    def setUp(self):
+        self.mug = Product.objects.create(
+            title='Mug', description='', unit_price=5, inventory=10,
+            collection=Collection.objects.create(title='Kitchen'))
+        self.api = APIClient()
+        self.items_url = f"/store/carts/{self.api.post('/store/carts/').data['id']}/items/"
+
+    def test_adding_an_item_skips_the_product_check(self):
+        # Touch the cart, upsert the line, read it back.
+        with self.assertNumQueries(3):
+            response = self.api.post(self.items_url, {'product_id': self.mug.pk, 'quantity': 2})
+        self.assertEqual(response.status_code, 201)
+
+    def test_unknown_products_are_rejected_by_the_upsert(self):
+        for response in (
+            self.api.post(self.items_url, {'product_id': 999, 'quantity': 1}),
+            self.api.post(f'{self.items_url}bulk/', [{'product_id': 999, 'quantity': 1}], format='json'),
+        ):
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('999', response.data['product_id'])
+        self.assertFalse(CartItem.objects.exists())
+
+
+class ProductOrderingTests(TestCase):
+    def test_cursor_pages_through_tied_prices(self):
+        collection = Collection.objects.create(title='Kitchen')
+        Product.objects.bulk_create([
+            Product(title=f'Mug {index}', description='', unit_price=5 + index % 2, inventory=10, collection=collection)
+            for index in range(9)
+        ])
+
+        for ordering in ('unit_price', '-unit_price'):
+            seen, url = [], f'/store/products/?ordering={ordering}&page_size=2'
+            while url:
+                page = APIClient().get(url).data
+                seen += [product['id'] for product in page['results']]
+                url = page['next']
+            self.assertCountEqual(seen, Product.objects.values_list('id', flat=True))
+            self.assertEqual(seen, list(Product.objects.order_by(ordering, ordering.replace('unit_price', 'id'))
+                                        .values_list('id', flat=True)))
+
+
+class ProductFieldsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        collection = Collection.objects.create(title='Kitchen')
+        self.products = Product.objects.bulk_create([
+            Product(title=f'Mug {index}', description='Tall', unit_price=5, inventory=10, collection=collection)
+            for index in range(3)
+        ])
+        ProductImage.objects.bulk_create([
+            ProductImage(product=product, image=f'store/images/mug-{product.pk}.jpg') for product in self.products
+        ])
+        self.api = APIClient()
+
+    def get(self, fields):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.api.get('/store/products/', {'fields': fields})
+        return response, [query['sql'] for query in queries.captured_queries]
+
+    def test_only_the_requested_columns_are_read(self):
+        response, queries = self.get('title, unit_price')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([set(product) for product in response.data['results']], [{'id', 'title', 'unit_price'}] * 3)
+        (select,) = [sql for sql in queries if 'FROM "store_product"' in sql]
+        self.assertIn('"store_product"."title"', select)
+        self.assertNotIn('"store_product"."description"', select)
+        self.assertNotIn('store_collection', select)
+        self.assertNotIn('store_productimage', ' '.join(queries))
+
+    def test_collection_and_images_are_loaded_in_bulk(self):
+        response, queries = self.get('collection,images')
+        self.assertEqual(response.status_code, 200)
+        product = response.data['results'][0]
+        self.assertEqual(set(product), {'id', 'collection', 'images'})
+        self.assertEqual(product['collection'], 'Kitchen')
+        self.assertEqual(len(product['images']), 1)
+        (select,) = [sql for sql in queries if 'FROM "store_product"' in sql]
+        self.assertIn('JOIN "store_collection"', select)
+        self.assertNotIn('"store_product"."description"', select)
+        self.assertEqual(len([sql for sql in queries if 'FROM "store_productimage"' in sql]), 1)
+        self.assertEqual(len(queries), 2)
+
+    def test_the_cursor_reads_no_deferred_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.api.get('/store/products/', {'fields': 'title', 'ordering': 'unit_price', 'page_size': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(response.data['next'])
+        self.assertEqual(len(queries), 1)
+
+    def test_unknown_fields_are_rejected(self):
+        response, _ = self.get('title,cost,margin')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['fields'], 'Unknown field(s): cost, margin')
+
+    def test_without_fields_every_field_is_rendered(self):
+        response, _ = self.get('')
+        self.assertEqual(set(response.data['results'][0]), set(ProductSerializer.Meta.fields))
+
+
+class ProductFilterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.kitchen = Collection.objects.create(title='Kitchen')
+        self.garden = Collection.objects.create(title='Garden')
+        self.products = {
+            title: Product.objects.create(
+                title=title, description='', unit_price=price, inventory=inventory, collection=collection)
+            for title, price, inventory, collection in (
+                ('Mug', '5.00', 10, self.kitchen),
+                ('Kettle', '49.99', 0, self.kitchen),
+                ('Pan', '50.00', 3, self.kitchen),
+                ('Hose', '250.00', 1, self.garden),
+                ('Mower', '1000.00', 0, self.garden),
+            )
+        }
+        self.api = APIClient()
+
+    def titles(self, **params):
+        response = self.api.get('/store/products/', params)
+        self.assertEqual(response.status_code, 200)
+        return {product['title'] for product in response.data['results']}
+
+    def test_filters(self):
+        self.assertEqual(self.titles(collection_id=self.garden.pk), {'Hose', 'Mower'})
+        self.assertEqual(self.titles(min_price='49.99', max_price='250'), {'Kettle', 'Pan', 'Hose'})
+        self.assertEqual(self.titles(in_stock='true'), {'Mug', 'Pan', 'Hose'})
+        self.assertEqual(self.titles(in_stock='false'), {'Kettle', 'Mower'})
+        self.assertEqual(self.titles(), set(self.products))
+        self.assertEqual(self.titles(collection_id=self.kitchen.pk, in_stock='true', max_price='50'), {'Mug', 'Pan'})
+
+    def test_invalid_filters_are_rejected(self):
+        for params in ({'min_price': 'cheap'}, {'collection_id': 'kitchen'}, {'in_stock': 'maybe'}):
+            self.assertEqual(self.api.get('/store/products/', params).status_code, 400)
+
+    def test_facets_count_by_collection_and_price_bucket(self):
+        with self.assertNumQueries(1):
+            facets = product_facets(Product.objects.all())
+        self.assertEqual(facets['collections'], [
+            {'id': self.kitchen.pk, 'title': 'Kitchen', 'count': 3},
+            {'id': self.garden.pk, 'title': 'Garden', 'count': 2},
+        ])
+        # Lower bounds are inclusive: 49.99 is under 50, 50.00 starts the next bucket.
+        self.assertEqual(facets['price_buckets'], [
+            {'range': '0-50', 'count': 2},
+            {'range': '50-100', 'count': 1},
+            {'range': '100-250', 'count': 0},
+            {'range': '250-500', 'count': 1},
+            {'range': '500-1000', 'count': 0},
+            {'range': '1000+', 'count': 1},
+        ])
+
+    def test_facets_follow_the_filters_not_the_page(self):
+        # The page and one facet query.
+        with self.assertNumQueries(2):
+            response = self.api.get(
+                '/store/products/', {'facets': 'true', 'in_stock': 'true', 'page_size': 1, 'fields': 'title'})
+        facets = response.data['facets']
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(sum(collection['count'] for collection in facets['collections']), 3)
+        self.assertEqual(sum(bucket['count'] for bucket in facets['price_buckets']), 3)
+        self.assertNotIn('facets', self.api.get('/store/products/').data)
+
+
+class OrderTests(TestCase):
+    def setUp(self):
+        cache.clear()  # customer ids cached by earlier tests
+        user = get_user_model().objects.create_user(username='buyer', email='buyer@example.com', password='!')
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+        self.customer = Customer.objects.create(user=user)
+        self.product = Product.objects.create(
+            title='Mug', description='', unit_price=5, inventory=10,
+            collection=Collection.objects.create(title='Kitchen'))
+
+    def order(self, quantities):
+        order = Order.objects.create(customer=self.customer)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=self.product, quantity=quantity, unit_price=5) for quantity in quantities
+        ])
+        return order
+
+    def checkout(self, *quantities):
+        cart = Cart.objects.create()
+        for index, quantity in enumerate(quantities):
+            product = self.product if index == 0 else Product.objects.create(
+                title=f'Mug {index}', description='', unit_price=5, inventory=10, collection=self.product.collection)
+            CartItem.objects.create(cart=cart, product=product, quantity=quantity)
+        return cart, self.client.post('/store/orders/', {'cart_id': str(cart.id)}, format='json')
+
+    def test_checkout_takes_the_ordered_stock(self):
+        cart, response = self.checkout(3)
+        self.assertEqual(response.status_code, 200)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.inventory, 7)
+        order = Order.objects.get()
+        self.assertEqual((order.total_amount, order.item_count), (15, 3))
+        self.assertFalse(Cart.objects.filter(pk=cart.pk).exists())
+
+    def test_checkout_fails_on_a_shortage(self):
+        cart, response = self.checkout(11)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['cart_id'], [f'Only 10 left in stock for product {self.product.pk}.'])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.inventory, 10)
+        self.assertFalse(Order.objects.exists())
+        self.assertTrue(Cart.objects.filter(pk=cart.pk).exists())
+
+    def test_checkout_rejects_negative_quantities(self):
+        _, response = self.checkout(1, -5)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(Product.objects.values_list('inventory', flat=True)), {10})
+        self.assertFalse(Order.objects.exists())
+
+    def test_checkout_rejects_empty_and_negative_carts(self):
+        for quantities in ((), (-3,), (2, -5)):
+            _, response = self.checkout(*quantities)
+            self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def test_cursor_pages_through_tied_placed_at_and_totals(self):
+        for quantities in ([1], [2], [1], [2], [1]):
+            self.order(quantities)
+        Order.objects.update(placed_at=timezone.now())
+        refresh_order_totals(list(Order.objects.values_list('id', flat=True)))
+
+        for ordering in ('placed_at', '-total_amount', ''):
+            seen, url = [], f'/store/orders/?ordering={ordering}&page_size=2'
+            while url:
+                page = self.client.get(url).data
+                seen += [order['id'] for order in page['results']]
+                url = page['next']
+            self.assertCountEqual(seen, Order.objects.values_list('id', flat=True))
+
+    def test_order_list_takes_a_fixed_number_of_queries(self):
+        def add_orders(count):
+            for _ in range(count):
+                order = self.order([1])
+                product = Product.objects.create(
+                    title='Bowl', description='', unit_price=5, inventory=10, collection=self.product.collection)
+                ProductImage.objects.create(product=product, image='store/images/bowl.jpg')
+                OrderItem.objects.create(order=order, product=product, quantity=2, unit_price=5)
+
+        add_orders(1)
+        self.client.get('/store/orders/')  # caches the customer id
+        for count in (1, 5):
+            add_orders(count)
+            # Orders, their items with products, the products' images.
+            with self.assertNumQueries(3):
+                response = self.client.get('/store/orders/')
+            self.assertEqual(response.status_code, 200)
+        items = [item for order in response.data['results'] for item in order['items']]
+        self.assertEqual(len(items), 14)
+        self.assertEqual(sum(len(item['product']['images']) for item in items), 7)
+
+    def test_orders_filter_by_placed_at(self):
+        orders = [self.order([1]) for _ in range(4)]
+        for day, order in enumerate(orders, 1):
+            Order.objects.filter(pk=order.pk).update(placed_at=datetime(2026, 1, day, 12, tzinfo=dt_timezone.utc))
+
+        def ids(**params):
+            response = self.client.get('/store/orders/', params)
+            self.assertEqual(response.status_code, 200)
+            return {order['id'] for order in response.data['results']}
+
+        self.assertEqual(ids(placed_after='2026-01-02'), {orders[1].pk, orders[2].pk, orders[3].pk})
+        self.assertEqual(ids(placed_before='2026-01-03T12:00:00'), {orders[0].pk, orders[1].pk})
+        self.assertEqual(ids(placed_after='2026-01-02', placed_before='2026-01-04'), {orders[1].pk, orders[2].pk})
+        for params in ({'placed_after': 'yesterday'}, {'placed_before': '2026-13-01'}):
+            self.assertEqual(self.client.get('/store/orders/', params).status_code, 400)
+
+    def test_customers_see_their_own_orders_and_staff_see_all(self):
+        User = get_user_model()
+        other = Customer.objects.create(
+            user=User.objects.create_user(username='other', email='other@example.com', password='!'))
+        mine = self.order([1])
+        theirs = Order.objects.create(customer=other)
+
+        response = self.client.get('/store/orders/')
+        self.assertEqual([order['id'] for order in response.data['results']], [mine.pk])
+        self.assertEqual(self.client.get(f'/store/orders/{theirs.pk}/').status_code, 404)
+
+        self.client.force_authenticate(User.objects.create_user(
+            username='staff', email='staff@example.com', password='!', is_staff=True))
+        response = self.client.get('/store/orders/')
+        self.assertEqual({order['id'] for order in response.data['results']}, {mine.pk, theirs.pk})
+
+    def test_item_edits_refresh_totals_but_order_deletes_skip_them(self):
+        order = self.order([1, 2])
+        with mock.patch('store.signals.refresh_order_totals') as refresh:
+            order.items.first().delete()
+            refresh.assert_called_once_with([order.pk])
+            refresh.reset_mock()
+            order.delete()
+            refresh.assert_not_called()
+
+
+class ProductImageTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(self.settings(MEDIA_ROOT=media_root))
+        self.product = Product.objects.create(
+            title='Mug', description='', unit_price=5, inventory=10,
+            collection=Collection.objects.create(title='Kitchen'))
+
+    def upload(self, name, colour='red', pil_format='JPEG'):
+        buffer = BytesIO()
+        Image.new('RGB', (1200, 800), colour).save(buffer, pil_format)
+        return ContentFile(buffer.getvalue(), name=name)
+
+    def variant_files(self, variants):
+        return [variant[extension] for variant in variants.values() for extension in ('webp', 'jpeg')]
+
+    def assertStored(self, paths, stored=True):
+        self.assertTrue(paths)
+        self.assertEqual({default_storage.exists(path) for path in paths}, {stored})
+
+    def test_variants_are_deleted_with_the_image(self):
+        image = ProductImage.objects.create(product=self.product, image=self.upload('mug.jpg'))
+        files = self.variant_files(process_product_image(image.pk))
+        self.assertStored(files)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.delete()
+        self.assertStored(files, stored=False)
+
+    def test_replacing_the_image_deletes_the_old_variants(self):
+        image = ProductImage.objects.create(product=self.product, image=self.upload('mug.jpg'))
+        old_files = self.variant_files(process_product_image(image.pk))
+
+        image.refresh_from_db()
+        with self.captureOnCommitCallbacks(execute=True):
+            image.image = self.upload('mug-blue.jpg')
+            image.save()
+        self.assertStored(old_files, stored=False)
+        image.refresh_from_db()
+        self.assertEqual((image.variants, image.placeholder), ({}, ''))
+        self.assertStored(self.variant_files(process_product_image(image.pk)))
+
+    def test_images_sharing_a_stem_keep_their_own_variants(self):
+        png = ProductImage.objects.create(product=self.product, image=self.upload('jbl.png', 'blue', 'PNG'))
+        jpg = ProductImage.objects.create(product=self.product, image=self.upload('jbl.jpg', 'red'))
+        png_files = self.variant_files(process_product_image(png.pk))
+        jpg_files = self.variant_files(process_product_image(jpg.pk))
+        self.assertFalse(set(png_files) & set(jpg_files))
+
+        with default_storage.open(png_files[0]) as thumb:
+            red, green, blue = Image.open(thumb).convert('RGB').getpixel((0, 0))
+        self.assertGreater(blue, red)
+
+        jpg.refresh_from_db()
+        with self.captureOnCommitCallbacks(execute=True):
+            jpg.delete()
+        self.assertStored(jpg_files, stored=False)
+        self.assertStored(png_files)
+
+    def test_only_new_files_are_queued_for_processing(self):
+        queued = Job.objects.filter(name=process_image.name)
+        image = ProductImage.objects.create(product=self.product, image=self.upload('mug.jpg'))
+        self.assertEqual(queued.count(), 1)
+
+        image.refresh_from_db()
+        image.save()
+        self.assertEqual(queued.count(), 1)
+
+        image.image = self.upload('mug-blue.jpg')
+        image.save()
+        self.assertEqual(queued.count(), 2)
+
+
+@override_settings(PRODUCT_SEARCH_BACKEND='inverted')
+class SearchIndexTests(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(
+            title='Ceramic Mug', description='A ceramic coffee mug', unit_price=5, inventory=10,
+            collection=Collection.objects.create(title='Kitchen'))
+
+    def postings(self):
+        return dict(ProductSearchToken.objects.filter(product=self.product).values_list('token', 'weight'))
+
+    def test_saves_only_write_changed_tokens(self):
+        self.assertEqual(self.postings(), {'ceramic': 4, 'mug': 4, 'coffee': 1})
+        kept = ProductSearchToken.objects.get(product=self.product, token='mug').pk
+
+        self.product.inventory = 9
+        with CaptureQueriesContext(connection) as queries:
+            self.product.save(update_fields=['inventory'])
+            self.product.save()
+        self.assertEqual(
+            [query['sql'].split()[0] for query in queries if 'store_productsearchtoken' in query['sql']], ['SELECT'])
+
+        self.product.title = 'Stoneware Mug'
+        self.product.save()
+        self.assertEqual(self.postings(), {'stoneware': 3, 'mug': 4, 'ceramic': 1, 'coffee': 1})
+        self.assertEqual(ProductSearchToken.objects.get(product=self.product, token='mug').pk, kept)
+        self.assertEqual(search_product_ids('stonew'), [self.product.pk])
+        self.assertEqual(search_product_ids('mug cer'), [self.product.pk])
+
+
+@override_settings(PRODUCT_SEARCH_BACKEND='inverted')
+class SearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.audio = Collection.objects.create(title='Audio')
+        furniture = Collection.objects.create(title='Furniture')
+        self.products = {
+            title: Product.objects.create(
+                title=title, description=description, unit_price=50, inventory=10, collection=collection)
+            for title, description, collection in (
+                ('Wireless Headphones', 'Over-ear wireless headphones', self.audio),
+                ('Wired Headphones', 'Headphones with a cable', self.audio),
+                ('Wireless Speaker', 'Portable speaker with a headphone jack', self.audio),
+                ('Headphone Stand', 'Holds wireless headphones', furniture),
+            )
+        }
+
+    def ids(self, *titles):
+        return [self.products[title].pk for title in titles]
+
+    def test_every_term_must_match_and_title_hits_rank_first(self):
+        self.assertEqual(
+            search_product_ids('wireless head'), self.ids('Wireless Headphones', 'Headphone Stand', 'Wireless Speaker'))
+        self.assertEqual(search_product_ids('wired head'), self.ids('Wired Headphones'))
+        self.assertEqual(search_product_ids('wireless cable'), [])
+        self.assertEqual(search_product_ids('wireless head', limit=1), self.ids('Wireless Headphones'))
+
+    def test_collection_filter(self):
+        self.assertEqual(
+            search_product_ids('wireless head', collection_id=self.audio.pk),
+            self.ids('Wireless Headphones', 'Wireless Speaker'))
+
+    def test_endpoint(self):
+        api = APIClient()
+        response = api.get('/store/products/search/', {'q': 'Wireless HEAD', 'collection_id': self.audio.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([product['id'] for product in response.data], self.ids('Wireless Headphones', 'Wireless Speaker'))
+        self.assertEqual(response.data[0]['title'], 'Wireless Headphones')
+
+        response = api.get('/store/products/search/', {'q': 'head', 'fields': 'title', 'limit': 2})
+        self.assertEqual([set(product) for product in response.data], [{'id', 'title'}] * 2)
+        self.assertEqual(api.get('/store/products/search/').status_code, 400)
+
+    def test_fulltext_query_leaves_out_words_the_index_skips(self):
+        self.assertEqual(boolean_query(['tv', 'stand'], 3, frozenset()), '+stand*')
+        self.assertEqual(boolean_query(['the', 'oak', 'tv'], 3, frozenset({'the'})), '+oak +tv*')
+        self.assertEqual(boolean_query(['wireless', 'head'], 3, frozenset()), '+wireless +head*')
+
+
+class CartCacheTests(TestCase):
+    """The cache store against the test's local `carts` cache, patched in past `get_cart_store()`."""
+
+    def setUp(self):
+        self.store = CacheCartStore()
+        self.product = Product.objects.create(
+            title='Mug', description='', unit_price=5, inventory=10,
+            collection=Collection.objects.create(title='Kitchen'))
+        self.addCleanup(caches['carts'].clear)
+
+    def locked(self, cart_id):
+        return caches['carts'].get(CART_LOCK_KEY.format(cart_id)) is not None
+
+    def test_cache_store_needs_a_shared_cache(self):
+        with override_settings(CART_STORAGE='cache'):
+            with self.assertRaises(ImproperlyConfigured):
+                get_cart_store()
+
+    def test_cached_carts_survive_a_catalog_cache_clear(self):
+        cart = self.store.create_cart()
+        cache.clear()
+        self.assertIsNotNone(self.store.get_cart(cart.id))
+
+    def test_add_update_and_remove_items(self):
+        cart = self.store.create_cart()
+        (item,) = self.store.add_items(cart.id, [(self.product.pk, 2)])
+        self.store.add_items(cart.id, [(self.product.pk, 1)])
+        self.assertEqual([(line.id, line.quantity) for line in self.store.get_items(cart.id)], [(item.id, 3)])
+
+        self.assertTrue(self.store.update_item(cart.id, item.id, 5))
+        self.assertEqual(self.store.get_cart(cart.id).total_price, 25)
+        self.assertTrue(self.store.remove_item(cart.id, item.id))
+        self.assertEqual(self.store.get_items(cart.id), [])
+        self.assertFalse(self.store.remove_item(cart.id, item.id))
+        self.assertFalse(self.locked(cart.id))
+
+    def test_writes_wait_for_the_cart_lock(self):
+        cart = self.store.create_cart()
+        (item,) = self.store.add_items(cart.id, [(self.product.pk, 1)])
+        self.store._acquire(cart.id)  # pylint: disable=protected-access
+
+        with mock.patch('store.carts.CART_LOCK_WAIT', 0):
+            for write in (lambda: self.store.add_items(cart.id, [(self.product.pk, 1)]),
+                          lambda: self.store.update_item(cart.id, item.id, 4),
+                          lambda: self.store.remove_item(cart.id, item.id)):
+                with self.assertRaises(CartBusy):
+                    write()
+        self.assertEqual([line.quantity for line in self.store.get_items(cart.id)], [1])
+
+    def checkout(self, cart):
+        user = get_user_model().objects.create_user(username='buyer', email='buyer@example.com', password='!')
+        Customer.objects.create(user=user)
+        api = APIClient()
+        api.force_authenticate(user)
+        with mock.patch('store.serializers.get_cart_store', return_value=self.store), \
+                self.captureOnCommitCallbacks(execute=True):
+            return api.post('/store/orders/', {'cart_id': str(cart.id)}, format='json')
+
+    def test_checkout_orders_the_items_and_drops_the_cart_on_commit(self):
+        cart = self.store.create_cart()
+        self.store.add_items(cart.id, [(self.product.pk, 3)])
+
+        response = self.checkout(cart)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(OrderItem.objects.values_list('product_id', 'quantity', 'unit_price')),
+                         [(self.product.pk, 3, 5)])
+        self.assertIsNone(caches['carts'].get(CART_KEY.format(cart.id)))
+        self.assertFalse(self.locked(cart.id))
+
+    def test_failed_checkout_keeps_the_cart(self):
+        cart = self.store.create_cart()
+        self.store.add_items(cart.id, [(self.product.pk, 11)])
+
+        response = self.checkout(cart)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual([line.quantity for line in self.store.get_items(cart.id)], [11])
+        self.assertFalse(self.locked(cart.id))
+
+
+class CartExpiryTests(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(
+            title='Mug', description='', unit_price=5, inventory=10,
+            collection=Collection.objects.create(title='Kitchen'))
+
+    def cart(self, idle):
+        cart = Cart.objects.create()
+        CartItem.objects.create(cart=cart, product=self.product, quantity=1)
+        Cart.objects.filter(pk=cart.pk).update(last_activity=timezone.now() - idle)
+        return cart
+
+    def test_touch_only_writes_stale_activity(self):
+        store = DatabaseCartStore()
+        fresh, stale = self.cart(timedelta(minutes=1)), self.cart(timedelta(hours=1))
+        before = Cart.objects.get(pk=fresh.pk).last_activity
+
+        store.touch(fresh.pk)
+        store.touch(stale.pk)
+        self.assertEqual(Cart.objects.get(pk=fresh.pk).last_activity, before)
+        self.assertGreater(Cart.objects.get(pk=stale.pk).last_activity, timezone.now() - timedelta(minutes=1))
+
+    def test_reads_only_touch_a_stale_cart(self):
+        fresh, stale = self.cart(timedelta(minutes=1)), self.cart(timedelta(hours=1))
+        api = APIClient()
+
+        # A fresh cart is read without a write; item reads never write.
+        for url in (f'/store/carts/{fresh.pk}/', f'/store/carts/{stale.pk}/items/'):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(api.get(url).status_code, 200)
+            self.assertFalse([query for query in queries if query['sql'].startswith('UPDATE')])
+
+        api.get(f'/store/carts/{stale.pk}/')
+        self.assertGreater(Cart.objects.get(pk=stale.pk).last_activity, timezone.now() - timedelta(minutes=1))
+
+    def test_purge_deletes_idle_carts_only(self):
+        idle, active = self.cart(timedelta(days=60)), self.cart(timedelta(days=1))
+
+        self.assertEqual(list(purge_expired_carts()), [(1, 1)])
+        self.assertFalse(Cart.objects.filter(pk=idle.pk).exists())
+        self.assertEqual(CartItem.objects.filter(cart_id=active.pk).count(), 1)
+
+    def test_purge_keeps_a_cart_used_after_it_was_listed(self):
+        cart = self.cart(timedelta(days=60))
+        atomic = transaction.atomic
+
+        def used_first(*args, **kwargs):
+            Cart.objects.filter(pk=cart.pk).update(last_activity=timezone.now())
+            return atomic(*args, **kwargs)
+
+        with mock.patch('store.carts.transaction.atomic', used_first):
+            self.assertEqual(list(purge_expired_carts()), [(0, 0)])
+        self.assertEqual(CartItem.objects.filter(cart_id=cart.pk).count(), 1)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(TransactionTestCase):
+    """Routing against `replica`, a second connection mirroring the test database."""
+    databases = {'default', 'replica'}
+
+    def test_writes_go_to_the_primary_and_reads_to_the_replica(self):
+        collection = Collection.objects.create(title='Kitchen')
+        self.assertEqual(collection._state.db, 'default')
+        self.assertEqual(Collection.objects.get(pk=collection.pk)._state.db, 'replica')
+
+    def test_primary_models_are_read_from_the_primary(self):
+        cart = Cart.objects.create()
+        self.assertEqual(Cart.objects.get(pk=cart.pk)._state.db, 'default')
+
+    def test_catalog_cache_misses_are_filled_from_the_primary(self):
+        cache.clear()
+        collection = Collection.objects.create(title='Kitchen')
+        with CaptureQueriesContext(connections['replica']) as replica_queries:
+            response = APIClient().get(f'/store/collections/{collection.pk}/')
+        self.assertEqual(response.data['title'], 'Kitchen')
+        self.assertEqual(len(replica_queries), 0)
+
+    def test_reads_inside_a_transaction_or_use_primary_stay_on_the_primary(self):
+        collection = Collection.objects.create(title='Kitchen')
+        with transaction.atomic():
+            self.assertEqual(Collection.objects.get(pk=collection.pk)._state.db, 'default')
+        with use_primary():
+            self.assertEqual(Collection.objects.get(pk=collection.pk)._state.db, 'default')
+
+    def test_jobs_read_from_the_primary(self):
+        process_image.enqueue(image_id=1)
+        (job,) = claim_jobs('default', 1, 'test-worker')
+        routed = []
+        with mock.patch('store.tasks.process_product_image',
+                        side_effect=lambda image_id: routed.append(ProductImage.objects.all().db)):
+            self.assertTrue(run_job(job))
+        self.assertEqual(routed, ['default'])
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class PrimaryPinningTests(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.middleware = PrimaryPinningMiddleware(
+            lambda request: HttpResponse(Collection.objects.all().db))
+
+    def request(self, method, user=None, **headers):
+        if user is not None:
+            headers['HTTP_AUTHORIZATION'] = f'JWT {AccessToken.for_user(user)}'
+        return self.middleware(getattr(self.factory, method)('/store/collections/', **headers)).content.decode()
+
+    def test_a_writer_reads_from_the_primary_until_the_pin_expires(self):
+        User = get_user_model()
+        writer = User.objects.create_user(username='writer', email='writer@example.com', password='!')
+        other = User.objects.create_user(username='other', email='other@example.com', password='!')
+
+        self.assertEqual(self.request('get', writer), 'replica')
+        self.assertEqual(self.request('post', writer), 'default')
+        self.assertEqual(self.request('get', writer), 'default')
+        self.assertEqual(self.request('get', other), 'replica')
+        self.assertEqual(self.request('get'), 'replica')
+
+        with override_settings(DATABASE_PRIMARY_PIN_SECONDS=0):
+            cache.clear()
+            self.request('post', writer)
+        self.assertEqual(self.request('get', writer), 'replica')
+
+    def test_read_primary_header(self):
+        self.assertEqual(self.request('get', HTTP_X_READ_PRIMARY='1'), 'default')
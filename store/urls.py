@@ -8,6 +8,7 @@ router.register('collections', views.CollectionViewSet, basename='collections')
 router.register('carts', views.CartViewSet, basename='carts')
 router.register('customers', views.CustomerViewSet, basename='customers')
 router.register('orders', views.OrderViewSet, basename='orders')
+router.register('analytics', views.SalesAnalyticsViewSet, basename='analytics')
 
 
 product_router = NestedSimpleRouter(router, 'products', lookup='product')
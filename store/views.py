@@ -1,24 +1,115 @@
-from django.db.models import Count
+from django.db.models import Prefetch
+from django.http import Http404
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import OrderingFilter
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework import status
+from rest_framework.permissions import IsAdminUser, IsAuthenticated, SAFE_METHODS
 from rest_framework.viewsets import ModelViewSet
-from rest_framework.mixins import CreateModelMixin, UpdateModelMixin, RetrieveModelMixin, DestroyModelMixin
-from rest_framework.viewsets import GenericViewSet
-from rest_framework.permissions import IsAuthenticated
-from .models import Product, ProductImage, Order, OrderItem, Customer,Collection, Cart, CartItem
+from rest_framework.mixins import CreateModelMixin, UpdateModelMixin, RetrieveModelMixin
+from rest_framework.viewsets import GenericViewSet, ViewSet
+from .models import Product, ProductImage, Order, OrderItem, Customer,Collection, CartItem
+from .analytics import collection_sales, daily_sales, top_products
+from .cache import CatalogCacheMixin, attach_products_count
+from .carts import get_cart_store, parse_cart_id
+from .customers import get_request_customer_id
+from .filters import OrderDateRangeFilter, OrderTotalFilter, ProductFilter, SalesAnalyticsSerializer, ProductSearchSerializer, product_facets
+from .pagination import OrderCursorPagination, ProductCursorPagination
+from .search import search_product_ids
 from .serializers import ProductSerializer,CreateOrderSerializer, CustomerSerializer, OrderSerializer, AddCartItemSerializer, UpdateCartItemSerializer, CartItemSerializer, CollectionSerializer, CartSerializer, ProductImageSerializer
 # pylint: disable=no-member
 
-class CollectionViewSet(ModelViewSet):
+class CollectionViewSet(CatalogCacheMixin, ModelViewSet):
+    queryset = Collection.objects.all()
     serializer_class = CollectionSerializer
-    
-    def get_queryset(self):
-        return Collection.objects.annotate(products_count=Count('products'))
 
-class ProductViewSet(ModelViewSet):
-    queryset = Product.objects.prefetch_related('images').all()
+    def get_serializer(self, *args, **kwargs):
+        # Counts come from the per-collection cache instead of a COUNT join.
+        if args:
+            instance = args[0]
+            attach_products_count(instance if kwargs.get('many') else [instance])
+        return super().get_serializer(*args, **kwargs)
+
+class ProductViewSet(CatalogCacheMixin, ModelViewSet):
+    queryset = Product.objects.all()
     serializer_class = ProductSerializer
+    pagination_class = ProductCursorPagination
+    filter_backends = [ProductFilter, OrderingFilter]
+    ordering_fields = ['id', 'unit_price']
+
+    def paginate_queryset(self, queryset):
+        # `?facets=true` adds per-collection and per-price-bucket counts to the page.
+        page = super().paginate_queryset(queryset)
+        if self.request.query_params.get('facets') in ('1', 'true'):
+            self.facets = product_facets(self.filter_queryset(Product.objects.all()))
+        return page
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if hasattr(self, 'facets'):
+            response.data['facets'] = self.facets
+        return response
+
+    def get_requested_fields(self):
+        """
+        Parse `?fields=id,title,unit_price` into the list of serializer fields
+        to render. Only honoured on reads; writes always use the full serializer.
+        """
+        raw = self.request.query_params.get('fields')
+        if self.request.method not in SAFE_METHODS or not raw:
+            return list(ProductSerializer.Meta.fields)
+
+        requested = {name.strip() for name in raw.split(',') if name.strip()}
+        unknown = requested - set(ProductSerializer.Meta.fields)
+        if unknown:
+            raise ValidationError({'fields': f"Unknown field(s): {', '.join(sorted(unknown))}"})
+
+        return [name for name in ProductSerializer.Meta.fields if name == 'id' or name in requested]
+
+    def get_queryset(self):
+        fields = self.get_requested_fields()
+        queryset = Product.objects.all()
+
+        # Only load the columns the response needs, plus the ones the cursor
+        # reads off the page to build its links; `collection` is rendered
+        # through StringRelatedField, so join it instead of a query per row.
+        columns = [name for name in fields if name not in ('collection', 'images')]
+        columns += [name for name in self.ordering_fields if name not in columns]
+        if 'collection' in fields:
+            queryset = queryset.select_related('collection')
+            columns += ['collection__title']
+        if 'images' in fields:
+            queryset = queryset.prefetch_related('images')
+
+        if self.request.method in SAFE_METHODS:
+            queryset = queryset.only(*columns)
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.get_requested_fields())
+        return super().get_serializer(*args, **kwargs)
+
+    @action(detail=False, methods=['GET'])
+    def search(self, request):
+        """
+        Ranked product search: `?q=wireless head&collection_id=1&limit=20`.
+        The last word matches as a prefix, for typeahead.
+        """
+        return self.cached_response(self.search_results, request)
+
+    def search_results(self, request):
+        params = ProductSearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+
+        product_ids = search_product_ids(
+            params.validated_data['q'],
+            collection_id=params.validated_data.get('collection_id'),
+            limit=params.validated_data['limit'],
+        )
+        products = self.get_queryset().in_bulk(product_ids)
+        serializer = self.get_serializer([products[pk] for pk in product_ids if pk in products], many=True)
+        return Response(serializer.data)
 
 class ProductImageViewSet(ModelViewSet):
     serializer_class = ProductImageSerializer
@@ -31,12 +122,44 @@ class ProductImageViewSet(ModelViewSet):
         return {'product_id': self.kwargs['product_pk']}
     
 
-class CartViewSet(CreateModelMixin,RetrieveModelMixin, DestroyModelMixin, GenericViewSet):
-    queryset = Cart.objects.all()
+class CartViewSet(GenericViewSet):
     serializer_class = CartSerializer
 
+    def get_cart_id(self):
+        cart_id = parse_cart_id(self.kwargs['pk'])
+        if cart_id is None:
+            raise Http404
+        return cart_id
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(get_cart_store().create_cart())
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def retrieve(self, request, *args, **kwargs):
+        store = get_cart_store()
+        cart_id = self.get_cart_id()
+        cart = store.get_cart(cart_id)
+        if cart is None:
+            raise Http404
+        store.touch(cart_id, cart.last_activity)
+        return Response(self.get_serializer(cart).data)
+
+    def destroy(self, request, *args, **kwargs):
+        if not get_cart_store().delete_cart(self.get_cart_id()):
+            raise Http404
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
 class CartItemViewSet(ModelViewSet):
     http_method_names = ['post', 'get', 'patch', 'delete']
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.cart_id = parse_cart_id(self.kwargs['cart_pk'])
+        if self.cart_id is None:
+            raise Http404
+        self.store = get_cart_store()
+        if request.method not in SAFE_METHODS:
+            self.store.touch(self.cart_id)
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -45,13 +168,43 @@ class CartItemViewSet(ModelViewSet):
         elif self.request.method == 'PATCH':
             return UpdateCartItemSerializer
         return CartItemSerializer
+
+    def get_queryset(self):
+        # Items are read through the cart store; this only serves DRF's
+        # generic machinery, such as the browsable API's forms.
+        return CartItem.objects.none()
     
     def get_serializer_context(self):
-        return {'cart_id': self.kwargs['cart_pk']}
+        return {'cart_id': self.cart_id}
     
-    def get_queryset(self):
-        cart_id = self.kwargs['cart_pk']
-        return CartItem.objects.filter(cart_id=cart_id)
+    def list(self, request, *args, **kwargs):
+        serializer = self.get_serializer(self.store.get_items(self.cart_id), many=True)
+        return Response(serializer.data)
+
+    def get_object(self):
+        try:
+            item = self.store.get_item(self.cart_id, int(self.kwargs['pk']))
+        except ValueError:
+            item = None
+        if item is None:
+            raise Http404
+        return item
+
+    def perform_destroy(self, instance):
+        self.store.remove_item(self.cart_id, instance.id)
+
+    @action(detail=False, methods=['POST'])
+    def bulk(self, request, cart_pk=None):
+        """
+        Add many items to the cart in one request:
+        `[{"product_id": 1, "quantity": 2}, ...]`
+        """
+        serializer = AddCartItemSerializer(data=request.data, many=True, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        self.store.add_items(self.cart_id, [(item['product_id'], item['quantity']) for item in serializer.validated_data])
+
+        serializer = CartItemSerializer(self.store.get_items(self.cart_id), many=True, context={'request': request})
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
     
 class CustomerViewSet(CreateModelMixin, RetrieveModelMixin, UpdateModelMixin, GenericViewSet):
     queryset = Customer.objects.all()
@@ -60,7 +213,7 @@ class CustomerViewSet(CreateModelMixin, RetrieveModelMixin, UpdateModelMixin, Ge
     
     @action(detail=False, methods=['GET', 'PUT'])
     def me(self, request):
-        (customer, created) = Customer.objects.get_or_create(user_id=request.user.id)
+        customer = Customer.objects.get(pk=get_request_customer_id(request))
         if request.method == 'GET':
             serializer = CustomerSerializer(customer, )
             return Response(serializer.data)
@@ -72,6 +225,9 @@ class CustomerViewSet(CreateModelMixin, RetrieveModelMixin, UpdateModelMixin, Ge
         
 class OrderViewSet(ModelViewSet):
     permission_classes = [IsAuthenticated]
+    pagination_class = OrderCursorPagination
+    filter_backends = [OrderDateRangeFilter, OrderTotalFilter, OrderingFilter]
+    ordering_fields = ['placed_at', 'total_amount']
     
     def create(self, request, *args, **kwargs):
         serializer = CreateOrderSerializer(data=request.data, context={'user_id': request.user.id})
@@ -90,7 +246,56 @@ class OrderViewSet(ModelViewSet):
     
     def get_queryset(self):
         user = self.request.user
+        queryset = Order.objects.prefetch_related(
+            Prefetch('items', queryset=OrderItem.objects.select_related('product')),
+            'items__product__images',
+        )
         if user.is_staff:
-            return Order.objects.all()
-        (customer_id, created) = Customer.objects.only('id').get_or_create(user_id=user.id)
-        return Order.objects.filter(customer_id=customer_id)
\ No newline at end of file
+            return queryset
+        return queryset.filter(customer_id=get_request_customer_id(self.request))
+
+
+class SalesAnalyticsViewSet(ViewSet):
+    """
+    Staff dashboard figures from the daily sales rollups (see
+    `manage.py rollup_sales`). Every endpoint takes `?start=` and `?end=`
+    dates, inclusive, defaulting to the last 30 days.
+
+    `placed_revenue`, `placed_units` and `placed_orders` count every order
+    when it is placed, paid or not. Orders are rolled up once, so later
+    edits or deletes only show after `manage.py rollup_sales --rebuild`.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get_params(self, request):
+        params = SalesAnalyticsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        return params.validated_data
+
+    def list(self, request):
+        """Daily totals, every collection and the top products in one response."""
+        params = self.get_params(request)
+        return Response({
+            'start': params['start'],
+            'end': params['end'],
+            'daily': daily_sales(params['start'], params['end']),
+            'collections': collection_sales(params['start'], params['end']),
+            'products': top_products(params['start'], params['end'], limit=params['limit']),
+        })
+
+    @action(detail=False)
+    def daily(self, request):
+        """Per-day totals, for one collection with `?collection_id=`."""
+        params = self.get_params(request)
+        return Response(daily_sales(params['start'], params['end'], params.get('collection_id')))
+
+    @action(detail=False)
+    def collections(self, request):
+        params = self.get_params(request)
+        return Response(collection_sales(params['start'], params['end']))
+
+    @action(detail=False)
+    def products(self, request):
+        """Best sellers by revenue; `?collection_id=` and `?limit=` narrow them."""
+        params = self.get_params(request)
+        return Response(top_products(params['start'], params['end'], params.get('collection_id'), params['limit']))